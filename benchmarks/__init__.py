@@ -0,0 +1 @@
+# Benchmark suite: run from the repository root, e.g. `python -m benchmarks.bench_logging`
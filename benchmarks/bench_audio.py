@@ -0,0 +1,141 @@
+# Benchmark: recording audio decode for Whisper, old path vs in-memory decode (src.audio)
+# Usage: python -m benchmarks.bench_audio --seconds 300 --repeat 3 [--ffmpeg /path/to/ffmpeg]
+# Needs the real PyAV (pip install av). The old path also needs pydub and a directory holding binaries named
+# ffmpeg and ffprobe (--ffmpeg points at the first); it is skipped without them.
+# A synthetic call recording (AAC 48 kHz stereo plus a small MPEG-4 video track) is generated first.
+#   old path:  recording bytes in memory -> pydub (ffmpeg to WAV, read back) -> WAV export to disk ->
+#              ffmpeg again to 16 kHz mono s16 (what whisper.load_audio does) -> float32
+#   in-memory: decode_audio(path) -> 16 kHz mono float32, audio stream only, nothing written to disk
+# Each run is a fresh spawned process, so peak RSS is that path's own. ffmpeg subprocesses are reported
+# separately, and the two outputs are compared by correlation.
+
+import argparse
+import io
+import multiprocessing as mp
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+
+def make_recording(path: str, seconds: float) -> None:
+    import av
+    rate, chunk = 48000, 1024
+    with av.open(path, 'w') as out:
+        audio = out.add_stream('aac', rate=rate, layout='stereo')
+        video = out.add_stream('mpeg4', rate=5)
+        video.width, video.height, video.pix_fmt = 160, 120, 'yuv420p'
+        rng = np.random.default_rng(0)
+        for start in range(0, int(seconds * rate), chunk):
+            t = (start + np.arange(chunk)) / rate
+            # Speech-band tone with a slow pitch wobble, plus some noise
+            tone = 0.3 * np.sin(2 * np.pi * (220 + 60 * np.sin(2 * np.pi * 0.5 * t)) * t) + 0.02 * rng.standard_normal(chunk)
+            frame = av.AudioFrame.from_ndarray(np.stack([tone, tone]).astype(np.float32), format='fltp', layout='stereo')
+            frame.sample_rate, frame.pts = rate, start
+            for packet in audio.encode(frame):
+                out.mux(packet)
+        for i in range(int(seconds * 5)):
+            frame = av.VideoFrame.from_ndarray(np.full((120, 160, 3), i % 255, dtype=np.uint8), format='rgb24')
+            frame.pts = i
+            for packet in video.encode(frame):
+                out.mux(packet)
+        for stream in (audio, video):
+            for packet in stream.encode(None):
+                out.mux(packet)
+
+
+def _rss_mb() -> float:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def _old_path(path: str, ffmpeg: str, workdir: str) -> np.ndarray:
+    from pydub import AudioSegment
+    with open(path, 'rb') as f:
+        content = io.BytesIO(f.read())  # read_object() returned the whole recording
+    wav_path = os.path.join(workdir, f"audio_{os.getpid()}.wav")
+    AudioSegment.from_file(content, format="mp4").export(wav_path, format="wav")
+    out = subprocess.run([ffmpeg, "-nostdin", "-threads", "0", "-i", wav_path, "-f", "s16le", "-ac", "1",
+                          "-acodec", "pcm_s16le", "-ar", "16000", "-"], capture_output=True, check=True).stdout
+    os.remove(wav_path)
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def _run(mode: str, path: str, ffmpeg: str, workdir: str, conn) -> None:
+    if mode == 'old':
+        import pydub  # noqa: F401  imports are not part of the measurement
+    else:
+        import av  # noqa: F401
+        from src.logger import set_output_stream
+        set_output_stream(open(os.devnull, 'w'))
+        from src.audio import decode_audio
+    baseline = _rss_mb()
+    start = time.perf_counter()
+    samples = _old_path(path, ffmpeg, workdir) if mode == 'old' else decode_audio(path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    np.save(os.path.join(workdir, f"{mode}.npy"), samples)
+    conn.send({'seconds': elapsed, 'peak_delta_mb': peak - baseline, 'ffmpeg_peak_mb': children, 'samples': len(samples)})
+
+
+def measure(mode: str, path: str, ffmpeg: str, workdir: str) -> dict:
+    ctx = mp.get_context("spawn")
+    parent, child = ctx.Pipe()
+    proc = ctx.Process(target=_run, args=(mode, path, ffmpeg, workdir, child))
+    proc.start()
+    child.close()
+    result = parent.recv()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recording audio decode: old WAV round trip vs in-memory")
+    parser.add_argument("--seconds", type=float, default=300, help="Length of the synthetic recording")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--ffmpeg", default=shutil.which("ffmpeg"), help="ffmpeg binary for the old path (ffprobe beside it)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="audio-bench-")
+    path = os.path.join(workdir, "call.mp4")
+    start = time.perf_counter()
+    make_recording(path, args.seconds)
+    print(f"{args.seconds:.0f}s recording, {os.path.getsize(path) / 1e6:.1f} MB (generated in {time.perf_counter() - start:.1f}s)")
+
+    modes = ['in-memory']
+    if args.ffmpeg:
+        # pydub resolves "ffmpeg"/"ffprobe" on PATH at import (and only streams MP4 input seekably under that name)
+        os.environ['PATH'] = os.path.dirname(os.path.abspath(args.ffmpeg)) + os.pathsep + os.environ.get('PATH', '')
+    try:
+        import pydub  # noqa: F401
+        if args.ffmpeg:
+            modes.insert(0, 'old')
+        else:
+            print("old path skipped: no ffmpeg binary (pass --ffmpeg)")
+    except ImportError:
+        print("old path skipped: pydub is not installed")
+
+    print(f"{'path':<10} {'decode s':>9} {'peak RSS +MB':>13} {'ffmpeg peak MB':>15} {'samples':>10}")
+    for mode in modes:
+        runs = [measure('old' if mode == 'old' else 'new', path, args.ffmpeg, workdir) for _ in range(args.repeat)]
+        ffmpeg_peak = f"{max(r['ffmpeg_peak_mb'] for r in runs):.0f}" if mode == 'old' else '-'
+        print(f"{mode:<10} {statistics.median(r['seconds'] for r in runs):>9.2f} "
+              f"{statistics.median(r['peak_delta_mb'] for r in runs):>13.1f} {ffmpeg_peak:>15} {runs[0]['samples']:>10}")
+
+    if 'old' in modes:
+        old, new = np.load(os.path.join(workdir, "old.npy")), np.load(os.path.join(workdir, "new.npy"))
+        n = min(len(old), len(new))
+        corr = float(np.corrcoef(old[:n], new[:n])[0, 1])
+        print(f"\noutputs: {len(old)} vs {len(new)} samples, correlation {corr:.4f}, "
+              f"max abs difference {float(np.max(np.abs(old[:n] - new[:n]))):.4f}")
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# Benchmark: embedding backends (fp32 torch, int8 torch, ONNX, int8 ONNX) on CPU
+# Usage: python -m benchmarks.bench_embeddings --backends torch,torch-int8,onnx,onnx-int8 --threads 1,4
+# Each backend/thread setting runs in its own process so resident memory is measured in isolation.
+# Reports batch throughput, single-query latency, RSS after load and at peak, and agreement with fp32:
+# per-text cosine (the parity threshold src.embeddings enforces) and top-5 neighbour overlap.
+# Needs the real sentence-transformers/torch (and optimum[onnxruntime] for the ONNX backends).
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_triage import LABELLED
+from benchmarks.fakes import SAMPLE_REPORT_LINES
+from benchmarks.load_test import QUESTIONS
+
+PREFIXES = ["", "Patient asks: ", "Doctor's note: ", "Follow-up: ", "Report excerpt: ", "Query from chat: "]
+
+
+def corpus(size: int):
+    from src.embeddings import PARITY_TEXTS
+    base = PARITY_TEXTS + QUESTIONS + [text for text, _ in LABELLED] + SAMPLE_REPORT_LINES
+    texts = [prefix + text for prefix in PREFIXES for text in base]
+    return (texts * (size // len(texts) + 1))[:size]
+
+
+def rss_mb() -> float:
+    """Current resident set size (falls back to the peak where /proc is unavailable)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def run_child(backend: str, threads: int, texts_count: int, batch: int, queries: int, out: str):
+    """Load one backend, time it, save the corpus embeddings and print a JSON result line"""
+    from src.embeddings import load_embedder
+    texts = corpus(texts_count)
+    start = time.perf_counter()
+    model = load_embedder(backend=backend, threads=threads)
+    load_s = time.perf_counter() - start
+    loaded_rss = rss_mb()
+
+    model.encode(texts[:batch], batch_size=batch)  # warm-up
+    start = time.perf_counter()
+    vectors = np.asarray(model.encode(texts, batch_size=batch, convert_to_numpy=True), dtype=np.float32)
+    batch_s = time.perf_counter() - start
+
+    latencies = []
+    for text in texts[:queries]:
+        start = time.perf_counter()
+        model.encode(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    np.save(out, vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12))
+    print(json.dumps({'load_s': load_s, 'texts_per_s': len(texts) / batch_s, 'p50_ms': statistics.median(latencies),
+                      'p90_ms': sorted(latencies)[int(0.9 * (len(latencies) - 1))], 'loaded_rss_mb': loaded_rss,
+                      'peak_rss_mb': peak_rss_mb()}))
+
+
+def top_k(vectors: np.ndarray, queries: int, k: int = 5) -> np.ndarray:
+    scores = vectors[:queries] @ vectors.T
+    np.fill_diagonal(scores[:, :queries], -np.inf)
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backend throughput, memory and fp32 parity")
+    parser.add_argument("--backends", default="torch,torch-int8,onnx,onnx-int8")
+    parser.add_argument("--threads", default="1,4", help="Comma-separated intra-op thread counts")
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=100, help="Single-text encodes timed for latency")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        backend, threads = args.child.split(":")
+        run_child(backend, int(threads), args.texts, args.batch, args.queries, args.out)
+        return
+
+    from src.config import EMBEDDING_PARITY_MIN_COSINE
+    backends = [b for b in args.backends.split(",") if b]
+    if "torch" not in backends:
+        backends.insert(0, "torch")  # the fp32 reference for parity
+    workdir = tempfile.mkdtemp(prefix="embed-bench-")
+    results, reference = [], None
+    for threads in [int(t) for t in args.threads.split(",")]:
+        for backend in backends:
+            out = os.path.join(workdir, f"{backend}-{threads}.npy")
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_embeddings", "--child", f"{backend}:{threads}", "--out", out,
+                 "--texts", str(args.texts), "--batch", str(args.batch), "--queries", str(args.queries)],
+                capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"{backend} ({threads} threads) failed:\n{proc.stderr.strip().splitlines()[-1] if proc.stderr else ''}")
+                continue
+            row = json.loads(proc.stdout.strip().splitlines()[-1])
+            vectors = np.load(out)
+            if backend == "torch" and reference is None:
+                reference = vectors
+            row.update(backend=backend, threads=threads)
+            if reference is not None:
+                cosines = np.sum(vectors * reference, axis=1)
+                overlap = [len(set(a) & set(b)) / len(a) for a, b in
+                           zip(top_k(vectors, args.queries), top_k(reference, args.queries))]
+                row.update(min_cos=float(cosines.min()), mean_cos=float(cosines.mean()), top5=float(np.mean(overlap)))
+            results.append(row)
+
+    print(f"{args.texts} texts, batch {args.batch}, {args.queries} single-text queries; parity threshold {EMBEDDING_PARITY_MIN_COSINE}")
+    print(f"{'backend':<11} {'threads':>7} {'load s':>7} {'texts/s':>8} {'p50 ms':>7} {'p90 ms':>7} "
+          f"{'RSS MB':>7} {'peak MB':>8} {'min cos':>8} {'mean cos':>9} {'top5':>6} {'parity':>6}")
+    for row in results:
+        parity = 'ok' if row.get('min_cos', 0) >= EMBEDDING_PARITY_MIN_COSINE else 'FAIL'
+        print(f"{row['backend']:<11} {row['threads']:>7} {row['load_s']:>7.1f} {row['texts_per_s']:>8.1f} "
+              f"{row['p50_ms']:>7.2f} {row['p90_ms']:>7.2f} {row['loaded_rss_mb']:>7.0f} {row['peak_rss_mb']:>8.0f} "
+              f"{row.get('min_cos', float('nan')):>8.4f} {row.get('mean_cos', float('nan')):>9.4f} "
+              f"{row.get('top5', float('nan')):>6.2f} {parity:>6}")
+
+
+if __name__ == "__main__":
+    main()
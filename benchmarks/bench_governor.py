@@ -0,0 +1,92 @@
+# Benchmark: goodput of Gemini calls under a burst, with and without the outbound governor
+# Usage: python -m benchmarks.bench_governor --callers 64 --provider-capacity 8 --calls-per-caller 5
+# The simulated provider serves at most --provider-capacity concurrent calls and answers 429 beyond that.
+
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SimulatedProvider:
+    def __init__(self, capacity: int, latency_s: float):
+        self.capacity = capacity
+        self.latency_s = latency_s
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        from benchmarks.fakes import ResourceExhausted
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise ResourceExhausted("429 Resource has been exhausted")
+            self.in_flight += 1
+        try:
+            # Providers slow down as they approach capacity
+            time.sleep(self.latency_s * (1 + self.in_flight / self.capacity))
+            return prompt
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def run(callers: int, calls_per_caller: int, provider: SimulatedProvider, governed: bool):
+    from src.llm_governor import LLMGovernor, PRIORITY_BATCH, PRIORITY_EMERGENCY
+    governor = LLMGovernor()
+    ok, failed, emergency_latencies = 0, 0, []
+    lock = threading.Lock()
+
+    def caller(c: int):
+        nonlocal ok, failed
+        priority = PRIORITY_EMERGENCY if c % 8 == 0 else PRIORITY_BATCH
+        for i in range(calls_per_caller):
+            start = time.perf_counter()
+            try:
+                if governed:
+                    governor.call(lambda: provider.generate_content("q"), model_name="sim", priority=priority)
+                else:
+                    provider.generate_content("q")
+                with lock:
+                    ok += 1
+                    if priority == PRIORITY_EMERGENCY:
+                        emergency_latencies.append(time.perf_counter() - start)
+            except Exception:
+                with lock:
+                    failed += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        list(pool.map(caller, range(callers)))
+    elapsed = time.perf_counter() - start
+    emergency_latencies.sort()
+    p95 = emergency_latencies[int(len(emergency_latencies) * 0.95) - 1] * 1000 if emergency_latencies else 0.0
+    print(f"{'governed' if governed else 'ungoverned':<11} ok {ok:>5}  failed {failed:>5}  "
+          f"goodput {ok / elapsed:7.1f}/s  429s seen {provider.rejected:>5}  emergency p95 {p95:7.1f} ms"
+          + (f"  final limit {governor.limiter.limit:.1f}" if governed else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Outbound LLM governor goodput benchmark")
+    parser.add_argument("--callers", type=int, default=64)
+    parser.add_argument("--calls-per-caller", type=int, default=5)
+    parser.add_argument("--provider-capacity", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    # Generous quota so only provider capacity matters; fast backoff keeps the run short
+    os.environ.setdefault("GEMINI_KEY_RPM", "1000000")
+    os.environ.setdefault("GEMINI_MODEL_RPM", "1000000")
+    os.environ.setdefault("GEMINI_BACKOFF_BASE_MS", "20")
+    os.environ.setdefault("GEMINI_TARGET_LATENCY_MS", str(args.latency_ms * 4))
+    os.environ.setdefault("LOG_INFO_SAMPLE_RATE", "0")
+
+    print(f"callers={args.callers} calls/caller={args.calls_per_caller} provider capacity={args.provider_capacity}")
+    run(args.callers, args.calls_per_caller, SimulatedProvider(args.provider_capacity, args.latency_ms / 1000), governed=False)
+    run(args.callers, args.calls_per_caller, SimulatedProvider(args.provider_capacity, args.latency_ms / 1000), governed=True)
+
+
+if __name__ == "__main__":
+    main()
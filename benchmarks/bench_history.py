@@ -0,0 +1,146 @@
+# Benchmark: a patient's newest page of prescriptions, following reference arrays vs one indexed query
+# Usage:
+#   python -m benchmarks.bench_history --patients 20 --per-patient 200 --firestore-latency-ms 5
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python -m benchmarks.bench_history     # against the Firestore emulator
+# Strategies, each producing the same page (newest first, with the prescribing doctor's name):
+#   refs, one read each   patient doc, then every ref in its `prescriptions` array and every doctor (N+1 reads)
+#   refs + get_all        the same documents fetched in two batched get_all calls
+#   indexed query         src.history.list_history: one query with projection and denormalized names
+# The emulator does not enforce composite indexes; deploy firestore.indexes.json before using the lists for real.
+# Without the emulator the in-process fake is used, with --firestore-latency-ms per round trip.
+
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks import fakes
+
+
+def seed(db, patients: int, doctors: int, per_patient: int) -> None:
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    batch, pending = db.batch(), 0
+
+    def write(ref, data):
+        nonlocal batch, pending
+        batch.set(ref, data)
+        pending += 1
+        if pending == 400:
+            batch.commit()
+            batch, pending = db.batch(), 0
+
+    for d in range(doctors):
+        write(db.collection('doctors').document(f"doctor-{d}"), {'role': 'doctor', 'name': f"Dr. Bench {d}"})
+    for p in range(patients):
+        refs = []
+        for i in range(per_patient):
+            doctor_id = f"doctor-{(p + i) % doctors}"
+            ref = db.collection('prescriptions').document(f"rx-{p}-{i}")
+            refs.append(ref)
+            write(ref, {
+                'date': base + timedelta(minutes=i // 2),  # pairs share a timestamp, so pages must break ties by id
+                'medication': f"Medication {i}", 'dosage': '500 mg', 'instructions': 'After food',
+                'patient_ref': db.collection('patients').document(f"patient-{p}"),
+                'doctor_ref': db.collection('doctors').document(doctor_id),
+                'patient_id': f"patient-{p}", 'doctor_id': doctor_id,
+                'patient_name': f"Patient {p}", 'doctor_name': f"Dr. Bench {(p + i) % doctors}",
+            })
+        write(db.collection('patients').document(f"patient-{p}"), {'role': 'patient', 'name': f"Patient {p}", 'prescriptions': refs})
+    if pending:
+        batch.commit()
+
+
+def _page_from(docs, doctor_names, limit):
+    rows = sorted(((doc.id, doc.to_dict()) for doc in docs if doc.exists), key=lambda r: (r[1]['date'], r[0]), reverse=True)
+    return [{'id': doc_id, 'date': data['date'], 'medication': data['medication'],
+             'doctor_name': doctor_names.get(data['doctor_ref'].id)} for doc_id, data in rows[:limit]]
+
+
+def refs_one_by_one(db, uid: str, limit: int):
+    refs = db.collection('patients').document(uid).get().to_dict()['prescriptions']
+    docs = [ref.get() for ref in refs]
+    doctor_refs = {doc.to_dict()['doctor_ref'].id: doc.to_dict()['doctor_ref'] for doc in docs if doc.exists}
+    names = {doctor_id: ref.get().to_dict().get('name') for doctor_id, ref in doctor_refs.items()}
+    return _page_from(docs, names, limit)
+
+
+def refs_get_all(db, uid: str, limit: int):
+    refs = db.collection('patients').document(uid).get().to_dict()['prescriptions']
+    docs = list(db.get_all(refs))
+    doctor_refs = {doc.to_dict()['doctor_ref'].id: doc.to_dict()['doctor_ref'] for doc in docs if doc.exists}
+    names = {snap.id: (snap.to_dict() or {}).get('name') for snap in db.get_all(list(doctor_refs.values()), field_paths=['name'])}
+    return _page_from(docs, names, limit)
+
+
+def indexed_query(db, uid: str, limit: int):
+    from src.history import list_history
+    return list_history(db, 'prescriptions', 'patient', uid, limit)['items']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History list cost: reference arrays vs indexed query")
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--doctors", type=int, default=10)
+    parser.add_argument("--per-patient", type=int, default=200, help="Prescriptions per patient")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per strategy")
+    parser.add_argument("--firestore-latency-ms", type=float, default=5.0, help="Per round trip (fake only)")
+    parser.add_argument("--project", default=os.getenv("GCLOUD_PROJECT", "demo-history-bench"))
+    args = parser.parse_args()
+
+    emulator = os.getenv("FIRESTORE_EMULATOR_HOST")
+    if emulator:
+        from google.cloud import firestore
+        db = firestore.Client(project=args.project)
+    else:
+        fakes.install({'LOG_INFO_SAMPLE_RATE': '0'})
+        db = fakes.firestore_client()
+    from src.logger import set_output_stream
+    set_output_stream(open(os.devnull, 'w'))
+
+    seed(db, args.patients, args.doctors, args.per_patient)
+    if not emulator:
+        fakes.configure(firestore_latency_ms=args.firestore_latency_ms)
+    print(f"{'emulator ' + emulator if emulator else f'fake Firestore, {args.firestore_latency_ms:.0f} ms per round trip'}; "
+          f"{args.patients} patients x {args.per_patient} prescriptions, page of {args.page_size}")
+    print(f"{'strategy':<24} {'p50 ms':>8} {'docs read':>10} {'same page':>10}")
+
+    expected = None
+    for label, strategy in (("refs, one read each", refs_one_by_one), ("refs + get_all", refs_get_all),
+                            ("indexed query", indexed_query)):
+        timings, reads = [], []
+        for run in range(args.repeat):
+            uid = f"patient-{run % args.patients}"
+            if not emulator:
+                fakes.reset_counters()
+            start = time.perf_counter()
+            page = strategy(db, uid, args.page_size)
+            timings.append((time.perf_counter() - start) * 1000)
+            if not emulator:
+                reads.append(fakes.CALLS['firestore_read'])
+            if run == 0:
+                ids = [row['id'] for row in page]
+                names = [row['doctor_name'] for row in page]
+                expected = expected or (ids, names)
+                same = (ids, names) == expected
+        docs_read = f"{statistics.mean(reads):.0f}" if reads else "-"
+        print(f"{label:<24} {statistics.median(timings):>8.1f} {docs_read:>10} {str(same):>10}")
+
+    # Walk every page with the cursor: each prescription exactly once, newest first
+    from src.history import list_history
+    seen, cursor, pages = [], None, 0
+    while True:
+        result = list_history(db, 'prescriptions', 'patient', 'patient-0', args.page_size, cursor)
+        seen += [(row['date'], row['id']) for row in result['items']]
+        pages += 1
+        cursor = result['next_cursor']
+        if not cursor:
+            break
+    ordered = seen == sorted(seen, reverse=True)
+    print(f"\ncursor walk: {pages} pages, {len(seen)} items, {len(set(seen))} distinct, "
+          f"expected {args.per_patient}, newest first={ordered}")
+
+
+if __name__ == "__main__":
+    main()
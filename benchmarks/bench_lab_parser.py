@@ -0,0 +1,94 @@
+# Benchmark: local lab-value parsing vs sending the whole report text to the LLM
+# Usage: python -m benchmarks.bench_lab_parser --pages 1 --reports 200 --ms-per-1k-tokens 400
+# Reports parse throughput, extraction accuracy against the generated values, and the report-analysis
+# prompt size / stub-model latency with and without the structured summary.
+
+import argparse
+import random
+import time
+
+from benchmarks import fakes
+from benchmarks.bench_prompt import LAB_TESTS, NARRATIVE
+
+LAYOUTS = [
+    "{name} {value} {unit} {low} - {high}",
+    "{name} : {value} {unit} ({low}-{high})",
+    "{name}    {value}    {low} - {high}    {unit}",
+    "| {name} | {value} | {unit} | {low} to {high} |",
+]
+
+
+def make_report(pages: int, rng: random.Random):
+    """Report text in a random table layout, plus the (name, value) pairs printed in it"""
+    layout = rng.choice(LAYOUTS)
+    text, truth = "", []
+    for page in range(pages):
+        text += f"\n--- Page {page + 1} ---\n"
+        text += "City Diagnostics Laboratory, 12 Park Street, Pune - NABL accredited\n"
+        text += "Patient: Jane Doe   Age: 42   Gender: F   Ref. Dr: A. Kumar   Sample ID: 88231\n"
+        for name, unit, low, high in LAB_TESTS:
+            value = round(rng.uniform(low * 0.7, high * 1.3), 1)
+            truth.append((name, value, "H" if value > high else "L" if value < low else "N"))
+            text += layout.format(name=name, value=value, unit=unit, low=low, high=high) + "\n"
+        text += NARRATIVE * 3 + "\n"
+    return text, truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lab-value parser throughput, accuracy and prompt savings")
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=400.0)
+    args = parser.parse_args()
+
+    fakes.install({'LOG_INFO_SAMPLE_RATE': '0'})
+    fakes.configure(llm_ms_per_1k_tokens=args.ms_per_1k_tokens)
+    from src import report_analyzer
+    from src.config import PROMPT_REPORT_TOKENS
+    from src.lab_parser import parse_lab_results, summarize
+    from src.prompt_builder import count_tokens, compress_documents
+
+    rng = random.Random(11)
+    reports = [make_report(args.pages, rng) for _ in range(args.reports)]
+
+    start = time.perf_counter()
+    tables = [parse_lab_results(text)[0] for text, _ in reports]
+    elapsed = time.perf_counter() - start
+    lines = sum(len(text.splitlines()) for text, _ in reports)
+
+    expected = found = correct = 0
+    for table, (_, truth) in zip(tables, reports):
+        values = {(row.value, row.flag) for row in table.itertuples()}
+        expected += len(set(truth))
+        found += len(table)
+        correct += sum((value, flag) in values for _, value, flag in set(truth))
+    print(f"parsed {args.reports} reports ({lines} lines) in {elapsed:.3f} s: "
+          f"{args.reports / elapsed:.0f} reports/s, {elapsed / args.reports * 1000:.2f} ms/report")
+    print(f"rows expected={expected} extracted={found} value+flag correct={correct} ({correct / expected:.1%})")
+
+    captured = []
+    original_generate = fakes.FakeGenerativeModel.generate_content
+
+    def recording_generate(self, prompt, **kwargs):
+        start = time.perf_counter()
+        result = original_generate(self, prompt, **kwargs)
+        captured.append((count_tokens(prompt), time.perf_counter() - start))
+        return result
+
+    fakes.FakeGenerativeModel.generate_content = recording_generate
+    text, _ = reports[0]
+    report_analyzer.perform_comprehensive_analysis(text)
+    table, remaining = parse_lab_results(text)
+    report_analyzer.perform_comprehensive_analysis(remaining, lab_results=table)
+    (raw_tokens, raw_s), (new_tokens, new_s) = captured
+    # The report data section alone, without the fixed instruction template both prompts share
+    raw_data = count_tokens(compress_documents([text], PROMPT_REPORT_TOKENS))
+    new_data = count_tokens(summarize(table)) + count_tokens(compress_documents([remaining], PROMPT_REPORT_TOKENS))
+    print(f"\n{'report prompt':<22} {'tokens':>8} {'data tokens':>12} {'stub ms':>9}")
+    print(f"{'raw report text':<22} {raw_tokens:>8} {raw_data:>12} {raw_s * 1000:>9.1f}")
+    print(f"{'structured summary':<22} {new_tokens:>8} {new_data:>12} {new_s * 1000:>9.1f}")
+    print(f"data section {100 * (1 - new_data / raw_data):.1f}% smaller, whole prompt {100 * (1 - new_tokens / raw_tokens):.1f}% smaller")
+
+
+if __name__ == "__main__":
+    main()
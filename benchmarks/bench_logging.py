@@ -0,0 +1,90 @@
+# Microbenchmark: per-request logging overhead, synchronous StreamHandler vs queue-based logger
+# Usage: python -m benchmarks.bench_logging --requests 2000 --logs-per-request 8 --write-delay-us 50
+
+import argparse
+import io
+import logging
+import os
+import statistics
+import sys
+import time
+
+from src import logger as logger_module
+from src.logger import setup_logger, log_context
+
+
+class SlowStream(io.TextIOBase):
+    """Stream that sleeps on every write, simulating a congested stdout pipe"""
+
+    def __init__(self, target, delay_s: float):
+        self.target = target
+        self.delay_s = delay_s
+
+    def write(self, s):
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        return self.target.write(s)
+
+    def flush(self):
+        self.target.flush()
+
+
+def build_sync_logger(stream) -> logging.Logger:
+    """The previous setup: a StreamHandler writing on the caller's thread"""
+    logger = logging.getLogger("bench.sync")
+    logger.handlers.clear()
+    logger.setLevel(logging.INFO)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(handler)
+    logger.propagate = False
+    return logger
+
+
+def simulate_request(logger: logging.Logger, i: int, logs_per_request: int, fstrings: bool) -> float:
+    """Emit the log lines of one request, return the time spent in logging calls"""
+    token = {'uid': f'user-{i}', 'email': 'patient@example.com'}
+    transcript = "patient reports mild headache and fatigue for three days " * 20
+    start = time.perf_counter()
+    with log_context(request_id=f"req-{i}"):
+        for n in range(logs_per_request):
+            if fstrings:
+                logger.info(f"Verified user: {token['uid']} step {n} transcript {transcript[:100]}")
+            else:
+                logger.info("Verified user: %s step %s transcript %.100s", token['uid'], n, transcript)
+    return time.perf_counter() - start
+
+
+def summarize(name: str, samples: list) -> None:
+    samples_us = sorted(s * 1e6 for s in samples)
+    p99 = samples_us[int(len(samples_us) * 0.99) - 1]
+    print(f"{name:<28} mean {statistics.mean(samples_us):9.1f} us/request   "
+          f"p50 {statistics.median(samples_us):9.1f}   p99 {p99:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request logging overhead benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--logs-per-request", type=int, default=8)
+    parser.add_argument("--write-delay-us", type=float, default=0.0,
+                        help="Artificial latency per write, to model a blocked stdout pipe")
+    args = parser.parse_args()
+
+    sink = open(os.devnull, "w")
+    stream = SlowStream(sink, args.write_delay_us / 1e6)
+
+    sync_logger = build_sync_logger(stream)
+    queued_logger = setup_logger("bench.queued")
+    logger_module.set_output_stream(stream)
+
+    sync_fstring = [simulate_request(sync_logger, i, args.logs_per_request, True) for i in range(args.requests)]
+    queued_lazy = [simulate_request(queued_logger, i, args.logs_per_request, False) for i in range(args.requests)]
+
+    print(f"{args.requests} requests x {args.logs_per_request} log lines, write delay {args.write_delay_us} us")
+    summarize("sync StreamHandler + f-str", sync_fstring)
+    summarize("queue handler + lazy args", queued_lazy)
+    print(f"dropped records (queue full): {logger_module.get_dropped_count()}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
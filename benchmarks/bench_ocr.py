@@ -0,0 +1,127 @@
+# Benchmark: OCR of report images, raw Tesseract vs preprocessed vs preprocessed + parallel tiles
+# Usage:
+#   python -m benchmarks.bench_ocr                       # synthetic phone-photo fixtures
+#   python -m benchmarks.bench_ocr --fixtures dir/       # dir/<name>.{png,jpg} + dir/<name>.txt ground truth
+# Reports seconds per image and character accuracy (1 - edit distance / reference length).
+# Needs the tesseract binary for the OCR columns; without it only the preprocessing stages are timed.
+
+import argparse
+import os
+import shutil
+import statistics
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from benchmarks.fakes import SAMPLE_REPORT_LINES
+
+
+def levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def char_accuracy(predicted: str, reference: str) -> float:
+    predicted, reference = " ".join(predicted.split()), " ".join(reference.split())
+    if not reference:
+        return 1.0 if not predicted else 0.0
+    return max(0.0, 1 - levenshtein(predicted, reference) / len(reference))
+
+
+def _font(size: int):
+    for path in ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "DejaVuSans.ttf", "Arial.ttf"):
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def synthesize_photo(lines, angle: float, seed: int) -> Image.Image:
+    """Render report text, then degrade it like a phone photo: tilt, uneven lighting, noise, dark border"""
+    rng = np.random.default_rng(seed)
+    font = _font(44)
+    page = Image.new("L", (2480, 1400), 250)
+    draw = ImageDraw.Draw(page)
+    for i, line in enumerate(lines):
+        draw.text((120, 100 + i * 95), line, fill=20, font=font)
+    # Table top around the page, as in a typical photo of a printed report; the page edge tilts with the text
+    framed = Image.new("L", (page.width + 300, page.height + 300), 40)
+    framed.paste(page, (150, 150))
+    framed = framed.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=40)
+    pixels = np.asarray(framed, dtype=np.float32)
+    h, w = pixels.shape
+    shadow = np.linspace(0.45, 1.0, w)[None, :] * np.linspace(0.8, 1.0, h)[:, None]
+    pixels = pixels * shadow + rng.normal(0, 12, pixels.shape)
+    photo = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).filter(ImageFilter.GaussianBlur(1.2))
+    return photo.resize((photo.width * 3 // 2, photo.height * 3 // 2), Image.BICUBIC).convert("RGB")
+
+
+def load_fixtures(directory: str):
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        truth = os.path.join(directory, stem + ".txt")
+        if ext.lower() in (".png", ".jpg", ".jpeg", ".tif", ".tiff") and os.path.exists(truth):
+            with open(truth) as f:
+                fixtures.append((name, Image.open(os.path.join(directory, name)), f.read()))
+    return fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR preprocessing speed and accuracy")
+    parser.add_argument("--fixtures", help="Directory of images with .txt ground truth")
+    parser.add_argument("--images", type=int, default=4, help="Synthetic images when no --fixtures")
+    parser.add_argument("--tiles", type=int, default=4)
+    args = parser.parse_args()
+
+    from src import ocr_preprocess
+    import pytesseract
+
+    if args.fixtures:
+        fixtures = load_fixtures(args.fixtures)
+    else:
+        reference = "\n".join(SAMPLE_REPORT_LINES)
+        angles = [3.5, -4.0, 1.5, -2.5, 6.0, 0.0]
+        fixtures = [(f"synthetic-{i} ({angles[i % len(angles)]:+.1f} deg)",
+                     synthesize_photo(SAMPLE_REPORT_LINES, angles[i % len(angles)], i), reference)
+                    for i in range(args.images)]
+    if not fixtures:
+        raise SystemExit("no fixtures found")
+
+    print(f"{'image':<28} {'size':>11} {'preprocess s':>13} {'deskew':>7}")
+    for name, image, _ in fixtures:
+        start = time.perf_counter()
+        page, ink = ocr_preprocess.preprocess(image)
+        elapsed = time.perf_counter() - start
+        angle = ocr_preprocess.estimate_skew(ink)  # residual skew after correction, should be ~0
+        print(f"{name:<28} {image.width:>5}x{image.height:<5} {elapsed:>13.3f} {angle:>+7.2f}")
+
+    if not shutil.which(pytesseract.pytesseract.tesseract_cmd):
+        print("\ntesseract binary not found; skipping OCR accuracy comparison")
+        return
+
+    variants = {
+        "raw tesseract": lambda img: pytesseract.image_to_string(img.convert("RGB"), config="--psm 6"),
+        "preprocessed": lambda img: ocr_preprocess.ocr_image(img, tiles=1),
+        f"preprocessed+{args.tiles} tiles": lambda img: ocr_preprocess.ocr_image(img, tiles=args.tiles),
+    }
+    print(f"\n{'variant':<24} {'s/image':>9} {'char accuracy':>14}")
+    for label, run in variants.items():
+        times, scores = [], []
+        for _, image, reference in fixtures:
+            start = time.perf_counter()
+            text = run(image)
+            times.append(time.perf_counter() - start)
+            scores.append(char_accuracy(text, reference))
+        print(f"{label:<24} {statistics.mean(times):>9.2f} {statistics.mean(scores):>14.1%}")
+
+
+if __name__ == "__main__":
+    main()
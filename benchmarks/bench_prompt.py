@@ -0,0 +1,99 @@
+# Benchmark: prompt token counts and stub-model latency, raw concatenation vs token-budgeted builder
+# Usage: python -m benchmarks.bench_prompt --pages 12 --ms-per-1k-tokens 400
+# The stub model's latency grows linearly with prompt size, like a real LLM's prefill time.
+
+import argparse
+import random
+import time
+
+from benchmarks import fakes
+
+LAB_TESTS = [("Hemoglobin", "g/dL", 12.0, 15.5), ("Total WBC Count", "cells/cumm", 4000, 11000),
+             ("Platelet Count", "lakh/cumm", 1.5, 4.5), ("SGOT (AST)", "U/L", 5, 40), ("SGPT (ALT)", "U/L", 7, 56),
+             ("Serum Creatinine", "mg/dL", 0.6, 1.2), ("Blood Urea", "mg/dL", 15, 40), ("TSH", "uIU/mL", 0.4, 4.0),
+             ("Total Cholesterol", "mg/dL", 125, 200), ("Triglycerides", "mg/dL", 50, 150), ("HDL Cholesterol", "mg/dL", 40, 60)]
+
+NARRATIVE = ("Method: automated analyser with internal quality control. Results relate only to the sample tested. "
+             "Please correlate clinically. Values may vary between laboratories depending on methodology. ")
+
+
+def make_report(pages: int, rng: random.Random) -> str:
+    text = ""
+    for page in range(pages):
+        text += f"\n--- Page {page + 1} ---\n"
+        text += "City Diagnostics Laboratory, 12 Park Street, Pune - NABL accredited\n"
+        text += "Patient: Jane Doe   Age: 42   Gender: F   Ref. Dr: A. Kumar   Sample ID: 88231\n"
+        for name, unit, low, high in LAB_TESTS:
+            value = round(rng.uniform(low * 0.7, high * 1.3), 1)
+            text += f"{name} {value} {unit} {low} - {high}\n"
+        text += NARRATIVE * 3 + "\n"
+        text += "This is an electronically generated report and does not require a signature.\n"
+    return text
+
+
+def make_transcript(words: int, rng: random.Random) -> str:
+    vocabulary = ("patient doctor headache fever three days paracetamol sleep appetite blood pressure "
+                  "follow up week tablets twice daily after food water rest symptoms cough").split()
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt size and stub-model latency benchmark")
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--transcript-words", type=int, default=6000)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=400.0)
+    args = parser.parse_args()
+
+    fakes.install({'LOG_INFO_SAMPLE_RATE': '0'})
+    fakes.configure(llm_ms_per_1k_tokens=args.ms_per_1k_tokens)
+    from src import chatbot_service, report_analyzer
+    from src.prompt_builder import count_tokens
+
+    rng = random.Random(7)
+    report = make_report(args.pages, rng)
+    contexts = [report, make_report(args.pages, rng), report]  # the same report retrieved twice is common
+    transcript = make_transcript(args.transcript_words, rng)
+    prescription = {'medication': 'Paracetamol 500mg', 'dosage': '1 tablet twice daily', 'instructions': 'After food for 5 days'}
+    question = "Is my cholesterol and TSH in the normal range?"
+
+    captured = []
+    original_generate = fakes.FakeGenerativeModel.generate_content
+
+    def recording_generate(self, prompt, **kwargs):
+        start = time.perf_counter()
+        result = original_generate(self, prompt, **kwargs)
+        captured.append((count_tokens(prompt), time.perf_counter() - start))
+        return result
+
+    fakes.FakeGenerativeModel.generate_content = recording_generate
+
+    def run_cases():
+        captured.clear()
+        analysis = {'response_type': 'general_info'}
+        prompt = chatbot_service.chatbot._build_response_prompt(question, analysis, contexts)
+        chatbot_service.chatbot.generate(prompt, task='chat')
+        prompt = chatbot_service.chatbot._build_response_prompt("Summarise the call", analysis, [], transcript, prescription)
+        chatbot_service.chatbot.generate(prompt, task='chat')
+        report_analyzer.perform_comprehensive_analysis(report)
+        report_analyzer.perform_comprehensive_analysis(report, transcript, prescription)
+        return list(captured)
+
+    budgeted = run_cases()
+
+    # Raw concatenation, as before the prompt builder: no selection, dedup or truncation
+    passthrough_docs = lambda texts, budget, query=None: "\n".join(texts)
+    passthrough_transcript = lambda text, budget: text
+    chatbot_service.compress_documents = report_analyzer.compress_documents = passthrough_docs
+    chatbot_service.compress_transcript = report_analyzer.compress_transcript = passthrough_transcript
+    raw = run_cases()
+
+    cases = ["chat + 3 RAG contexts", "chat + transcript + Rx", "report analysis", "report + transcript + Rx"]
+    print(f"report pages={args.pages} transcript words={args.transcript_words} stub latency={args.ms_per_1k_tokens} ms/1k tokens")
+    print(f"{'case':<26} {'raw tokens':>11} {'budgeted':>9} {'saved':>7} {'raw ms':>9} {'budgeted ms':>12}")
+    for name, (raw_tokens, raw_s), (new_tokens, new_s) in zip(cases, raw, budgeted):
+        saved = 100 * (1 - new_tokens / raw_tokens) if raw_tokens else 0
+        print(f"{name:<26} {raw_tokens:>11} {new_tokens:>9} {saved:>6.1f}% {raw_s * 1000:>9.1f} {new_s * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
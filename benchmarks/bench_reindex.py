@@ -0,0 +1,143 @@
+# Benchmark: bulk re-index throughput, crash/resume and alias swap, against the local fakes
+# Usage: python -m benchmarks.bench_reindex --reports 3000 --vectors 1000 --workers 0,2,4 --embed-cpu-ms 2
+# The fake encoder burns --embed-cpu-ms of CPU per text, so the process pool's speed-up is visible.
+# Every run checks that the shadow index ends up with exactly the expected vector ids; the resume run
+# "crashes" after a few pages and is restarted from its checkpoint. Any failed check exits non-zero
+# (tests/test_reindex.py runs the id checks under pytest).
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks import fakes
+
+
+class SimulatedCrash(Exception):
+    pass
+
+
+def seed(db, pc, source_name: str, reports: int, prescriptions: int, vectors: int) -> set:
+    """Populate Firestore and the serving index; returns the vector ids a full rebuild must produce"""
+    expected = set()
+    batch = db.batch()
+    for i in range(reports):
+        text = f"Call report {i}: patient reports fever for {i % 9 + 1} days; advised paracetamol and fluids."
+        batch.set(db.collection('reports').document(f"report-{i:06d}"), {'type': 'ai_generated', 'content': {'observations': text}})
+        expected.add(f"report-{i:06d}")
+    for i in range(prescriptions):
+        batch.set(db.collection('prescriptions').document(f"rx-{i:06d}"),
+                  {'medication': 'Paracetamol 500mg', 'dosage': '1 tablet', 'instructions': f"after food, day {i}"})
+    batch.commit()
+    source = pc.Index(source_name)
+    records = []
+    for i in range(vectors):
+        kind = i % 3
+        if kind == 0:
+            records.append((f"q_{i}", [0.1] * source.dimension, {'query': f"question {i}", 'response': 'answer', 'type': 'query'}))
+        elif kind == 1:
+            records.append((f"analysis_{i}", [0.1] * source.dimension, {'full_text': f"uploaded report analysis {i}", 'type': 'medical_analysis'}))
+        else:
+            records.append((f"orphan_{i}", [0.1] * source.dimension, {'type': 'unknown'}))  # no text: skipped
+        if kind != 2:
+            expected.add(records[-1][0])
+    source.upsert(vectors=records)
+    return expected
+
+
+def run_build(reindex, db, pc, target: str, sources, checkpoint_path: str, source_name: str, workers: int, args,
+              crash_after_pages: int = 0):
+    checkpoint = reindex.Checkpoint(checkpoint_path, target, 'fake-model', 0, sources)
+    if crash_after_pages:
+        original_save, saves = checkpoint.save, [0]
+
+        def crashing_save():
+            original_save()
+            saves[0] += 1
+            if saves[0] >= crash_after_pages:
+                raise SimulatedCrash()
+
+        checkpoint.save = crashing_save
+    start = time.perf_counter()
+    state = reindex.build(db, pc, target, sources, checkpoint, source_name, 'fake-model', workers,
+                          args.page_size, args.embed_batch, args.upsert_batch, 0, 384)
+    return state, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-index throughput and resume check against fakes")
+    parser.add_argument("--reports", type=int, default=3000)
+    parser.add_argument("--prescriptions", type=int, default=0, help="Also index prescriptions when > 0")
+    parser.add_argument("--vectors", type=int, default=900, help="Existing vectors in the serving index")
+    parser.add_argument("--workers", default="0,2,4", help="Comma-separated process-pool sizes to compare")
+    parser.add_argument("--embed-cpu-ms", type=float, default=2.0, help="Fake encoder CPU cost per text")
+    parser.add_argument("--page-size", type=int, default=250)
+    parser.add_argument("--embed-batch", type=int, default=64)
+    parser.add_argument("--upsert-batch", type=int, default=100)
+    parser.add_argument("--upsert-latency-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    db = fakes.install({'LOG_INFO_SAMPLE_RATE': '0', 'PINECONE_INDEX_ALIAS_DOC': 'config/vector_index',
+                        'PINECONE_ALIAS_REFRESH_S': '0'})
+    fakes.configure(embed_cpu_ms_per_text=args.embed_cpu_ms, vector_latency_ms=args.upsert_latency_ms, firestore_latency_ms=2)
+    from pinecone import Pinecone
+    from src import reindex
+    logging.getLogger("reindex").setLevel(logging.WARNING)  # per-page progress lines
+
+    pc = Pinecone(api_key='fake')
+    source_name = os.environ['PINECONE_INDEX_NAME']
+    expected = seed(db, pc, source_name, args.reports, args.prescriptions, args.vectors)
+    if args.prescriptions:
+        expected |= {f"rx_rx-{i:06d}" for i in range(args.prescriptions)}
+    sources = ["vectors", "reports"] + (["prescriptions"] if args.prescriptions else [])
+    docs = args.reports + args.prescriptions + args.vectors
+    workdir = tempfile.mkdtemp(prefix="reindex-bench-")
+
+    print(f"{docs} source docs, fake encoder {args.embed_cpu_ms} ms CPU/text, upsert latency {args.upsert_latency_ms} ms")
+    print(f"{'workers':>8} {'seconds':>9} {'docs/s':>9} {'vectors':>8} {'ids match':>10}")
+    failures = []
+    for workers in [int(w) for w in args.workers.split(",")]:
+        target = f"shadow-w{workers}"
+        state, elapsed = run_build(reindex, db, pc, target, sources, os.path.join(workdir, f"{target}.json"),
+                                   source_name, workers, args)
+        ids = set(pc.Index(target).vectors)
+        print(f"{workers:>8} {elapsed:>9.2f} {docs / elapsed:>9.1f} {len(ids):>8} {str(ids == expected):>10}")
+        if ids != expected:
+            failures.append(f"build with {workers} workers: ids differ")
+
+    # Crash after 3 pages, then resume from the checkpoint with a fresh process state
+    target, path = "shadow-resume", os.path.join(workdir, "resume.json")
+    try:
+        run_build(reindex, db, pc, target, sources, path, source_name, 2, args, crash_after_pages=3)
+    except SimulatedCrash:
+        pass
+    done_before = reindex.Checkpoint(path, target, 'fake-model', 0, sources).state['docs']
+    state, _ = run_build(reindex, db, pc, target, sources, path, source_name, 2, args)
+    ids = set(pc.Index(target).vectors)
+    print(f"\nresume: crashed after {done_before} docs, resumed to {state['docs']} docs; "
+          f"{len(ids)} vectors, ids match: {ids == expected}")
+    if ids != expected:
+        failures.append("resumed build: ids differ")
+
+    # A live write during the build lands in the shadow index too, then the swap is picked up by RAG
+    from src import rag
+    reindex.mark_building(db, target)
+    rag.get_index()
+    rag.upsert_to_pinecone([[0.2] * 384], ["live-write-during-build"], [{'full_text': 'new report', 'type': 'ai_report'}])
+    dual_written = 'live-write-during-build' in pc.Index(target).vectors
+    print(f"dual write: live vector present in shadow index: {dual_written}")
+    if not dual_written:
+        failures.append("dual write: live vector missing from the shadow index")
+    reindex.swap_alias(db, pc, target, min_vectors=1)
+    rag.get_index()
+    alias = db.document('config/vector_index').get().to_dict()
+    print(f"swap: alias -> {alias['active_index']} (previous {alias['previous_index']}), rag serving {rag.index_name}")
+    if alias['active_index'] != target or rag.index_name != target:
+        failures.append(f"swap: serving {rag.index_name}, expected {target}")
+    if failures:
+        raise SystemExit("FAILED: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
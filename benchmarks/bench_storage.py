@@ -0,0 +1,130 @@
+# Benchmark: storage upload throughput, single request vs concurrent parts, plus dedup and resume checks
+# Usage: python -m benchmarks.bench_storage --size-mb 64 --workers 1,2,4,8 --link-mb-per-s 20 --link-latency-ms 40
+# Runs against the local backend. --link-mb-per-s/--link-latency-ms throttle each request like a WAN
+# connection (0 = raw disk speed), which is where concurrent parts pay off. The Cloudinary backend's
+# chunked protocol is exercised against the fake uploader, with injected connection errors.
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+from benchmarks import fakes
+
+
+class SimulatedCrash(BaseException):
+    """Escapes the per-request retries, like the process being killed mid-upload"""
+
+
+def make_file(directory: str, size_mb: float, seed: int) -> str:
+    path = os.path.join(directory, f"recording-{seed}.mp4")
+    block = hashlib.sha256(str(seed).encode()).digest() * 32768  # 1 MiB
+    with open(path, 'wb') as f:
+        remaining = int(size_mb * 1024 * 1024)
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+    return path
+
+
+def sha256_of(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage upload throughput, dedup and resume")
+    parser.add_argument("--size-mb", type=float, default=64)
+    parser.add_argument("--part-mb", type=float, default=6)
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated concurrent part counts")
+    parser.add_argument("--link-mb-per-s", type=float, default=20.0, help="Per-request bandwidth (0 = unthrottled)")
+    parser.add_argument("--link-latency-ms", type=float, default=40.0, help="Per-request latency")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="storage-bench-")
+    fakes.install({'LOG_INFO_SAMPLE_RATE': '0', 'STORAGE_STATE_DIR': os.path.join(workdir, 'state')})
+    from src.storage import LocalStorage, LocalDedupIndex, CloudinaryStorage, read_object
+
+    def throttle(nbytes: int) -> None:
+        delay = args.link_latency_ms / 1000
+        if args.link_mb_per_s:
+            delay += nbytes / (args.link_mb_per_s * 1024 * 1024)
+        time.sleep(delay)
+
+    class LinkLocalStorage(LocalStorage):
+        """Local backend behind a simulated network link"""
+
+        def _put_whole(self, file_path, destination):
+            throttle(os.path.getsize(file_path))
+            return super()._put_whole(file_path, destination)
+
+        def _put_part(self, upload_id, file_path, destination, offset, data, size):
+            throttle(len(data))
+            return super()._put_part(upload_id, file_path, destination, offset, data, size)
+
+    part_size = int(args.part_mb * 1024 * 1024)
+    source = make_file(workdir, args.size_mb, 1)
+    expected = sha256_of(open(source, 'rb').read())
+    root = os.path.join(workdir, 'objects')
+
+    print(f"{args.size_mb:.0f} MB file, {args.part_mb:.0f} MB parts, link {args.link_mb_per_s or 'unthrottled'} MB/s "
+          f"+ {args.link_latency_ms:.0f} ms per request")
+    print(f"{'mode':<22} {'seconds':>8} {'MB/s':>8} {'intact':>7}")
+    modes = [("single request", dict(chunk_threshold=1 << 62))]
+    modes += [(f"parts x{w}", dict(chunk_threshold=0, workers=w)) for w in (int(v) for v in args.workers.split(","))]
+    for label, options in modes:
+        backend = LinkLocalStorage(root=root, part_size=part_size, **options)
+        start = time.perf_counter()
+        stored = backend.put(source, f"recordings/{label.replace(' ', '-')}")
+        elapsed = time.perf_counter() - start
+        intact = sha256_of(read_object(stored['url'])) == expected
+        print(f"{label:<22} {elapsed:>8.2f} {args.size_mb / elapsed:>8.1f} {str(intact):>7}")
+
+    # Content-hash dedup: the second upload of identical bytes is answered from the index
+    index = LocalDedupIndex(os.path.join(workdir, 'state', 'dedup.json'))
+    backend = LinkLocalStorage(root=root, part_size=part_size, chunk_threshold=0, workers=4, dedup_index=index)
+    first = backend.put(source, "recordings/session-a")
+    start = time.perf_counter()
+    second = backend.put(source, "recordings/session-b")
+    print(f"\ndedup: repeat upload took {(time.perf_counter() - start) * 1000:.0f} ms (hash only), "
+          f"deduplicated={second['deduplicated']}, same url={second['url'] == first['url']}")
+
+    # Resume: the process dies after 3 parts; the retry sends only the remaining ones
+    crash_source = make_file(workdir, args.size_mb, 2)
+    sent = []
+
+    class CrashingStorage(LinkLocalStorage):
+        crash_after = 3
+
+        def _put_part(self, upload_id, file_path, destination, offset, data, size):
+            if self.crash_after is not None and len(sent) >= self.crash_after:
+                raise SimulatedCrash()
+            sent.append(offset)
+            return super()._put_part(upload_id, file_path, destination, offset, data, size)
+
+    backend = CrashingStorage(root=root, part_size=part_size, chunk_threshold=0, workers=1)
+    try:
+        backend.put(crash_source, "recordings/crashy")
+    except SimulatedCrash:
+        pass
+    before = len(sent)
+    backend.crash_after = None
+    stored = backend.put(crash_source, "recordings/crashy")
+    total = -(-os.path.getsize(crash_source) // part_size)
+    intact = sha256_of(read_object(stored['url'])) == sha256_of(open(crash_source, 'rb').read())
+    print(f"resume: {before} parts before the crash, {len(sent) - before} after, {total} total; intact={intact}")
+
+    # Cloudinary chunked protocol against the fake uploader, with every 5th request failing
+    fakes.configure(upload_error_every=5, upload_latency_ms=args.link_latency_ms, upload_mb_per_s=args.link_mb_per_s)
+    fakes.reset_counters()
+    backend = CloudinaryStorage(part_size=part_size, chunk_threshold=0, workers=4)
+    start = time.perf_counter()
+    stored = backend.put(source, "recordings/cloudinary")
+    elapsed = time.perf_counter() - start
+    intact = sha256_of(fakes.UPLOADED[stored['url']]) == expected
+    print(f"cloudinary (fake): {elapsed:.2f}s, {fakes.CALLS['upload']} requests for {-(-os.path.getsize(source) // part_size)} "
+          f"parts (retries included), intact={intact}")
+
+
+if __name__ == "__main__":
+    main()
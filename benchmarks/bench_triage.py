@@ -0,0 +1,77 @@
+# Benchmark: emergency answer latency, local pre-filter vs LLM-classified path, and rule accuracy
+# Usage: python -m benchmarks.bench_triage --llm-latency-ms 800
+# Runs against the fakes by default; pass --real to use the installed MiniLM model for the embedding stage.
+
+import argparse
+import statistics
+import time
+
+from benchmarks import fakes
+
+LABELLED = [
+    ("I have crushing chest pain and I'm sweating", True),
+    ("my dad collapsed and isn't breathing, help", True),
+    ("I can't breathe properly and my lips look blue", True),
+    ("my mother's face is drooping and her speech is slurred", True),
+    ("I want to kill myself", True),
+    ("my son swallowed bleach", True),
+    ("her throat is swelling after eating peanuts", True),
+    ("he is having a seizure right now", True),
+    ("what are the symptoms of a heart attack?", False),
+    ("how do I prevent a stroke?", False),
+    ("what causes seizures in dogs?", False),
+    ("I have had a mild cough for two days", False),
+    ("is a TSH of 3.1 normal?", False),
+    ("my chest feels fine now after the antacid, what should I eat", False),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emergency pre-filter latency and accuracy")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--real", action="store_true", help="Use the real sentence-transformers model")
+    args = parser.parse_args()
+
+    env = {'LOG_INFO_SAMPLE_RATE': '0', 'GEMINI_KEY_RPM': '1000000', 'GEMINI_MODEL_RPM': '1000000'}
+    if args.real:
+        import sys
+        fakes.install(env)
+        sys.modules.pop('sentence_transformers', None)  # keep every fake except the embedder
+    else:
+        fakes.install(env)
+    fakes.configure(llm_latency_ms=args.llm_latency_ms)
+    from src import chatbot_service
+    from src.triage import detect_emergency, match_keywords
+
+    message = "I have crushing chest pain and can't breathe"
+    timings = {}
+    for enabled in (False, True):
+        chatbot_service.TRIAGE_PREFILTER_ENABLED = enabled
+        samples = []
+        for i in range(args.repeat):
+            start = time.perf_counter()
+            # Distinct suffix per call so request coalescing does not hide the LLM round trip
+            answer = chatbot_service.chatbot.generate_response(f"{message} ({i})")
+            samples.append(time.perf_counter() - start)
+            assert "EMERGENCY" in answer
+        timings[enabled] = samples
+    print(f"emergency answer, LLM triage only : median {statistics.median(timings[False]) * 1000:8.1f} ms")
+    print(f"emergency answer, local pre-filter: median {statistics.median(timings[True]) * 1000:8.3f} ms")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        match_keywords(message)
+    print(f"keyword stage: {(time.perf_counter() - start) * 1000:.1f} us per message")
+
+    correct = 0
+    for text, expected in LABELLED:
+        predicted = detect_emergency(text) is not None
+        correct += predicted == expected
+        if predicted != expected:
+            print(f"  miss: expected {'emergency' if expected else 'non-emergency'}: {text!r}")
+    print(f"pre-filter accuracy on {len(LABELLED)} labelled messages: {correct}/{len(LABELLED)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# Benchmark: memory per API worker for each MODEL_DEPLOYMENT_MODE (in-process, preload, sidecar)
+# Usage: python -m benchmarks.bench_workers --workers 4 --embed-weights-mb 90 --whisper-weights-mb 150
+# Each mode starts a master that launches N workers the way production would: spawned fresh (in-process,
+# sidecar) or forked after importing the app (preload, as gunicorn --preload does). Every worker imports
+# src.main, embeds a few queries and transcribes a clip, then reports; the master reads /proc smaps_rollup.
+# RSS counts shared pages in every process, PSS splits them between sharers and USS is what each worker
+# alone holds, so "total PSS" is the box's real footprint. The fakes hold --*-weights-mb of resident
+# "weights" per loaded model (MiniLM-L6 is ~90 MB and Whisper tiny ~150 MB in fp32); linux only.
+
+import argparse
+import gc
+import multiprocessing as mp
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks import fakes
+
+MODES = ("in-process", "preload", "sidecar")
+
+
+def memory_mb(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {'rss': fields['Rss'], 'pss': fields['Pss'], 'uss': fields['Private_Clean'] + fields['Private_Dirty']}
+
+
+def _quiet_logs():
+    from src.logger import set_output_stream
+    set_output_stream(open(os.devnull, 'w'))
+
+
+def _work_and_report(conn):
+    """What each worker does once the app is imported"""
+    from src import rag, video_call_service
+    latencies = []
+    for i in range(100):
+        start = time.perf_counter()
+        rag.embed_text(f"what does a TSH of {i % 7} mean?")
+        latencies.append((time.perf_counter() - start) * 1000)
+    video_call_service.get_whisper_model().transcribe(np.zeros(16000, dtype=np.float32))
+    gc.collect()
+    conn.send({'pid': os.getpid(), 'embed_p50_ms': statistics.median(latencies)})
+    conn.recv()  # stay alive until the master has measured everyone
+
+
+def _spawned_worker(conn):
+    fakes.install()
+    import src.main  # noqa: F401
+    _quiet_logs()
+    _work_and_report(conn)
+
+
+def _forked_worker(conn, workers):
+    from src.model_server import after_fork
+    after_fork(workers)
+    _work_and_report(conn)
+
+
+def _sidecar():
+    fakes.install()
+    import asyncio
+    from src.model_server import ModelServer, load_models
+    _quiet_logs()
+    asyncio.run(ModelServer(*load_models()).serve())
+
+
+def _wait_for_socket(path: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(path)
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"model server did not start on {path}")
+
+
+def _master(mode: str, workers: int, result_conn):
+    fakes.install()
+    spawn = mp.get_context("spawn")
+    extra = {}
+    if mode == "preload":
+        import src.main  # noqa: F401  loads the embedder and Whisper once, here
+        _quiet_logs()
+        gc.freeze()
+        ctx, target, args = mp.get_context("fork"), _forked_worker, (workers,)
+    else:
+        ctx, target, args = spawn, _spawned_worker, ()
+        if mode == "sidecar":
+            sidecar = spawn.Process(target=_sidecar, daemon=True)
+            sidecar.start()
+            _wait_for_socket(os.environ['MODEL_SERVER_SOCKET'])
+            extra['sidecar'] = sidecar
+    pipes, procs = [], []
+    for _ in range(workers):
+        parent, child = ctx.Pipe()
+        proc = ctx.Process(target=target, args=(child,) + args)
+        proc.start()
+        child.close()
+        pipes.append(parent)
+        procs.append(proc)
+    reports = [pipe.recv() for pipe in pipes]
+    result = {
+        'workers': [{**memory_mb(r['pid']), 'embed_p50_ms': r['embed_p50_ms']} for r in reports],
+        'master': memory_mb(os.getpid()),
+        'sidecar': memory_mb(extra['sidecar'].pid) if 'sidecar' in extra else None,
+    }
+    if mode == "sidecar":
+        from src.model_server import server_stats
+        result['server_stats'] = server_stats()
+    for pipe in pipes:
+        pipe.send(None)
+    for proc in procs:
+        proc.join()
+    if 'sidecar' in extra:
+        extra['sidecar'].terminate()
+    result_conn.send(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory for each model deployment mode")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--embed-weights-mb", type=float, default=90)
+    parser.add_argument("--whisper-weights-mb", type=float, default=150)
+    args = parser.parse_args()
+    if not sys.platform.startswith("linux"):
+        raise SystemExit("needs /proc/<pid>/smaps_rollup (linux)")
+
+    workdir = tempfile.mkdtemp(prefix="workers-bench-")
+    spawn = mp.get_context("spawn")
+    print(f"{args.workers} workers, fake weights: embedder {args.embed_weights_mb:.0f} MB, whisper {args.whisper_weights_mb:.0f} MB")
+    print(f"{'mode':<11} {'RSS/worker':>11} {'PSS/worker':>11} {'USS/worker':>11} {'master PSS':>11} {'sidecar PSS':>12} "
+          f"{'total PSS':>10} {'embed p50 ms':>13}")
+    for mode in [m for m in args.modes.split(",") if m]:
+        # Children read these at import, so they are set before the master is spawned
+        os.environ.update({
+            'MODEL_DEPLOYMENT_MODE': mode, 'MODEL_SERVER_SOCKET': os.path.join(workdir, f"{mode}.sock"),
+            'FAKE_EMBED_WEIGHTS_MB': str(args.embed_weights_mb), 'FAKE_WHISPER_WEIGHTS_MB': str(args.whisper_weights_mb),
+            'LOG_INFO_SAMPLE_RATE': '0', 'DEBUG': 'False',
+        })
+        parent, child = spawn.Pipe()
+        master = spawn.Process(target=_master, args=(mode, args.workers, child))
+        master.start()
+        child.close()  # so a crashed master surfaces as EOFError instead of a hang
+        result = parent.recv()
+        master.join()
+        rows = result['workers']
+        sidecar_pss = result['sidecar']['pss'] if result['sidecar'] else 0.0
+        total = sum(r['pss'] for r in rows) + result['master']['pss'] + sidecar_pss
+        mean = lambda key: statistics.mean(r[key] for r in rows)
+        print(f"{mode:<11} {mean('rss'):>11.0f} {mean('pss'):>11.0f} {mean('uss'):>11.0f} {result['master']['pss']:>11.0f} "
+              f"{(f'{sidecar_pss:.0f}' if result['sidecar'] else '-'):>12} {total:>10.0f} {mean('embed_p50_ms'):>13.3f}")
+        if result.get('server_stats'):
+            stats = result['server_stats']
+            print(f"{'':<11} model server: {stats['batches']} encode batches, {stats['avg_batch']:.2f} texts/batch")
+
+
+if __name__ == "__main__":
+    main()
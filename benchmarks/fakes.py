@@ -0,0 +1,834 @@
+# Deterministic in-process fakes for the external services the API talks to
+# (Gemini, Pinecone, Firestore, Cloudinary, Whisper; plus the Firebase auth, PyAV
+# and HTTP download helpers those code paths depend on).
+# Call install() BEFORE importing anything from src, then import the app as usual.
+
+import copy
+import hashlib
+import itertools
+import os
+import sys
+import threading
+import time
+import types
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Tunables, set through configure() or the matching FAKE_* environment variables
+SETTINGS = {
+    'llm_latency_ms': float(os.getenv('FAKE_LLM_LATENCY_MS', 0)),
+    'llm_ms_per_1k_tokens': float(os.getenv('FAKE_LLM_MS_PER_1K_TOKENS', 0)),
+    'llm_error_every': int(os.getenv('FAKE_LLM_ERROR_EVERY', 0)),  # every Nth call raises a 429
+    'vector_latency_ms': float(os.getenv('FAKE_VECTOR_LATENCY_MS', 0)),
+    'firestore_latency_ms': float(os.getenv('FAKE_FIRESTORE_LATENCY_MS', 0)),
+    'upload_latency_ms': float(os.getenv('FAKE_UPLOAD_LATENCY_MS', 0)),
+    'upload_mb_per_s': float(os.getenv('FAKE_UPLOAD_MB_PER_S', 0)),  # per-request bandwidth; 0 = unlimited
+    'upload_error_every': int(os.getenv('FAKE_UPLOAD_ERROR_EVERY', 0)),  # every Nth upload request raises
+    'whisper_latency_ms': float(os.getenv('FAKE_WHISPER_LATENCY_MS', 0)),
+    'embed_cpu_ms_per_text': float(os.getenv('FAKE_EMBED_CPU_MS_PER_TEXT', 0)),  # busy CPU, like a real encoder
+    'embed_weights_mb': float(os.getenv('FAKE_EMBED_WEIGHTS_MB', 0)),  # resident "weights" per loaded embedder
+    'whisper_weights_mb': float(os.getenv('FAKE_WHISPER_WEIGHTS_MB', 0)),
+}
+
+# Call counters, useful for asserting how many upstream calls a code path made
+CALLS = {'llm': 0, 'embed': 0, 'vector_query': 0, 'vector_upsert': 0, 'firestore_read': 0,
+         'firestore_write': 0, 'upload': 0, 'transcribe': 0}
+_calls_lock = threading.Lock()
+
+
+def configure(**settings) -> None:
+    """Override tunables, e.g. configure(llm_latency_ms=200)"""
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        raise KeyError(f"Unknown fake settings: {sorted(unknown)}")
+    SETTINGS.update(settings)
+
+
+def _count(name: str, n: int = 1) -> int:
+    with _calls_lock:
+        CALLS[name] += n
+        return CALLS[name]
+
+
+def _sleep_ms(ms: float) -> None:
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+def _fake_weights(mb: float) -> np.ndarray:
+    # Written once at load and only read afterwards, like real model weights
+    return np.full(int(mb * 1024 * 1024 / 4), 0.5, dtype=np.float32)
+
+
+def _burn_cpu_ms(ms: float) -> None:
+    # Spins while holding the GIL, so only more processes (not threads) add throughput
+    deadline = time.perf_counter() + ms / 1000
+    while time.perf_counter() < deadline:
+        pass
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+# ---------------------------------------------------------------- Gemini
+
+class ResourceExhausted(Exception):
+    """Mimics google.api_core.exceptions.ResourceExhausted (HTTP 429)"""
+    code = 429
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    EMERGENCY_WORDS = ('chest pain', "can't breathe", 'cannot breathe', 'unconscious', 'overdose', 'suicide', 'stroke')
+
+    def __init__(self, model_name: str = 'gemini-fake', **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, **kwargs):
+        prompt = prompt if isinstance(prompt, str) else str(prompt)
+        n = _count('llm')
+        if SETTINGS['llm_error_every'] and n % SETTINGS['llm_error_every'] == 0:
+            raise ResourceExhausted("429 Resource has been exhausted (fake)")
+        _sleep_ms(SETTINGS['llm_latency_ms'] + SETTINGS['llm_ms_per_1k_tokens'] * _approx_tokens(prompt) / 1000)
+        digest = hashlib.sha1(prompt.encode()).hexdigest()[:12]
+        if 'Analyze this user message' in prompt:
+            lowered = prompt.lower()
+            urgency = 'emergency' if any(w in lowered for w in self.EMERGENCY_WORDS) else 'medium'
+            return _FakeResponse(
+                "Medical: yes\nNeeds_database: yes\nResponse_type: general_info\n"
+                f"Urgency: {urgency}\nIntent: Medical inquiry"
+            )
+        return _FakeResponse(f"[{self.model_name}:{digest}] Deterministic answer for a {_approx_tokens(prompt)}-token prompt.")
+
+
+def _build_genai_module():
+    genai = types.ModuleType('google.generativeai')
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = FakeGenerativeModel
+    return genai
+
+
+# ---------------------------------------------------------------- Sentence embeddings
+
+class FakeSentenceTransformer:
+    def __init__(self, model_name_or_path: str = 'fake', device=None, **kwargs):
+        self.model_name = model_name_or_path
+        self.dimension = int(os.getenv('PINECONE_DIMENSION', 384))
+        self.weights = _fake_weights(SETTINGS['embed_weights_mb'])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], 'little')
+        vec = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+        return vec / np.linalg.norm(vec)
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        _count('embed', len(texts))
+        _burn_cpu_ms(SETTINGS['embed_cpu_ms_per_text'] * len(texts))
+        out = np.stack([self._embed_one(t) for t in texts]) if texts else np.zeros((0, self.dimension), np.float32)
+        return out[0] if single else out
+
+
+def _build_sentence_transformers_module():
+    module = types.ModuleType('sentence_transformers')
+    module.SentenceTransformer = FakeSentenceTransformer
+    return module
+
+
+# ---------------------------------------------------------------- Pinecone
+
+class FakeIndex:
+    def __init__(self, name: str, dimension: int):
+        self.name = name
+        self.dimension = dimension
+        self.vectors = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors, namespace=None, **kwargs):
+        _count('vector_upsert')
+        _sleep_ms(SETTINGS['vector_latency_ms'])
+        with self._lock:
+            for item in vectors:
+                if isinstance(item, dict):
+                    vid, values, meta = item['id'], item['values'], item.get('metadata', {})
+                else:
+                    vid, values, meta = item
+                self.vectors[vid] = (np.asarray(values, dtype=np.float32), copy.deepcopy(meta))
+        return {'upserted_count': len(vectors)}
+
+    def query(self, vector, top_k: int = 10, include_metadata: bool = False, filter=None, **kwargs):
+        _count('vector_query')
+        _sleep_ms(SETTINGS['vector_latency_ms'])
+        query = np.asarray(vector, dtype=np.float32)
+        qnorm = np.linalg.norm(query) or 1.0
+        with self._lock:
+            items = list(self.vectors.items())
+        scored = []
+        for vid, (values, meta) in items:
+            denom = (np.linalg.norm(values) or 1.0) * qnorm
+            scored.append((float(values @ query / denom), vid, meta))
+        scored.sort(key=lambda s: s[0], reverse=True)
+        matches = [{'id': vid, 'score': score, 'metadata': copy.deepcopy(meta) if include_metadata else None}
+                   for score, vid, meta in scored[:top_k]]
+        return {'matches': matches}
+
+    def fetch(self, ids, **kwargs):
+        with self._lock:
+            return {'vectors': {i: {'id': i, 'values': self.vectors[i][0].tolist(), 'metadata': self.vectors[i][1]}
+                                for i in ids if i in self.vectors}}
+
+    def delete(self, ids=None, delete_all: bool = False, **kwargs):
+        with self._lock:
+            if delete_all:
+                self.vectors.clear()
+            for i in ids or []:
+                self.vectors.pop(i, None)
+
+    def list_paginated(self, prefix=None, limit: int = 100, pagination_token=None, **kwargs):
+        # Token is the last id of the previous page, like an opaque cursor
+        with self._lock:
+            ids = sorted(i for i in self.vectors if not prefix or i.startswith(prefix))
+        if pagination_token:
+            ids = [i for i in ids if i > pagination_token]
+        page = ids[:limit]
+        more = len(ids) > limit
+        return types.SimpleNamespace(vectors=[types.SimpleNamespace(id=i) for i in page],
+                                     pagination=types.SimpleNamespace(next=page[-1]) if more else None)
+
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            return {'dimension': self.dimension, 'total_vector_count': len(self.vectors)}
+
+
+class _IndexDescription:
+    def __init__(self, name: str, dimension: int):
+        self.name = name
+        self.dimension = dimension
+
+
+class FakePinecone:
+    indexes = {}
+
+    def __init__(self, api_key=None, **kwargs):
+        pass
+
+    def list_indexes(self):
+        return [_IndexDescription(name, idx.dimension) for name, idx in self.indexes.items()]
+
+    def create_index(self, name, dimension, metric='cosine', spec=None, **kwargs):
+        self.indexes.setdefault(name, FakeIndex(name, dimension))
+
+    def delete_index(self, name):
+        self.indexes.pop(name, None)
+
+    def Index(self, name):
+        if name not in self.indexes:
+            self.indexes[name] = FakeIndex(name, int(os.getenv('PINECONE_DIMENSION', 384)))
+        return self.indexes[name]
+
+
+def _build_pinecone_module():
+    module = types.ModuleType('pinecone')
+    module.Pinecone = FakePinecone
+    module.ServerlessSpec = lambda **kwargs: dict(kwargs)
+    return module
+
+
+# ---------------------------------------------------------------- Firestore
+
+SERVER_TIMESTAMP = object()
+DOCUMENT_ID = '__name__'
+
+
+class ArrayUnion:
+    def __init__(self, values):
+        self.values = list(values)
+
+
+class FieldFilter:
+    def __init__(self, field_path, op_string, value):
+        self.field_path, self.op_string, self.value = field_path, op_string, value
+
+
+def _resolve_field(data: dict, path: str):
+    value = data
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _sort_key(value):
+    # Firestore orders mixed types by type first; None sorts lowest
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, datetime):
+        return (2, value.timestamp())
+    return (3, str(value))
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data, field_paths=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        if data is not None and field_paths is not None:
+            data = {k: v for k, v in data.items() if k in set(field_paths)}
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        return copy.deepcopy(_resolve_field(self._data or {}, field_path))
+
+
+class FakeDocumentReference:
+    def __init__(self, client, path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f"DocumentReference({self.path})"
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._client, self.path.rsplit('/', 1)[0])
+
+    def collection(self, name: str):
+        return FakeCollectionReference(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, **kwargs):
+        return self._client._read(self, field_paths)
+
+    def set(self, data: dict, merge: bool = False):
+        self._client._write(self, data, merge=merge, must_exist=False)
+
+    def update(self, data: dict):
+        self._client._write(self, data, merge=True, must_exist=True)
+
+    def delete(self):
+        self._client._delete(self)
+
+
+class FakeQuery:
+    def __init__(self, client, collection_path: str, filters=(), orders=(), limit_n=None, cursor=None, projection=None):
+        self._client = client
+        self._path = collection_path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_n
+        self._cursor = cursor
+        self._projection = projection
+
+    def _clone(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, limit_n=self._limit,
+                     cursor=self._cursor, projection=self._projection)
+        state.update(changes)
+        return FakeQuery(self._client, self._path, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._clone(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._clone(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int):
+        return self._clone(limit_n=count)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._clone(cursor=document_fields_or_snapshot)
+
+    def select(self, field_paths):
+        return self._clone(projection=list(field_paths))
+
+    def _matches(self, doc_id, data) -> bool:
+        for field, op, value in self._filters:
+            actual = doc_id if field == DOCUMENT_ID else _resolve_field(data, field)
+            if op == '==' and actual != value:
+                return False
+            if op == '!=' and actual == value:
+                return False
+            if op in ('<', '<=', '>', '>=') and (actual is None or not {
+                '<': actual < value, '<=': actual <= value, '>': actual > value, '>=': actual >= value}[op]):
+                return False
+            if op == 'in' and actual not in value:
+                return False
+            if op == 'array_contains' and (not isinstance(actual, list) or value not in actual):
+                return False
+            if op == 'array_contains_any' and (not isinstance(actual, list) or not set(map(repr, actual)) & set(map(repr, value))):
+                return False
+        return True
+
+    def _effective_orders(self):
+        # Firestore implicitly orders by document id last, in the direction of the last explicit order
+        orders = list(self._orders)
+        if not any(field == DOCUMENT_ID for field, _ in orders):
+            orders.append((DOCUMENT_ID, orders[-1][1] if orders else 'ASCENDING'))
+        return orders
+
+    @staticmethod
+    def _value(doc_id, data, field):
+        return doc_id if field == DOCUMENT_ID else _resolve_field(data, field)
+
+    def _is_after_cursor(self, doc_id, data, orders, cursor_values) -> bool:
+        for (field, direction), cursor_value in zip(orders, cursor_values):
+            a, b = _sort_key(self._value(doc_id, data, field)), _sort_key(cursor_value)
+            if a == b:
+                continue
+            return a > b if direction == 'ASCENDING' else a < b
+        return False
+
+    def stream(self, **kwargs):
+        _sleep_ms(SETTINGS['firestore_latency_ms'])
+        docs = [(doc_id, data) for doc_id, data in self._client._collection_items(self._path) if self._matches(doc_id, data)]
+        orders = self._effective_orders()
+        for field, direction in reversed(orders):
+            docs.sort(key=lambda d, f=field: _sort_key(self._value(d[0], d[1], f)), reverse=direction == 'DESCENDING')
+        if self._cursor is not None:
+            if isinstance(self._cursor, FakeDocumentSnapshot):
+                cursor_values = [self._value(self._cursor.id, self._cursor._data or {}, f) for f, _ in orders]
+            else:
+                cursor_values = [self._cursor.get(f) for f, _ in orders]
+            docs = [d for d in docs if self._is_after_cursor(d[0], d[1], orders, cursor_values)]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        _count('firestore_read', max(1, len(docs)))
+        for doc_id, data in docs:
+            ref = FakeDocumentReference(self._client, f"{self._path}/{doc_id}")
+            yield FakeDocumentSnapshot(ref, copy.deepcopy(data), self._projection)
+
+    def get(self, **kwargs):
+        return list(self.stream())
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, path: str):
+        super().__init__(client, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, document_id: str = None):
+        document_id = document_id or hashlib.sha1(str(next(self._client._ids)).encode()).hexdigest()[:20]
+        return FakeDocumentReference(self._client, f"{self._path}/{document_id}")
+
+    def add(self, data: dict):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append((ref.set, (data, merge)))
+
+    def update(self, ref, data):
+        self._ops.append((ref.update, (data,)))
+
+    def delete(self, ref):
+        self._ops.append((ref.delete, ()))
+
+    def commit(self):
+        with self._client._lock:
+            for fn, args in self._ops:
+                fn(*args)
+        self._ops = []
+
+
+class FakeFirestoreClient:
+    def __init__(self):
+        self._docs = {}
+        self._lock = threading.RLock()
+        self._ids = itertools.count()
+
+    def collection(self, path: str):
+        return FakeCollectionReference(self, path)
+
+    def document(self, path: str):
+        return FakeDocumentReference(self, path)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, references, field_paths=None, **kwargs):
+        references = list(references)
+        _sleep_ms(SETTINGS['firestore_latency_ms'])
+        for ref in references:
+            yield self._read(ref, field_paths, count=False, delay=False)
+        _count('firestore_read', len(references))
+
+    def _collection_items(self, collection_path: str):
+        prefix = collection_path + '/'
+        with self._lock:
+            return [(path[len(prefix):], data) for path, data in self._docs.items()
+                    if path.startswith(prefix) and '/' not in path[len(prefix):]]
+
+    def _read(self, ref, field_paths=None, count=True, delay=True):
+        if delay:
+            _sleep_ms(SETTINGS['firestore_latency_ms'])
+        if count:
+            _count('firestore_read')
+        with self._lock:
+            data = copy.deepcopy(self._docs.get(ref.path))
+        return FakeDocumentSnapshot(ref, data, field_paths)
+
+    def _materialize(self, value, existing=None):
+        if value is SERVER_TIMESTAMP:
+            return datetime.now(timezone.utc)
+        if isinstance(value, ArrayUnion):
+            current = list(existing) if isinstance(existing, list) else []
+            return current + [v for v in value.values if v not in current]
+        if isinstance(value, dict):
+            return {k: self._materialize(v, (existing or {}).get(k) if isinstance(existing, dict) else None)
+                    for k, v in value.items()}
+        return copy.deepcopy(value)
+
+    def _write(self, ref, data, merge: bool, must_exist: bool):
+        _sleep_ms(SETTINGS['firestore_latency_ms'])
+        _count('firestore_write')
+        with self._lock:
+            current = self._docs.get(ref.path)
+            if must_exist and current is None:
+                raise KeyError(f"No document to update: {ref.path}")
+            doc = dict(current) if (merge and current is not None) else {}
+            for key, value in data.items():
+                if '.' in key:
+                    head, _, tail = key.partition('.')
+                    nested = dict(doc.get(head) or {})
+                    nested[tail] = self._materialize(value, nested.get(tail))
+                    doc[head] = nested
+                else:
+                    doc[key] = self._materialize(value, doc.get(key))
+            self._docs[ref.path] = doc
+
+    def _delete(self, ref):
+        with self._lock:
+            self._docs.pop(ref.path, None)
+
+
+_firestore_client = FakeFirestoreClient()
+
+
+def _build_firebase_modules():
+    firebase_admin = types.ModuleType('firebase_admin')
+    firebase_admin.initialize_app = lambda *args, **kwargs: types.SimpleNamespace(name='[DEFAULT]')
+
+    credentials = types.ModuleType('firebase_admin.credentials')
+    credentials.Certificate = lambda path: types.SimpleNamespace(path=path)
+
+    firestore = types.ModuleType('firebase_admin.firestore')
+    firestore.client = lambda *args, **kwargs: _firestore_client
+    firestore.SERVER_TIMESTAMP = SERVER_TIMESTAMP
+    firestore.ArrayUnion = ArrayUnion
+    firestore.FieldFilter = FieldFilter
+    firestore.Query = types.SimpleNamespace(ASCENDING='ASCENDING', DESCENDING='DESCENDING')
+    firestore.FieldPath = types.SimpleNamespace(document_id=lambda: DOCUMENT_ID)
+
+    auth = types.ModuleType('firebase_admin.auth')
+
+    def verify_id_token(id_token, **kwargs):
+        # Tokens look like "uid:<uid>" in benchmarks; anything else is its own uid
+        if not id_token:
+            raise ValueError("empty token")
+        return {'uid': id_token.split(':', 1)[1] if id_token.startswith('uid:') else id_token}
+
+    auth.verify_id_token = verify_id_token
+
+    firebase_admin.credentials = credentials
+    firebase_admin.firestore = firestore
+    firebase_admin.auth = auth
+    return {'firebase_admin': firebase_admin, 'firebase_admin.credentials': credentials,
+            'firebase_admin.firestore': firestore, 'firebase_admin.auth': auth}
+
+
+# ---------------------------------------------------------------- Cloudinary and downloads
+
+UPLOADED = {}  # url -> bytes
+_LARGE_UPLOADS = {}  # X-Unique-Upload-Id -> {offset: bytes}
+_large_lock = threading.Lock()
+
+
+def _transfer(nbytes: int) -> None:
+    n = _count('upload')
+    if SETTINGS['upload_error_every'] and n % SETTINGS['upload_error_every'] == 0:
+        raise ConnectionError("fake upload connection reset")
+    _sleep_ms(SETTINGS['upload_latency_ms'])
+    if SETTINGS['upload_mb_per_s']:
+        time.sleep(nbytes / (SETTINGS['upload_mb_per_s'] * 1024 * 1024))
+
+
+def _stored(folder: str, public_id: str, content: bytes) -> dict:
+    url = f"https://res.cloudinary.fake/{folder}/{public_id}".replace('//', '/').replace('https:/', 'https://')
+    UPLOADED[url] = content
+    return {'secure_url': url, 'public_id': f"{folder}/{public_id}", 'bytes': len(content)}
+
+
+def _upload(file, folder='', resource_type='auto', **kwargs):
+    if hasattr(file, 'read'):
+        content = file.read()
+        name = os.path.basename(getattr(file, 'name', 'upload.bin'))
+    else:
+        with open(file, 'rb') as f:
+            content = f.read()
+        name = os.path.basename(file)
+    _transfer(len(content))
+    return _stored(folder, kwargs.get('public_id') or name, content)
+
+
+def _upload_large_part(file, folder='', http_headers=None, **kwargs):
+    """Chunked upload protocol: parts share X-Unique-Upload-Id; the one completing the byte range returns the result"""
+    name, chunk = file
+    start, rest = http_headers['Content-Range'].split(' ', 1)[1].split('-', 1)
+    end, total = (int(v) for v in rest.split('/'))
+    if end - int(start) + 1 != len(chunk):
+        raise ValueError(f"Content-Range {http_headers['Content-Range']} does not match {len(chunk)} bytes")
+    _transfer(len(chunk))
+    upload_id = http_headers['X-Unique-Upload-Id']
+    with _large_lock:
+        parts = _LARGE_UPLOADS.setdefault(upload_id, {})
+        parts[int(start)] = chunk
+        if sum(len(p) for p in parts.values()) < total:
+            return {'done': False, 'upload_id': upload_id}
+        content = b''.join(parts[offset] for offset in sorted(parts))
+        del _LARGE_UPLOADS[upload_id]
+    return _stored(folder, kwargs.get('public_id') or name, content)
+
+
+def _build_cloudinary_modules():
+    cloudinary = types.ModuleType('cloudinary')
+    cloudinary.config = lambda **kwargs: None
+    uploader = types.ModuleType('cloudinary.uploader')
+    uploader.upload = _upload
+    uploader.upload_large = lambda file, **kwargs: _upload(file, **kwargs)
+    uploader.upload_large_part = _upload_large_part
+    cloudinary.uploader = uploader
+    return {'cloudinary': cloudinary, 'cloudinary.uploader': uploader}
+
+
+class _FakeHTTPResponse:
+    def __init__(self, content: bytes, status_code: int = 200):
+        self.content = content
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size=65536):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _build_requests_module():
+    module = types.ModuleType('requests')
+
+    def get(url, **kwargs):
+        return _FakeHTTPResponse(UPLOADED[url]) if url in UPLOADED else _FakeHTTPResponse(b'', 404)
+
+    module.get = get
+    return module
+
+
+# ---------------------------------------------------------------- Whisper and audio
+
+class FakeWhisperModel:
+    def __init__(self):
+        self.weights = _fake_weights(SETTINGS['whisper_weights_mb'])
+
+    def transcribe(self, audio, **kwargs):
+        _count('transcribe')
+        _sleep_ms(SETTINGS['whisper_latency_ms'])
+        if isinstance(audio, str):
+            with open(audio, 'rb') as f:
+                audio = f.read()
+        size = getattr(audio, 'nbytes', None) or len(audio)
+        return {'text': f"Patient reports mild headache and fatigue for three days. ({size} bytes of audio)"}
+
+
+class FakeAVError(Exception):
+    pass
+
+
+class _FakeAudioFrame:
+    def __init__(self, samples: int):
+        self.samples = samples
+
+    def to_ndarray(self):
+        return np.zeros((1, self.samples), dtype=np.float32)
+
+
+class FakeAudioResampler:
+    def __init__(self, format=None, layout=None, rate=None, **kwargs):
+        self.rate = rate
+
+    def resample(self, frame):
+        return [] if frame is None else [frame]
+
+
+class FakeMediaContainer:
+    """Treats the source as 128 kbit/s media and decodes it to that much silence, in 1024-sample frames"""
+
+    def __init__(self, nbytes: int):
+        self.duration = int(nbytes * 8 / 128000 * 1_000_000)
+        self.streams = types.SimpleNamespace(audio=[types.SimpleNamespace(duration=None, time_base=None)])
+
+    def decode(self, stream):
+        remaining = int(self.duration / 1_000_000 * 16000)
+        while remaining > 0:
+            yield _FakeAudioFrame(min(1024, remaining))
+            remaining -= 1024
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _open_media(file, mode='r', options=None, **kwargs):
+    if hasattr(file, 'read'):
+        nbytes = len(file.read())
+    elif file.startswith(('http://', 'https://')):
+        if file not in UPLOADED:
+            raise FakeAVError(f"HTTP error 404: {file}")
+        nbytes = len(UPLOADED[file])
+    else:
+        nbytes = os.path.getsize(file)
+    return FakeMediaContainer(nbytes)
+
+
+def _build_audio_modules():
+    whisper = types.ModuleType('whisper')
+    whisper.load_model = lambda name, **kwargs: FakeWhisperModel()
+    av = types.ModuleType('av')
+    av.open = _open_media
+    av.AudioResampler = FakeAudioResampler
+    av.FFmpegError = FakeAVError
+    return {'whisper': whisper, 'av': av}
+
+
+# ---------------------------------------------------------------- Fixtures
+
+def make_report_pdf(lines) -> bytes:
+    """Build a minimal single-page text PDF (no external PDF library needed)"""
+    def escape(s):
+        return s.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    text_ops = ["BT", "/F1 10 Tf", "12 TL", "50 800 Td"]
+    for line in lines:
+        text_ops.append(f"({escape(line)}) Tj T*")
+    text_ops.append("ET")
+    stream = "\n".join(text_ops).encode('latin-1', 'replace')
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+SAMPLE_REPORT_LINES = [
+    "City Diagnostics Laboratory        Report Date: 12/03/2025",
+    "Patient: Jane Doe   Age: 42   Gender: F   Ref. Dr: A. Kumar",
+    "COMPLETE BLOOD COUNT",
+    "Hemoglobin 11.2 g/dL 12.0 - 15.5 L",
+    "Total WBC Count 7800 cells/cumm 4000 - 11000",
+    "Platelet Count 2.1 lakh/cumm 1.5 - 4.5",
+    "LIPID PROFILE",
+    "Total Cholesterol 232 mg/dL 125 - 200 H",
+    "Triglycerides 180 mg/dL < 150 H",
+    "HDL Cholesterol 38 mg/dL 40 - 60 L",
+    "THYROID PROFILE",
+    "TSH 3.1 uIU/mL 0.4 - 4.0",
+]
+
+
+# ---------------------------------------------------------------- Installation
+
+def install(env: dict = None) -> FakeFirestoreClient:
+    """Register the fakes in sys.modules and set the env vars the app reads at import time"""
+    defaults = {
+        'GEMINI_API_KEY': 'fake-gemini-key',
+        'PINECONE_API_KEY': 'fake-pinecone-key',
+        'PINECONE_INDEX_NAME': 'bench-index',
+        'FIREBASE_SERVICE_ACCOUNT_PATH': '/dev/null',
+        'CLOUDINARY_CLOUD_NAME': 'fake',
+        'DEBUG': 'False',
+    }
+    for key, value in {**defaults, **(env or {})}.items():
+        os.environ.setdefault(key, value)
+
+    try:
+        import google
+    except ImportError:
+        google = types.ModuleType('google')
+        google.__path__ = []
+        sys.modules['google'] = google
+    genai = _build_genai_module()
+    google.generativeai = genai
+    sys.modules['google.generativeai'] = genai
+    sys.modules['sentence_transformers'] = _build_sentence_transformers_module()
+    sys.modules['pinecone'] = _build_pinecone_module()
+    sys.modules.update(_build_firebase_modules())
+    sys.modules.update(_build_cloudinary_modules())
+    sys.modules['requests'] = _build_requests_module()
+    sys.modules.update(_build_audio_modules())
+    return _firestore_client
+
+
+def firestore_client() -> FakeFirestoreClient:
+    return _firestore_client
+
+
+def reset_counters() -> None:
+    with _calls_lock:
+        for key in CALLS:
+            CALLS[key] = 0
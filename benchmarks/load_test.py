@@ -0,0 +1,313 @@
+# In-process load test for the API, driven against deterministic fakes (see benchmarks/fakes.py)
+# Usage:
+#   python -m benchmarks.load_test --concurrency 32 --requests 500 --llm-latency-ms 150
+#   python -m benchmarks.load_test --scenarios ask,ws_disease --profile-every 100
+#   python -m benchmarks.load_test --scenarios ws_disease,ws_disease_mux --ws-window 4
+# Reports throughput, latency percentiles and peak RSS per scenario (and messages/sec per WebSocket connection).
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+
+from benchmarks import fakes
+
+SCENARIOS = ('ask', 'ask_burst', 'report', 'recording', 'doctors', 'ws_disease', 'ws_disease_mux', 'ws_signaling')
+
+QUESTIONS = [
+    "What are the early symptoms of dengue fever?",
+    "How can I lower my LDL cholesterol without medication?",
+    "Is a TSH of 3.1 normal for a 42 year old woman?",
+    "What precautions should diabetics take during Ramadan fasting?",
+]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class ASGIWebSocket:
+    """Minimal in-process WebSocket client speaking ASGI directly to the app"""
+
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path = path
+        self._to_app = asyncio.Queue()
+        self._from_app = asyncio.Queue()
+        self._task = None
+
+    async def __aenter__(self):
+        scope = {
+            'type': 'websocket', 'asgi': {'version': '3.0'}, 'scheme': 'ws', 'http_version': '1.1',
+            'path': self.path, 'raw_path': self.path.encode(), 'root_path': '', 'query_string': b'',
+            'headers': [(b'host', b'bench')], 'client': ('127.0.0.1', 50000), 'server': ('bench', 80),
+            'subprotocols': [],
+        }
+        await self._to_app.put({'type': 'websocket.connect'})
+        self._task = asyncio.create_task(self.app(scope, self._to_app.get, self._from_app.put))
+        message = await self._from_app.get()
+        if message['type'] != 'websocket.accept':
+            raise RuntimeError(f"WebSocket rejected: {message}")
+        return self
+
+    async def send_text(self, text: str) -> None:
+        await self._to_app.put({'type': 'websocket.receive', 'text': text})
+
+    async def send_json(self, data) -> None:
+        await self.send_text(json.dumps(data))
+
+    async def receive_json(self):
+        message = await self._from_app.get()
+        if message['type'] == 'websocket.close':
+            raise ConnectionError(f"WebSocket closed: {message.get('code')}")
+        return json.loads(message.get('text') or message.get('bytes'))
+
+    async def __aexit__(self, *exc):
+        await self._to_app.put({'type': 'websocket.disconnect', 'code': 1000})
+        try:
+            await asyncio.wait_for(self._task, timeout=5)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+        return False
+
+
+def seed_firestore(db, doctors: int, sessions: int) -> None:
+    for i in range(doctors):
+        db.collection('doctors').document(f"doctor-{i}").set({
+            'role': 'doctor', 'name': f"Dr. Bench {i}", 'specialization': 'General Medicine', 'prescriptions': [],
+        })
+    for i in range(sessions):
+        db.collection('patients').document(f"patient-{i}").set({'role': 'patient', 'name': f"Patient {i}", 'prescriptions': []})
+        db.collection('video_sessions').document(f"session-{i}").set({
+            'participants': [{'role': 'patient', 'uid': f"patient-{i}"}, {'role': 'doctor', 'uid': f"doctor-{i % max(doctors, 1)}"}],
+            'recording_url': None, 'metadata': {'duration': 0},
+        })
+
+
+def failed(response) -> bool:
+    """Error status, or a JSON body with an "error" key (the /ask-question/ handlers answer errors with a 200)"""
+    if response.status_code >= 400:
+        return True
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and 'error' in body
+
+
+async def run_http_scenario(client, name: str, total: int, concurrency: int, profile_every: int, make_request):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal errors
+        headers = {'X-Request-ID': f"{name}-{i}"}
+        if profile_every and i % profile_every == 0:
+            headers['X-Profile'] = 'sample'
+        async with semaphore:
+            start = time.perf_counter()
+            response = await make_request(client, i, headers)
+            latencies.append(time.perf_counter() - start)
+            if failed(response):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run_ws_scenario(app, name: str, total: int, concurrency: int):
+    """`concurrency` connections, each sending total/concurrency sequential round trips"""
+    latencies, errors = [], 0
+    per_connection = max(1, total // concurrency)
+
+    rates = []
+
+    async def connection(c: int):
+        nonlocal errors
+        path = '/ws/disease_info' if name == 'ws_disease' else f"/ws/signaling/session-{c}"
+        async with ASGIWebSocket(app, path) as ws:
+            opened = time.perf_counter()
+            for i in range(per_connection):
+                start = time.perf_counter()
+                try:
+                    if name == 'ws_disease':
+                        await ws.send_text(QUESTIONS[(c + i) % len(QUESTIONS)])
+                    else:
+                        await ws.send_json({'type': 'offer', 'sdp': f"v=0 bench {c}-{i}"})
+                    await ws.receive_json()
+                except Exception:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+            rates.append(per_connection / (time.perf_counter() - opened))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connection(c) for c in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start, rates
+
+
+async def run_ws_mux_scenario(app, total: int, concurrency: int, window: int):
+    """`concurrency` connections to /ws/disease_info, each keeping `window` id-tagged queries in flight;
+    every connection then sends one query and cancels it straight away (a warm query may finish first)"""
+    latencies, errors, rates, cancels = [], 0, [], 0
+    per_connection = max(1, total // concurrency)
+
+    async def connection(c: int):
+        nonlocal errors, cancels
+        async with ASGIWebSocket(app, '/ws/disease_info') as ws:
+            sent_at, next_id = {}, 0
+            opened = time.perf_counter()
+            while sent_at or next_id < per_connection:
+                while next_id < per_connection and len(sent_at) < window:
+                    sent_at[next_id] = time.perf_counter()
+                    await ws.send_json({'id': next_id, 'type': 'query', 'query': QUESTIONS[(c + next_id) % len(QUESTIONS)]})
+                    next_id += 1
+                reply = await ws.receive_json()
+                latencies.append(time.perf_counter() - sent_at.pop(reply['id']))
+                if reply['type'] != 'answer':
+                    errors += 1
+            rates.append(per_connection / (time.perf_counter() - opened))
+            await ws.send_json({'id': 'cancel-me', 'query': QUESTIONS[c % len(QUESTIONS)]})
+            await ws.send_json({'id': 'cancel-me', 'type': 'cancel'})
+            replies = [await ws.receive_json()]
+            if replies[0]['type'] == 'answer':  # finished before the cancel arrived, which is then refused
+                replies.append(await ws.receive_json())
+            cancels += replies[-1]['type'] == 'cancelled'
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connection(c) for c in range(concurrency)))
+    print(f"{'':<14} cancelled before answering: {cancels}/{concurrency}")
+    return latencies, errors, time.perf_counter() - start, rates
+
+
+def report_row(name: str, latencies, errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    row = {
+        'scenario': name,
+        'requests': len(ordered),
+        'errors': errors,
+        'rps': len(ordered) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p90_ms': percentile(ordered, 90) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+        'max_ms': (ordered[-1] if ordered else 0) * 1000,
+        'mean_ms': (statistics.mean(ordered) if ordered else 0) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    print(f"{name:<14} {row['requests']:>6} {errors:>6} {row['rps']:>9.1f} {row['p50_ms']:>9.1f} "
+          f"{row['p90_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['max_ms']:>9.1f} {row['peak_rss_mb']:>10.1f}")
+    return row
+
+
+async def main_async(args) -> list:
+    import httpx
+    from src.main import app
+
+    pdf_bytes = fakes.make_report_pdf(fakes.SAMPLE_REPORT_LINES)
+    video_bytes = os.urandom(256 * 1024)
+
+    async def ask(client, i, headers):
+        return await client.post('/ask-question/', json={'question': QUESTIONS[i % len(QUESTIONS)]}, headers=headers)
+
+    async def ask_burst(client, i, headers):
+        # Health-alert style burst: everyone asks the same thing (exercises request coalescing)
+        return await client.post('/ask-question/', json={'question': QUESTIONS[0]}, headers=headers)
+
+    async def report(client, i, headers):
+        return await client.post('/upload-report/', files={'file': ('report.pdf', pdf_bytes, 'application/pdf')}, headers=headers)
+
+    async def recording(client, i, headers):
+        session = i % args.sessions
+        return await client.post(
+            '/upload-recording/',
+            files={'file': (f"rec-{i}.mp4", video_bytes, 'video/mp4')},
+            data={'session_id': f"session-{session}", 'id_token': f"uid:patient-{session}"},
+            headers=headers,
+        )
+
+    async def doctors(client, i, headers):
+        return await client.get('/doctors', headers=headers)
+
+    http_scenarios = {'ask': ask, 'ask_burst': ask_burst, 'report': report, 'recording': recording, 'doctors': doctors}
+
+    print(f"concurrency={args.concurrency} requests={args.requests} llm_latency_ms={args.llm_latency_ms}")
+    print(f"{'scenario':<14} {'n':>6} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'peak RSS MB':>10}")
+    rows = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        for name in args.scenarios:
+            fakes.reset_counters()
+            rates = None
+            if name in http_scenarios:
+                result = await run_http_scenario(client, name, args.requests, args.concurrency, args.profile_every, http_scenarios[name])
+            elif name == 'ws_disease_mux':
+                *result, rates = await run_ws_mux_scenario(app, args.requests, args.concurrency, args.ws_window)
+            else:
+                *result, rates = await run_ws_scenario(app, name, args.requests, args.concurrency)
+            row = report_row(name, *result)
+            row['upstream_calls'] = dict(fakes.CALLS)
+            rows.append(row)
+            if rates:
+                row['msgs_per_connection_s'] = statistics.mean(rates)
+                print(f"{'':<14} messages/s per connection: {row['msgs_per_connection_s']:.1f}")
+            print(f"{'':<14} upstream calls: " + ", ".join(f"{k}={v}" for k, v in fakes.CALLS.items() if v))
+        metrics = (await client.get('/metrics')).json()
+        print("coalescing:", json.dumps(metrics.get('singleflight', {})))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process API load test against local fakes")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help="Requests (or WebSocket round trips) per scenario")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--llm-latency-ms', type=float, default=50.0)
+    parser.add_argument('--vector-latency-ms', type=float, default=5.0)
+    parser.add_argument('--firestore-latency-ms', type=float, default=5.0)
+    parser.add_argument('--upload-latency-ms', type=float, default=20.0)
+    parser.add_argument('--whisper-latency-ms', type=float, default=100.0)
+    parser.add_argument('--ws-window', type=int, default=4, help="Queries kept in flight per ws_disease_mux connection")
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--profile-every', type=int, default=0,
+                        help="Send X-Profile on every Nth HTTP request (enables PROFILING_ENABLED)")
+    parser.add_argument('--json', dest='json_out', help="Write results as JSON to this path")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {sorted(unknown)}")
+
+    # The fakes have no provider quota; lift the client-side buckets so they don't dominate results
+    env = {'LOG_INFO_SAMPLE_RATE': '0.01', 'GEMINI_KEY_RPM': '1000000', 'GEMINI_MODEL_RPM': '1000000'}
+    if args.profile_every:
+        env['PROFILING_ENABLED'] = 'true'
+    db = fakes.install(env)
+    fakes.configure(
+        llm_latency_ms=args.llm_latency_ms, vector_latency_ms=args.vector_latency_ms,
+        firestore_latency_ms=args.firestore_latency_ms, upload_latency_ms=args.upload_latency_ms,
+        whisper_latency_ms=args.whisper_latency_ms,
+    )
+    seed_firestore(db, args.doctors, args.sessions)
+
+    rows = asyncio.run(main_async(args))
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
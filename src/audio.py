@@ -0,0 +1,69 @@
+# Recording audio ingestion: decode once, straight to the 16 kHz mono float32 samples Whisper takes
+# PyAV (FFmpeg's libraries, in-process) demuxes only the audio stream from a local path or an http(s) URL,
+# reading it as a stream (the MP4 index at the end of a file is reached with a range request, not a full
+# download), and each decoded frame is resampled into one preallocated buffer. Whisper transcribes the
+# array directly: no intermediate WAV on disk and no second ffmpeg run to resample it.
+
+import math
+from typing import BinaryIO, Union
+import numpy as np
+from src.config import STORAGE_TIMEOUT_S
+from src.logger import setup_logger
+
+logger = setup_logger("audio")
+
+SAMPLE_RATE = 16000  # Whisper's input rate
+
+
+class AudioDecodeError(Exception):
+    """The source could not be opened or has no decodable audio"""
+
+
+def decode_audio(source: Union[str, BinaryIO], sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Mono float32 samples in [-1, 1] from a path, file:// or http(s) URL, or binary file object"""
+    import av
+
+    options = {}
+    if isinstance(source, str):
+        if source.startswith("file://"):
+            source = source[len("file://"):]
+        elif source.startswith(("http://", "https://")):
+            options["timeout"] = str(int(STORAGE_TIMEOUT_S * 1_000_000))  # microseconds, per network operation
+    try:
+        container = av.open(source, options=options)
+    except av.FFmpegError as e:
+        raise AudioDecodeError(f"Cannot open media: {e}") from e
+
+    with container:
+        if not container.streams.audio:
+            raise AudioDecodeError("No audio stream in the recording")
+        stream = container.streams.audio[0]
+        if stream.duration and stream.time_base:
+            seconds = float(stream.duration * stream.time_base)
+        else:
+            seconds = (container.duration or 0) / 1_000_000  # AV_TIME_BASE units
+        # Sized from the header's duration (plus a second of slack), grown only if that was short
+        samples = np.empty(int(math.ceil(seconds * sample_rate)) + sample_rate, dtype=np.float32)
+        filled = 0
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=sample_rate)
+        try:
+            for frame in container.decode(stream):
+                for out in resampler.resample(frame):
+                    samples, filled = _append(samples, filled, out.to_ndarray().reshape(-1))
+            for out in resampler.resample(None):  # flush the resampler's delay line
+                samples, filled = _append(samples, filled, out.to_ndarray().reshape(-1))
+        except av.FFmpegError as e:
+            raise AudioDecodeError(f"Audio decode failed after {filled / sample_rate:.1f}s: {e}") from e
+
+    logger.info("Decoded %.1fs of audio (%s Hz mono)", filled / sample_rate, sample_rate)
+    return samples[:filled]
+
+
+def _append(samples: np.ndarray, filled: int, chunk: np.ndarray):
+    end = filled + len(chunk)
+    if end > len(samples):
+        grown = np.empty(max(end, 2 * len(samples)), dtype=np.float32)
+        grown[:filled] = samples[:filled]
+        samples = grown
+    samples[filled:end] = chunk
+    return samples, end
@@ -1,20 +1,29 @@
 # Handles medical chatbot functionality using Gemini LLM
-# Updated: Added support for AI reports with transcript and prescription
+# Updated: Tasks are routed to model tiers (src.model_router); emergencies are caught locally first (src.triage)
 
-import google.generativeai as genai
-from typing import Optional, Dict, Any
-from src.config import GEMINI_API_KEY
+import time
+from typing import Optional, Dict, Any, List
+from src.config import PROMPT_USER_INPUT_TOKENS, PROMPT_CONTEXT_TOKENS, PROMPT_TRANSCRIPT_TOKENS, TRIAGE_PREFILTER_ENABLED
 from src.logger import setup_logger
 from src.rag import get_relevant_contexts
-
-# Configure Gemini with API key
-genai.configure(api_key=GEMINI_API_KEY)
+from src.prompt_builder import PromptBuilder, compress_documents, compress_transcript, format_prescription, truncate_to_tokens
+from src.singleflight import get_group, normalize_query
+from src.llm_governor import PRIORITY_EMERGENCY
+from src.model_router import router
+from src.triage import detect_emergency
 
 logger = setup_logger("chatbot")
 
+_chat_flight = get_group("chat")
+_simplify_flight = get_group("simplify")
+
 class MedicalChatbot:
     def __init__(self):
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        self.router = router
+    
+    def generate(self, prompt: str, task: str = 'chat', priority: Optional[int] = None) -> str:
+        """Send a prompt to the model tier routed for this task (through the outbound governor)"""
+        return self.router.generate(task, prompt, priority=priority)
         
     def analyze_prompt(self, user_input: str) -> Dict[str, Any]:
         """Analyze user prompt to determine intent and required actions"""
@@ -25,7 +34,7 @@ class MedicalChatbot:
         3. What type of response is needed? (diagnosis, general_info, symptom_check, emergency, casual)
         4. Urgency level (low, medium, high, emergency)
         
-        User message: "{user_input}"
+        User message: "{truncate_to_tokens(user_input, PROMPT_USER_INPUT_TOKENS)}"
         
         Respond in this exact format:
         Medical: yes/no
@@ -36,12 +45,12 @@ class MedicalChatbot:
         """
         
         try:
-            response = self.model.generate_content(analysis_prompt)
-            analysis = self._parse_analysis(response.text)
-            logger.info(f"Prompt analysis: {analysis}")
+            # Triage runs first in every chat request and decides whether it is an emergency
+            analysis = self._parse_analysis(self.generate(analysis_prompt, task='intent'))
+            logger.info("Prompt analysis: %s", analysis)
             return analysis
         except Exception as e:
-            logger.error(f"Error analyzing prompt: {e}")
+            logger.error("Error analyzing prompt: %s", e)
             return {
                 'medical': True,
                 'needs_database': True,
@@ -74,39 +83,59 @@ class MedicalChatbot:
                     
         return result
     
-    def generate_response(self, user_input: str, context: Optional[str] = None, transcript: Optional[str] = None, prescription: Optional[Dict] = None) -> str:
-        """Generate response with or without RAG context, transcript, or prescription for AI reports"""
+    def generate_response(self, user_input: str, context: Optional[str] = None, transcript: Optional[str] = None, prescription: Optional[Dict] = None,
+                          contexts: Optional[List[str]] = None) -> str:
+        """Generate response with or without RAG context, transcript, or prescription for AI reports
+        contexts: RAG results the caller already retrieved for user_input, used instead of retrieving again"""
+        if transcript is None and prescription is None:
+            # Plain questions depend only on their text: identical concurrent ones share one LLM round trip
+            return _chat_flight.do(normalize_query(user_input), self._generate_response, user_input, None, None, contexts)
+        return self._generate_response(user_input, transcript, prescription, contexts)
+    
+    def _generate_response(self, user_input: str, transcript: Optional[str] = None, prescription: Optional[Dict] = None,
+                           contexts: Optional[List[str]] = None) -> str:
+        # Local pre-filter: obvious emergencies are answered without any network round trip
+        if TRIAGE_PREFILTER_ENABLED and not transcript:
+            start = time.perf_counter()
+            reason = detect_emergency(user_input)
+            self.router.record('emergency_prefilter', time.perf_counter() - start)
+            if reason:
+                logger.warning("Emergency detected by local pre-filter (%s)", reason)
+                return self._handle_emergency(user_input)
         
         # Analyze prompt to determine intent
         analysis = self.analyze_prompt(user_input)
         
+        # Handle emergency cases (before spending time on retrieval)
+        if analysis.get('urgency') == 'emergency':
+            return self._handle_emergency(user_input)
+        
         # Get context from RAG if needed
-        rag_context = ""
+        rag_contexts = []
         if analysis.get('needs_database', False):
             try:
-                contexts = get_relevant_contexts(user_input, k=3)
+                if contexts is None:
+                    contexts = get_relevant_contexts(user_input, k=3)
                 if contexts:
-                    rag_context = "\n".join(contexts[:2])  # Limit to top 2 contexts
-                    logger.info(f"Retrieved {len(contexts)} contexts from RAG")
+                    rag_contexts = contexts  # Trimmed to the context budget by the prompt builder
+                    logger.info("Retrieved %s contexts from RAG", len(contexts))
                 else:
                     logger.info("No relevant contexts found in RAG")
             except Exception as e:
-                logger.error(f"Error getting RAG context: {e}")
-        
-        # Handle emergency cases
-        if analysis.get('urgency') == 'emergency':
-            return self._handle_emergency(user_input)
+                logger.error("Error getting RAG context: %s", e)
         
         # Build response prompt with optional transcript/prescription
         response_prompt = self._build_response_prompt(
-            user_input, analysis, rag_context, transcript, prescription
+            user_input, analysis, rag_contexts, transcript, prescription
         )
         
+        # Post-call reports are batch work; high-urgency answers jump the queue
+        task = 'call_report' if transcript else 'chat'
+        priority = PRIORITY_EMERGENCY if analysis.get('urgency') == 'high' and not transcript else None
         try:
-            response = self.model.generate_content(response_prompt)
-            return response.text
+            return self.generate(response_prompt, task=task, priority=priority)
         except Exception as e:
-            logger.error(f"Error generating response: {e}")
+            logger.error("Error generating response: %s", e)
             return "I apologize, but I'm experiencing technical difficulties. Please consult a healthcare professional for medical advice."
     
     def _handle_emergency(self, user_input: str) -> str:
@@ -120,72 +149,78 @@ If you are experiencing a medical emergency, please:
 
 I'm an AI assistant and cannot provide emergency medical care. Please seek immediate professional medical attention."""
     
-    def _build_response_prompt(self, user_input: str, analysis: Dict, context: str, transcript: Optional[str] = None, prescription: Optional[Dict] = None) -> str:
-        """Build the response generation prompt, including transcript/prescription for AI reports"""
-        
-        base_prompt = f"""You are a helpful medical AI assistant. 
+    def _build_response_prompt(self, user_input: str, analysis: Dict, contexts: List[str], transcript: Optional[str] = None, prescription: Optional[Dict] = None) -> str:
+        """Build the response generation prompt, including transcript/prescription for AI reports.
 
-User question: "{user_input}"
+        Each section has its own token budget: retrieved contexts are reduced to the
+        passages most relevant to the question and deduplicated, transcripts keep
+        their opening and closing.
+        """
+        builder = PromptBuilder("response")
+        builder.add("instructions", f"""You are a helpful medical AI assistant. 
+
+User question: "{truncate_to_tokens(user_input, PROMPT_USER_INPUT_TOKENS)}"
 
 Guidelines:
 - Provide helpful, accurate medical information
 - Always recommend consulting healthcare professionals for serious concerns
 - Be empathetic and supportive
 - Keep responses concise but informative
-"""
+""")
         
-        if context:
-            base_prompt += f"""
+        if contexts:
+            context = compress_documents(contexts, PROMPT_CONTEXT_TOKENS, query=user_input)
+            builder.add("context", f"""
 
 Relevant medical information from database:
 {context}
 
 Use this information to provide more specific and accurate guidance.
-"""
+""")
         
         if transcript:
-            base_prompt += f"""
+            builder.add("transcript", f"""
 
 Call Transcript:
-{transcript}
+{compress_transcript(transcript, PROMPT_TRANSCRIPT_TOKENS)}
 
 Generate a structured report based on this transcript.
-"""
+""")
         
         if prescription:
-            base_prompt += f"""
+            builder.add("prescription", f"""
 
 Include this prescription in the report:
-Medication: {prescription.get('medication', '')}
-Dosage: {prescription.get('dosage', '')}
-Instructions: {prescription.get('instructions', '')}
-"""
+{format_prescription(prescription)}
+""")
         
         if analysis.get('response_type') == 'symptom_check':
-            base_prompt += """
+            builder.add("focus", """
 Focus on:
 - Possible causes of the symptoms
 - When to seek medical attention  
 - Basic care recommendations
 - Warning signs to watch for
-"""
+""")
         
-        return base_prompt
+        return builder.build()
 
 # Global chatbot instance
 chatbot = MedicalChatbot()
 
 # Backward compatibility functions
-def get_disease_info(query: str) -> str:
-    """Get disease information using chatbot"""
-    return chatbot.generate_response(query)
+def get_disease_info(query: str, contexts: Optional[List[str]] = None) -> str:
+    """Get disease information using chatbot; contexts are RAG results already retrieved for the query"""
+    return chatbot.generate_response(query, contexts=contexts)
 
 def simplify_terms(text: str) -> str:
     """Simplify medical terms for general understanding"""
-    prompt = f"Simplify this medical text for general understanding: {text}"
+    return _simplify_flight.do(normalize_query(text), _simplify_terms, text)
+
+def _simplify_terms(text: str) -> str:
+    prompt = f"Simplify this medical text for general understanding: {truncate_to_tokens(text, PROMPT_CONTEXT_TOKENS)}"
     try:
-        response = chatbot.model.generate_content(prompt)
-        return response.text
+        return chatbot.generate(prompt, task='simplify')
     except Exception as e:
-        logger.error(f"Error simplifying terms: {e}")
+        logger.error("Error simplifying terms: %s", e)
         return text
\ No newline at end of file
@@ -12,11 +12,130 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
 PINECONE_DIMENSION = int(os.getenv("PINECONE_DIMENSION", 384))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")  # Must produce PINECONE_DIMENSION-sized vectors
+# Firestore document holding {"active_index": ...}; when set, RAG serves from that index (see src.reindex)
+PINECONE_INDEX_ALIAS_DOC = os.getenv("PINECONE_INDEX_ALIAS_DOC")
+PINECONE_ALIAS_REFRESH_S = float(os.getenv("PINECONE_ALIAS_REFRESH_S", 60))  # How often RAG re-reads the alias
+# Embedding inference backend (src.embeddings): torch, torch-int8, onnx or onnx-int8
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 0))  # Intra-op threads; 0 keeps the runtime default
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model_qint8_avx2.onnx")  # Graph used by onnx-int8
+EMBEDDING_PARITY_MIN_COSINE = float(os.getenv("EMBEDDING_PARITY_MIN_COSINE", 0.98))  # Min cosine vs fp32 per text
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "tiny")  # Free-tier, CPU-friendly
 FIREBASE_SERVICE_ACCOUNT_PATH = os.getenv("FIREBASE_SERVICE_ACCOUNT_PATH")  # Path to Firebase service account JSON
 CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME")
 CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY")
 CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET")
 
+# Object storage (src.storage)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")  # cloudinary or local
+STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT", "/tmp/shivaai_storage")  # Where the local backend keeps files
+STORAGE_STATE_DIR = os.getenv("STORAGE_STATE_DIR", "/tmp/shivaai_uploads")  # Resumable-upload manifests
+STORAGE_CHUNK_THRESHOLD_MB = float(os.getenv("STORAGE_CHUNK_THRESHOLD_MB", 20))  # Larger files are uploaded in parts
+STORAGE_PART_SIZE_MB = float(os.getenv("STORAGE_PART_SIZE_MB", 6))  # Cloudinary needs >= 5 MB for all but the last
+STORAGE_PART_WORKERS = int(os.getenv("STORAGE_PART_WORKERS", 4))  # Parts uploaded concurrently
+STORAGE_TIMEOUT_S = float(os.getenv("STORAGE_TIMEOUT_S", 60))  # Per request
+STORAGE_MAX_RETRIES = int(os.getenv("STORAGE_MAX_RETRIES", 3))
+STORAGE_DEDUP_ENABLED = os.getenv("STORAGE_DEDUP_ENABLED", "True").lower() in ("true", "1", "t")  # Skip identical content
+
+# Scratch files (src.tempfiles): uploads relayed to storage, report JSON
+TEMP_DIR = os.getenv("TEMP_DIR", "/tmp/shivaai_tmp")
+TEMP_MAX_AGE_S = float(os.getenv("TEMP_MAX_AGE_S", 6 * 3600))  # Older leftovers are swept at startup
+
 # Debug and environment settings
 DEBUG = os.getenv("DEBUG", "True").lower() in ("true", "1", "t")
-ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
\ No newline at end of file
+ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+
+# Per-request profiling (opt-in, triggered by the X-Profile header)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False").lower() in ("true", "1", "t")
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")  # If set, X-Profile-Token must match
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/shivaai_profiles")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 5))
+
+# Prompt token budgets (approximate tokens, counted locally by src.prompt_builder)
+PROMPT_USER_INPUT_TOKENS = int(os.getenv("PROMPT_USER_INPUT_TOKENS", 500))
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", 1200))
+PROMPT_TRANSCRIPT_TOKENS = int(os.getenv("PROMPT_TRANSCRIPT_TOKENS", 1500))
+PROMPT_REPORT_TOKENS = int(os.getenv("PROMPT_REPORT_TOKENS", 3000))
+PROMPT_PASSAGE_TOKENS = int(os.getenv("PROMPT_PASSAGE_TOKENS", 120))  # Passage size used for selection
+PROMPT_DEDUPE_THRESHOLD = float(os.getenv("PROMPT_DEDUPE_THRESHOLD", 0.8))  # Shingle overlap treated as duplicate
+
+# Outbound Gemini governor (src.llm_governor)
+# The RPM limits are account-wide: each process enforces 1/GEMINI_RATE_WORKERS of them, so N API workers
+# (gunicorn/uvicorn WEB_CONCURRENCY) together stay within the quota. The concurrency limits are per process.
+GEMINI_KEY_RPM = float(os.getenv("GEMINI_KEY_RPM", 60))  # Requests/minute allowed per API key
+GEMINI_MODEL_RPM = float(os.getenv("GEMINI_MODEL_RPM", 60))  # Requests/minute allowed per model
+GEMINI_RATE_WORKERS = max(1, int(os.getenv("GEMINI_RATE_WORKERS", os.getenv("WEB_CONCURRENCY", 1))))  # Processes sharing the RPM
+GEMINI_MIN_CONCURRENCY = int(os.getenv("GEMINI_MIN_CONCURRENCY", 2))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 32))
+GEMINI_TARGET_LATENCY_MS = float(os.getenv("GEMINI_TARGET_LATENCY_MS", 8000))  # Slower calls shrink the concurrency limit
+# task=ms latency targets per route (tasks as in MODEL_ROUTES); unlisted routes use GEMINI_TARGET_LATENCY_MS
+GEMINI_ROUTE_TARGET_LATENCY_MS = {
+    task: float(ms) for task, ms in (
+        pair.split("=", 1) for pair in
+        os.getenv("GEMINI_ROUTE_TARGET_LATENCY_MS", "intent=3000,simplify=5000,chat=8000,call_report=60000,report=60000").split(",")
+        if "=" in pair
+    )
+}
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 3))
+GEMINI_BACKOFF_BASE_MS = float(os.getenv("GEMINI_BACKOFF_BASE_MS", 250))
+GEMINI_BACKOFF_MAX_MS = float(os.getenv("GEMINI_BACKOFF_MAX_MS", 8000))
+GEMINI_QUEUE_TIMEOUT_S = float(os.getenv("GEMINI_QUEUE_TIMEOUT_S", 30))  # Max wait for a slot or rate-limit token
+
+# Tiered model routing (src.model_router): each task type is sent to a model tier
+GEMINI_MODEL_FAST = os.getenv("GEMINI_MODEL_FAST", "gemini-1.5-flash-8b")
+GEMINI_MODEL_STANDARD = os.getenv("GEMINI_MODEL_STANDARD", "gemini-2.0-flash-exp")
+GEMINI_MODEL_PRO = os.getenv("GEMINI_MODEL_PRO", "gemini-2.0-flash-exp")
+# task=tier pairs; tasks: intent, simplify, chat, call_report, report
+MODEL_ROUTES = dict(
+    pair.split("=", 1) for pair in
+    os.getenv("MODEL_ROUTES", "intent=fast,simplify=fast,chat=standard,call_report=standard,report=pro").split(",")
+    if "=" in pair
+)
+# USD per 1k input/output tokens for each tier, "input,output"
+MODEL_COSTS = {
+    tier: tuple(float(v) for v in os.getenv(f"MODEL_COST_{tier.upper()}", default).split(","))
+    for tier, default in (("fast", "0.0000375,0.00015"), ("standard", "0.0001,0.0004"), ("pro", "0.00125,0.005"))
+}
+
+# Local emergency pre-filter (src.triage), runs before any LLM call
+TRIAGE_PREFILTER_ENABLED = os.getenv("TRIAGE_PREFILTER_ENABLED", "True").lower() in ("true", "1", "t")
+TRIAGE_EMBEDDING_ENABLED = os.getenv("TRIAGE_EMBEDDING_ENABLED", "True").lower() in ("true", "1", "t")
+TRIAGE_EMBEDDING_THRESHOLD = float(os.getenv("TRIAGE_EMBEDDING_THRESHOLD", 0.62))  # Min similarity to an emergency example
+TRIAGE_EMBEDDING_MARGIN = float(os.getenv("TRIAGE_EMBEDDING_MARGIN", 0.05))  # ...and by how much it must beat non-emergencies
+
+# OCR of image uploads (src.ocr_preprocess)
+OCR_PREPROCESS_ENABLED = os.getenv("OCR_PREPROCESS_ENABLED", "True").lower() in ("true", "1", "t")
+OCR_TARGET_LONG_SIDE = int(os.getenv("OCR_TARGET_LONG_SIDE", 2000))  # Pixels; ~300 DPI for a full page
+OCR_TILES = int(os.getenv("OCR_TILES", 1))  # >1 splits the page into bands OCR'd in parallel
+OCR_TILE_WORKERS = int(os.getenv("OCR_TILE_WORKERS", 4))
+OCR_TESSERACT_CONFIG = os.getenv("OCR_TESSERACT_CONFIG", "--psm 6")
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+
+# Where the embedder and Whisper live when several API workers run on one box
+#   in-process: each worker loads its own copy (Whisper on first use)
+#   preload:    loaded once in the gunicorn master, shared copy-on-write (gunicorn -c src/gunicorn_conf.py src.main:app)
+#   sidecar:    held by one python -m src.model_server process, called over a Unix socket
+MODEL_DEPLOYMENT_MODE = os.getenv("MODEL_DEPLOYMENT_MODE", "in-process")
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "/tmp/shivaai_models.sock")
+MODEL_SERVER_MAX_BATCH = int(os.getenv("MODEL_SERVER_MAX_BATCH", 64))  # Texts per batched encode
+# Extra wait for a batch to fill; 0 batches only what queued up while the model was busy
+MODEL_SERVER_BATCH_WAIT_MS = float(os.getenv("MODEL_SERVER_BATCH_WAIT_MS", 0))
+MODEL_SERVER_TIMEOUT_S = float(os.getenv("MODEL_SERVER_TIMEOUT_S", 300))  # Client side; covers a transcription
+
+# /ws/disease_info multiplexing (src.ws_mux), all per connection
+WS_MAX_INFLIGHT = int(os.getenv("WS_MAX_INFLIGHT", 4))  # Queries answered concurrently
+WS_MAX_PENDING = int(os.getenv("WS_MAX_PENDING", 16))  # In flight + waiting; beyond this a query is refused as busy
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 32))  # Replies buffered for a slow reader
+
+# Patient/doctor history lists (src.history)
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 20))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 100))
+HISTORY_SUMMARY_CHARS = int(os.getenv("HISTORY_SUMMARY_CHARS", 280))  # Report summary stored for list views
+
+# Bulk re-indexing (python -m src.reindex)
+REINDEX_PAGE_SIZE = int(os.getenv("REINDEX_PAGE_SIZE", 500))  # Source documents read per Firestore page
+REINDEX_EMBED_BATCH = int(os.getenv("REINDEX_EMBED_BATCH", 256))  # Texts per embedding task sent to a worker
+REINDEX_UPSERT_BATCH = int(os.getenv("REINDEX_UPSERT_BATCH", 100))  # Vectors per upsert request
+REINDEX_WORKERS = int(os.getenv("REINDEX_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+REINDEX_CHECKPOINT = os.getenv("REINDEX_CHECKPOINT", "/tmp/shivaai_reindex_checkpoint.json")
@@ -0,0 +1,112 @@
+# Sentence-embedding model loader with selectable CPU inference backends
+# EMBEDDING_BACKEND picks how the SentenceTransformer runs:
+#   torch       fp32 PyTorch (the reference; what the index was built with)
+#   torch-int8  PyTorch with Linear layers dynamically quantized to int8 weights
+#   onnx        ONNX Runtime graph (exported on first load if the model repo has none)
+#   onnx-int8   ONNX Runtime with a pre-quantized int8 graph (EMBEDDING_ONNX_FILE)
+# Every backend returns the same object type, so callers keep using .encode().
+# Before switching production to a quantized backend, run: python -m src.embeddings --backend <name>
+
+import argparse
+import sys
+from typing import List, Optional
+import numpy as np
+from src.config import (
+    EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_THREADS, EMBEDDING_ONNX_FILE, EMBEDDING_PARITY_MIN_COSINE,
+)
+from src.logger import setup_logger
+
+logger = setup_logger("embeddings")
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+# Parity sentences: the kind of text the app embeds (questions, report lines, call notes)
+PARITY_TEXTS = [
+    "What are the early symptoms of type 2 diabetes?",
+    "I have had a fever and dry cough for three days, should I see a doctor?",
+    "Hemoglobin 10.2 g/dL (13.0 - 17.0) LOW",
+    "Serum creatinine 1.9 mg/dL, eGFR 38 mL/min/1.73m2 indicating stage 3b chronic kidney disease.",
+    "Patient reports intermittent chest tightness on exertion relieved by rest.",
+    "Advised paracetamol 500 mg twice daily after food for five days and plenty of fluids.",
+    "TSH 6.8 mIU/L with normal free T4 suggests subclinical hypothyroidism.",
+    "Can I take ibuprofen while breastfeeding?",
+    "My child has a rash on the arms and legs after eating peanuts.",
+    "LDL cholesterol 182 mg/dL, triglycerides 240 mg/dL; lifestyle changes and statin therapy discussed.",
+    "Blood pressure readings averaged 150/95 over two weeks of home monitoring.",
+    "How long does it take to recover from a sprained ankle?",
+    "Vitamin D (25-OH) 14 ng/mL, deficient; cholecalciferol 60,000 IU weekly for eight weeks.",
+    "The doctor recommended an MRI of the lumbar spine for persistent lower back pain.",
+    "Is it normal to feel dizzy after starting a new blood pressure medication?",
+    "Follow-up in two weeks with repeat complete blood count and liver function tests.",
+]
+
+
+def _set_torch_threads(threads: int) -> None:
+    if threads <= 0:
+        return
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def load_embedder(model_name: str = EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND, threads: int = EMBEDDING_THREADS,
+                  onnx_file: Optional[str] = EMBEDDING_ONNX_FILE):
+    """Load the SentenceTransformer for the given backend; threads=0 keeps the runtime's default"""
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+    if backend in ("torch", "torch-int8"):
+        _set_torch_threads(threads)
+        model = SentenceTransformer(model_name, device="cpu")
+        if backend == "torch-int8":
+            import torch
+            torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    else:
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        # The model repos ship several graphs under onnx/; name the one to load explicitly
+        model_kwargs = {"provider": "CPUExecutionProvider", "session_options": options,
+                        "file_name": onnx_file if backend == "onnx-int8" else "onnx/model.onnx"}
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    logger.info("Loaded embedding model %s (backend=%s, threads=%s)", model_name, backend, threads or "default")
+    return model
+
+
+def encode_normalized(model, texts: List[str]) -> np.ndarray:
+    vectors = np.asarray(model.encode(texts, convert_to_numpy=True), dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def parity_check(candidate, reference, texts: List[str] = PARITY_TEXTS) -> dict:
+    """Cosine agreement between a candidate backend's embeddings and the fp32 reference on the same texts"""
+    cosines = np.sum(encode_normalized(candidate, texts) * encode_normalized(reference, texts), axis=1)
+    return {"min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean()), "texts": len(texts)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a quantized/ONNX embedding backend against fp32 PyTorch")
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=BACKENDS)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS)
+    parser.add_argument("--min-cosine", type=float, default=EMBEDDING_PARITY_MIN_COSINE)
+    args = parser.parse_args()
+
+    reference = load_embedder(args.model, "torch", args.threads)
+    candidate = load_embedder(args.model, args.backend, args.threads)
+    result = parity_check(candidate, reference)
+    passed = result["min_cosine"] >= args.min_cosine
+    print(f"{args.backend} vs fp32 torch on {result['texts']} texts: min cosine {result['min_cosine']:.5f}, "
+          f"mean {result['mean_cosine']:.5f} (threshold {args.min_cosine}) -> {'PASS' if passed else 'FAIL'}")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
 # Handles Firebase initialization and CRUD operations for entities (Firestore only; Storage swapped to Cloudinary)
 # Updated: Removed Firebase Storage; added Cloudinary config/upload
+# Updated: Uploads go through src.storage (chunked/resumable, deduplicated by content hash)
+# Updated: Sessions, reports and prescriptions carry denormalized summary fields; history lists via src.history
 
 import firebase_admin
 from firebase_admin import credentials, firestore, auth
-from src.config import FIREBASE_SERVICE_ACCOUNT_PATH, CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET
+from src.config import (
+    FIREBASE_SERVICE_ACCOUNT_PATH, CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET,
+    STORAGE_BACKEND, STORAGE_DEDUP_ENABLED, HISTORY_PAGE_SIZE,
+)
+from src.history import denormalized_fields, list_history
 from src.logger import setup_logger
+from src.storage import create_storage, FirestoreDedupIndex
 from typing import Dict, Any, Optional, List
 import cloudinary
-import cloudinary.uploader
 
 logger = setup_logger("firebase_service")
 
@@ -25,21 +31,24 @@ cloudinary.config(
 )
 logger.info("Cloudinary initialized")
 
+# Cloudinary URLs are valid from any worker, so their dedup index is shared through Firestore
+storage = create_storage(dedup_index=FirestoreDedupIndex(db) if STORAGE_DEDUP_ENABLED and STORAGE_BACKEND == "cloudinary" else None)
+
 def verify_auth_token(id_token: str) -> Dict:
     """Verify Firebase ID token from frontend for authentication"""
     try:
         decoded_token = auth.verify_id_token(id_token)
-        logger.info(f"Verified user: {decoded_token['uid']}")
+        logger.info("Verified user: %s", decoded_token['uid'])
         return decoded_token
     except Exception as e:
-        logger.error(f"Auth verification failed: {e}")
+        logger.error("Auth verification failed: %s", e)
         raise ValueError("Invalid auth token")
 
 def create_user(uid: str, data: Dict) -> None:
     """Create user document in patients or doctors collection"""
     collection = 'patients' if data.get('role') == 'patient' else 'doctors'
     db.collection(collection).document(uid).set(data)
-    logger.info(f"Created {collection} user: {uid}")
+    logger.info("Created %s user: %s", collection, uid)
 
 def get_user(uid: str, role: str) -> Optional[Dict]:
     """Get user document by UID and role"""
@@ -53,28 +62,33 @@ def create_hospital(hospital_id: str = "1234", data: Dict = {}) -> None:
     """Create hospital document (prototype fixed ID)."""
     default_data = {'name': 'Prototype Hospital', 'location': 'Default', 'email': 'hospital@example.com', 'employees': [], 'video_sessions': [], 'ai_reports': [], 'prescriptions': [], 'patients': []}
     db.collection('hospitals').document(hospital_id).set({**default_data, **data})
-    logger.info(f"Created hospital: {hospital_id}")
+    logger.info("Created hospital: %s", hospital_id)
 
 def add_to_hospital(hospital_id: str, field: str, value: Any) -> None:
     """Add to hospital arrays (e.g., employees, patients)."""
     db.collection('hospitals').document(hospital_id).update({field: firestore.ArrayUnion([value])})
 
 def create_video_session(session_id: str, data: Dict) -> None:
-    """Create video session metadata."""
+    """Create video session metadata (plus the summary fields history lists read)."""
+    data = {**data, **denormalized_fields(db, 'video_sessions', data)}
     db.collection('video_sessions').document(session_id).set(data)
-    logger.info(f"Created video session: {session_id}")
+    logger.info("Created video session: %s", session_id)
 
 def update_video_session(session_id: str, updates: Dict) -> None:
     """Update session (e.g., add recording_url)."""
     db.collection('video_sessions').document(session_id).update(updates)
 
 def create_report(report_id: str, data: Dict) -> None:
-    """Create AI/doctor report."""
+    """Create AI/doctor report and mark its session as reported."""
+    data = {**data, **denormalized_fields(db, 'reports', data)}
     db.collection('reports').document(report_id).set(data)
-    logger.info(f"Created report: {report_id}")
+    if data.get('session_id'):
+        update_video_session(data['session_id'], {'report_id': report_id, 'status': 'reported'})
+    logger.info("Created report: %s", report_id)
 
 def create_prescription(prescription_id: str, data: Dict) -> str:
     """Create prescription, link to entities."""
+    data = {**data, **denormalized_fields(db, 'prescriptions', data)}
     db.collection('prescriptions').document(prescription_id).set(data)
     # Link to patient, doctor, session, hospital
     patient_ref = data['patient_ref']
@@ -83,24 +97,25 @@ def create_prescription(prescription_id: str, data: Dict) -> str:
     hospital_id = data.get('hospital_id', '1234')
     db.collection('patients').document(patient_ref.id).update({'prescriptions': firestore.ArrayUnion([db.collection('prescriptions').document(prescription_id)])})
     db.collection('doctors').document(doctor_ref.id).update({'prescriptions': firestore.ArrayUnion([db.collection('prescriptions').document(prescription_id)])})
-    db.collection('video_sessions').document(session_ref.id).update({'prescription_ref': db.collection('prescriptions').document(prescription_id)})
+    db.collection('video_sessions').document(session_ref.id).update({'prescription_ref': db.collection('prescriptions').document(prescription_id), 'prescription_id': prescription_id})
     add_to_hospital(hospital_id, 'prescriptions', db.collection('prescriptions').document(prescription_id))
-    logger.info(f"Created and linked prescription: {prescription_id}")
+    logger.info("Created and linked prescription: %s", prescription_id)
     return prescription_id
 
 def upload_to_storage(file_path: str, destination: str) -> str:
-    """Upload file (video/report) to Cloudinary, return public URL."""
+    """Upload file (video/report) to the configured storage backend, return its URL."""
+    try:
+        return storage.put(file_path, destination)['url']
+    except Exception as e:
+        logger.error("Storage upload error (%s): %s", destination, e)
+        raise
+
+async def upload_to_storage_async(file_path: str, destination: str) -> str:
+    """upload_to_storage without blocking the event loop."""
     try:
-        response = cloudinary.uploader.upload(
-            file_path,
-            folder=destination,
-            resource_type="auto"  # Auto-detect video/image/raw
-        )
-        url = response['secure_url']
-        logger.info(f"Uploaded to Cloudinary: {destination} - URL: {url}")
-        return url
+        return (await storage.put_async(file_path, destination))['url']
     except Exception as e:
-        logger.error(f"Cloudinary upload error: {e}")
+        logger.error("Storage upload error (%s): %s", destination, e)
         raise
 
 def get_linked_prescription(session_ref) -> Optional[Dict]:
@@ -110,4 +125,14 @@ def get_linked_prescription(session_ref) -> Optional[Dict]:
         return db.document(session['prescription_ref'].path).get().to_dict()
     return None
 
-# Other CRUD methods can be added as needed (e.g., list_sessions_for_user).
\ No newline at end of file
+def list_sessions_for_user(uid: str, role: str, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+    """Page of a patient's or doctor's video sessions, newest first."""
+    return list_history(db, 'sessions', role, uid, limit, cursor)
+
+def list_reports_for_user(uid: str, role: str, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+    """Page of a patient's or doctor's AI reports, newest first."""
+    return list_history(db, 'reports', role, uid, limit, cursor)
+
+def list_prescriptions_for_user(uid: str, role: str, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+    """Page of a patient's or doctor's prescriptions, newest first."""
+    return list_history(db, 'prescriptions', role, uid, limit, cursor)
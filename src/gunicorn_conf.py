@@ -0,0 +1,24 @@
+# Gunicorn settings for MODEL_DEPLOYMENT_MODE=preload
+# Usage: MODEL_DEPLOYMENT_MODE=preload gunicorn -c src/gunicorn_conf.py src.main:app
+# The app, and with it the embedder and Whisper, is imported once in the master; workers are forked
+# afterwards and share the weight pages copy-on-write instead of each loading their own copy.
+
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8001")
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+os.environ["WEB_CONCURRENCY"] = str(workers)  # read by src.config (loaded after this file) to split the Gemini RPM
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before workers fork. Frozen objects are never
+    # visited by the collector, so workers don't dirty (and un-share) their pages by collecting them.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from src.model_server import after_fork
+    after_fork(server.num_workers)
@@ -0,0 +1,196 @@
+# Patient/doctor history lists: video sessions, AI reports and prescriptions, newest first
+# Usage: python -m src.history --backfill      # add the summary fields to documents written before they existed
+# Each page is one indexed query (<role>_id == uid ordered by date desc, see firestore.indexes.json) with a
+# field projection and an opaque cursor. The documents carry denormalized summary fields (participant ids and
+# names, status, report summary) written alongside them, so a list view needs no further reads; names still
+# missing on a page are resolved with one batched get_all instead of a read per reference.
+
+import argparse
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from src.config import HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE, HISTORY_SUMMARY_CHARS
+from src.logger import setup_logger
+
+logger = setup_logger("history")
+
+ROLES = ("patient", "doctor")
+
+# kind -> (collection, fields returned in list views)
+HISTORY_KINDS = {
+    "sessions": ("video_sessions", ["date", "patient_id", "doctor_id", "patient_name", "doctor_name", "status",
+                                    "recording_url", "report_id", "prescription_id"]),
+    "reports": ("reports", ["date", "type", "patient_id", "doctor_id", "patient_name", "doctor_name", "session_id",
+                            "summary", "file_url"]),
+    "prescriptions": ("prescriptions", ["date", "patient_id", "doctor_id", "patient_name", "doctor_name", "session_id",
+                                        "medication", "dosage"]),
+}
+
+
+def encode_cursor(date: datetime, doc_id: str) -> str:
+    raw = json.dumps({"date": date.isoformat(), "id": doc_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(state["date"]), str(state["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def summarize_text(text: str, limit: int = HISTORY_SUMMARY_CHARS) -> str:
+    """Plain-text opening of a markdown report, for list views"""
+    lines = [line.strip().lstrip("-*• ").strip() for line in (text or "").splitlines()]
+    flat = " ".join(line for line in lines if line and not line.startswith("#"))
+    return flat if len(flat) <= limit else flat[:limit].rsplit(" ", 1)[0] + "…"
+
+
+def resolve_names(db, items: List[Dict]) -> None:
+    """Fill patient_name/doctor_name on items that lack them: one get_all for the whole batch"""
+    refs = {}
+    for item in items:
+        for role in ROLES:
+            if item.get(f"{role}_id") and not item.get(f"{role}_name"):
+                ref = db.collection(f"{role}s").document(item[f"{role}_id"])
+                refs[ref.path] = ref
+    if not refs:
+        return
+    names = {snapshot.reference.path: (snapshot.to_dict() or {}).get("name")
+             for snapshot in db.get_all(list(refs.values()), field_paths=["name"]) if snapshot.exists}
+    for item in items:
+        for role in ROLES:
+            if item.get(f"{role}_id") and not item.get(f"{role}_name"):
+                name = names.get(f"{role}s/{item[f'{role}_id']}")
+                if name:
+                    item[f"{role}_name"] = name
+
+
+def _derived_fields(collection: str, data: Dict) -> Dict:
+    """Summary fields computable from a document's own data"""
+    fields = {}
+    if collection == "video_sessions":
+        for participant in data.get("participants") or []:
+            if participant.get("role") in ROLES:
+                fields[f"{participant['role']}_id"] = participant.get("uid")
+        if data.get("prescription_ref") is not None:
+            fields["prescription_id"] = data["prescription_ref"].id
+        fields["status"] = "reported" if data.get("report_id") else "recorded" if data.get("recording_url") else "scheduled"
+    else:
+        for key in ("patient", "doctor", "session"):
+            if data.get(f"{key}_ref") is not None:
+                fields[f"{key}_id"] = data[f"{key}_ref"].id
+        if collection == "reports":
+            observations = (data.get("content") or {}).get("observations")
+            if isinstance(observations, str):
+                fields["summary"] = summarize_text(observations)
+    return fields
+
+
+def _missing_fields(collection: str, data: Dict) -> Dict:
+    return {key: value for key, value in _derived_fields(collection, data).items()
+            if value is not None and data.get(key) is None}
+
+
+def denormalized_fields(db, collection: str, data: Dict) -> Dict:
+    """Summary fields to add to a document about to be written; only ones it does not already have"""
+    merged = {**data, **_missing_fields(collection, data)}
+    resolve_names(db, [merged])
+    return {key: value for key, value in merged.items() if value is not None and data.get(key) is None}
+
+
+def list_history(db, kind: str, role: str, uid: str, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None) -> Dict:
+    """One page of a user's sessions, reports or prescriptions: {"items": [...], "next_cursor": str or None}"""
+    from firebase_admin import firestore
+    if kind not in HISTORY_KINDS or role not in ROLES:
+        raise ValueError(f"Unknown history list {role}/{kind}")
+    collection, fields = HISTORY_KINDS[kind]
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    document_id = firestore.FieldPath.document_id()
+    query = (db.collection(collection)
+             .where(filter=firestore.FieldFilter(f"{role}_id", "==", uid))
+             .order_by("date", direction=firestore.Query.DESCENDING)
+             .order_by(document_id, direction=firestore.Query.DESCENDING)
+             .select(fields)
+             .limit(limit + 1))  # one extra document tells whether there is a next page
+    if cursor:
+        date, doc_id = decode_cursor(cursor)
+        query = query.start_after({"date": date, document_id: doc_id})
+    docs = list(query.stream())
+    items = [{"id": doc.id, **(doc.to_dict() or {})} for doc in docs[:limit]]
+    resolve_names(db, items)
+    next_cursor = encode_cursor(items[-1]["date"], items[-1]["id"]) if len(docs) > limit else None
+    logger.info("Listed %s %s for %s %s", len(items), kind, role, uid)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def _pages(db, collection: str, page_size: int) -> Iterator[List]:
+    from firebase_admin import firestore
+    cursor = None
+    while True:
+        query = db.collection(collection).order_by(firestore.FieldPath.document_id()).limit(page_size)
+        if cursor:
+            query = query.start_after({firestore.FieldPath.document_id(): cursor})
+        docs = list(query.stream())
+        if not docs:
+            return
+        cursor = docs[-1].id
+        yield docs
+        if len(docs) < page_size:
+            return
+
+
+def backfill(db, page_size: int = 200) -> Dict[str, int]:
+    """Add summary fields to existing documents; safe to rerun (documents that have them are skipped)"""
+    page_size = min(page_size, 250)  # a reports page writes up to two documents per report, batches take 500
+    updated = {}
+    for kind, (collection, _) in HISTORY_KINDS.items():
+        updated[kind] = 0
+        for docs in _pages(db, collection, page_size):
+            pending = [(doc, doc.to_dict() or {}) for doc in docs]
+            merged = [{**data, **_missing_fields(collection, data)} for _, data in pending]
+            resolve_names(db, merged)
+            batch, writes = db.batch(), 0
+            for (doc, data), full in zip(pending, merged):
+                fields = {key: value for key, value in full.items() if value is not None and data.get(key) is None}
+                if fields:
+                    batch.update(doc.reference, fields)
+                    writes += 1
+                    updated[kind] += 1
+            if kind == "reports":
+                writes += _link_reports_to_sessions(db, batch, [(doc.id, full) for (doc, _), full in zip(pending, merged)])
+            if writes:
+                batch.commit()
+        logger.info("Backfilled %s %s documents", updated[kind], kind)
+    return updated
+
+
+def _link_reports_to_sessions(db, batch, reports: List[Tuple[str, Dict]]) -> int:
+    """Queue report_id/status updates for existing sessions that do not name their report yet"""
+    by_session = {data["session_id"]: report_id for report_id, data in reports if data.get("session_id")}
+    if not by_session:
+        return 0
+    refs = [db.collection("video_sessions").document(session_id) for session_id in by_session]
+    writes = 0
+    for snapshot in db.get_all(refs, field_paths=["report_id"]):
+        if snapshot.exists and not (snapshot.to_dict() or {}).get("report_id"):
+            batch.update(snapshot.reference, {"report_id": by_session[snapshot.id], "status": "reported"})
+            writes += 1
+    return writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History list maintenance")
+    parser.add_argument("--backfill", action="store_true", help="Add summary fields to documents written before them")
+    parser.add_argument("--page-size", type=int, default=200, help="Documents per read page and write batch (max 250)")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do (pass --backfill)")
+    from src.firebase_service import db
+    print(json.dumps(backfill(db, args.page_size)))
+
+
+if __name__ == "__main__":
+    main()
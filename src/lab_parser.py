@@ -0,0 +1,277 @@
+# Deterministic lab-value parser: pulls (test, value, unit, reference range, flag) rows out of report text
+# Runs locally on the output of extract_text_from_file, so the LLM only sees a compact summary plus
+# the abnormal rows instead of re-extracting every value from raw text.
+
+import re
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+from src.logger import setup_logger
+
+logger = setup_logger("lab_parser")
+
+COLUMNS = ["test", "panel", "name", "value", "unit", "ref_low", "ref_high", "ref_range", "flag"]
+
+# canonical test -> (panel, aliases as printed on common Indian/US lab reports); matching is case-insensitive
+SYNONYMS: Dict[str, Tuple[str, List[str]]] = {
+    # Complete blood count
+    "Hemoglobin": ("CBC", ["hemoglobin", "haemoglobin", "hb", "hgb"]),
+    "RBC Count": ("CBC", ["total rbc count", "rbc count", "red blood cell count", "red cell count", "rbc"]),
+    "WBC Count": ("CBC", ["total wbc count", "wbc count", "total leucocyte count", "total leukocyte count",
+                          "white blood cell count", "tlc", "wbc"]),
+    "Platelet Count": ("CBC", ["platelet count", "platelets", "plt"]),
+    "Hematocrit": ("CBC", ["hematocrit", "haematocrit", "packed cell volume", "pcv", "hct"]),
+    "MCV": ("CBC", ["mcv", "mean corpuscular volume"]),
+    "MCH": ("CBC", ["mch", "mean corpuscular hemoglobin"]),
+    "MCHC": ("CBC", ["mchc", "mean corpuscular hemoglobin concentration"]),
+    "RDW": ("CBC", ["rdw-cv", "rdw cv", "rdw"]),
+    "Neutrophils": ("CBC", ["neutrophils", "neutrophil", "polymorphs"]),
+    "Lymphocytes": ("CBC", ["lymphocytes", "lymphocyte"]),
+    "Monocytes": ("CBC", ["monocytes", "monocyte"]),
+    "Eosinophils": ("CBC", ["eosinophils", "eosinophil"]),
+    "Basophils": ("CBC", ["basophils", "basophil"]),
+    "ESR": ("CBC", ["esr", "erythrocyte sedimentation rate"]),
+    # Liver function
+    "Total Bilirubin": ("LFT", ["total bilirubin", "bilirubin total", "bilirubin, total", "serum bilirubin total", "t. bilirubin"]),
+    "Direct Bilirubin": ("LFT", ["direct bilirubin", "bilirubin direct", "bilirubin, direct", "conjugated bilirubin", "d. bilirubin"]),
+    "Indirect Bilirubin": ("LFT", ["indirect bilirubin", "bilirubin indirect", "bilirubin, indirect", "unconjugated bilirubin"]),
+    "ALT": ("LFT", ["sgpt (alt)", "alt (sgpt)", "sgpt", "alt", "alanine aminotransferase", "alanine transaminase"]),
+    "AST": ("LFT", ["sgot (ast)", "ast (sgot)", "sgot", "ast", "aspartate aminotransferase", "aspartate transaminase"]),
+    "ALP": ("LFT", ["alkaline phosphatase", "alp"]),
+    "GGT": ("LFT", ["gamma glutamyl transferase", "gamma gt", "ggt", "ggtp"]),
+    "Total Protein": ("LFT", ["total protein", "total proteins", "protein total", "serum protein"]),
+    "Albumin": ("LFT", ["albumin", "serum albumin"]),
+    "Globulin": ("LFT", ["globulin"]),
+    "A/G Ratio": ("LFT", ["a/g ratio", "albumin/globulin ratio", "a:g ratio"]),
+    # Kidney function
+    "Urea": ("KFT", ["blood urea", "serum urea", "urea"]),
+    "BUN": ("KFT", ["blood urea nitrogen", "bun"]),
+    "Creatinine": ("KFT", ["serum creatinine", "creatinine"]),
+    "Uric Acid": ("KFT", ["serum uric acid", "uric acid"]),
+    "eGFR": ("KFT", ["egfr", "estimated gfr"]),
+    "Sodium": ("KFT", ["serum sodium", "sodium", "na+"]),
+    "Potassium": ("KFT", ["serum potassium", "potassium", "k+"]),
+    "Chloride": ("KFT", ["serum chloride", "chloride", "cl-"]),
+    "Calcium": ("KFT", ["serum calcium", "total calcium", "calcium"]),
+    # Lipid profile
+    "Total Cholesterol": ("Lipid", ["total cholesterol", "cholesterol total", "cholesterol, total", "serum cholesterol", "cholesterol"]),
+    "Triglycerides": ("Lipid", ["triglycerides", "triglyceride", "serum triglycerides", "tg"]),
+    "HDL Cholesterol": ("Lipid", ["hdl cholesterol", "hdl-cholesterol", "hdl-c", "hdl"]),
+    "LDL Cholesterol": ("Lipid", ["ldl cholesterol", "ldl-cholesterol", "ldl-c", "ldl"]),
+    "VLDL Cholesterol": ("Lipid", ["vldl cholesterol", "vldl-c", "vldl"]),
+    "Total Cholesterol/HDL Ratio": ("Lipid", ["total cholesterol/hdl ratio", "chol/hdl ratio", "tc/hdl ratio", "cholesterol/hdl ratio"]),
+    "LDL/HDL Ratio": ("Lipid", ["ldl/hdl ratio"]),
+    # Thyroid profile
+    "TSH": ("Thyroid", ["tsh ultrasensitive", "ultrasensitive tsh", "thyroid stimulating hormone", "tsh"]),
+    "Free T3": ("Thyroid", ["free t3", "ft3", "free triiodothyronine"]),
+    "Free T4": ("Thyroid", ["free t4", "ft4", "free thyroxine"]),
+    "T3": ("Thyroid", ["total t3", "t3 total", "triiodothyronine", "t3"]),
+    "T4": ("Thyroid", ["total t4", "t4 total", "thyroxine", "t4"]),
+    # Diabetes
+    "Fasting Glucose": ("Diabetes", ["fasting blood sugar", "fasting blood glucose", "fasting plasma glucose",
+                                     "glucose fasting", "glucose, fasting", "fbs"]),
+    "Postprandial Glucose": ("Diabetes", ["post prandial blood sugar", "postprandial blood sugar", "glucose pp", "ppbs"]),
+    "Random Glucose": ("Diabetes", ["random blood sugar", "random blood glucose", "rbs"]),
+    "HbA1c": ("Diabetes", ["glycated hemoglobin", "glycosylated hemoglobin", "hba1c", "hb a1c"]),
+}
+
+# Upper bound of a believable result per test, in any unit labs commonly print it in (e.g. g/L as well as
+# g/dL); a larger number is a phone number, pin code or misread, not a result
+PLAUSIBLE_MAX: Dict[str, float] = {
+    "Hemoglobin": 250, "RBC Count": 1e7, "WBC Count": 1e6, "Platelet Count": 5e6, "Hematocrit": 100, "MCV": 200,
+    "MCH": 100, "MCHC": 500, "RDW": 100, "Neutrophils": 1e5, "Lymphocytes": 1e5, "Monocytes": 1e5,
+    "Eosinophils": 1e5, "Basophils": 1e5, "ESR": 200,
+    "Total Bilirubin": 2000, "Direct Bilirubin": 2000, "Indirect Bilirubin": 2000, "ALT": 20000, "AST": 20000,
+    "ALP": 10000, "GGT": 10000, "Total Protein": 150, "Albumin": 100, "Globulin": 100, "A/G Ratio": 10,
+    "Urea": 1000, "BUN": 500, "Creatinine": 2000, "Uric Acid": 1500, "eGFR": 200, "Sodium": 250,
+    "Potassium": 20, "Chloride": 200, "Calcium": 20,
+    "Total Cholesterol": 2000, "Triglycerides": 10000, "HDL Cholesterol": 300, "LDL Cholesterol": 1000,
+    "VLDL Cholesterol": 1000, "Total Cholesterol/HDL Ratio": 50, "LDL/HDL Ratio": 50,
+    "TSH": 1000, "Free T3": 50, "Free T4": 100, "T3": 1000, "T4": 300,
+    "Fasting Glucose": 2000, "Postprandial Glucose": 2000, "Random Glucose": 2000, "HbA1c": 200,
+}
+# Aliases this short also occur in addresses and abbreviations ("HB Road", "Alt. Phone"): a line only counts
+# as a result when it also carries a reference range or a recognisable unit
+_SHORT_ALIAS_LEN = 4
+
+_ALIASES = {alias: test for test, (_, aliases) in SYNONYMS.items() for alias in aliases}
+# Longest alias first so "hdl cholesterol" wins over "hdl" and "hba1c" over "hb"; the lookahead stops
+# an alias matching the start of a longer word
+_NAME_RE = re.compile(
+    r"^[\W_]{0,3}(?P<name>" + "|".join(re.escape(a) for a in sorted(_ALIASES, key=len, reverse=True)) + r")(?![A-Za-z0-9])",
+    re.IGNORECASE,
+)
+# Any "<words> <number> ... <low> - <high>" line, for tests outside the synonym dictionary
+# Digits glued to a letter ("B12") and parenthesised qualifiers ("(25-OH)") stay part of the name
+_GENERIC_NAME_RE = re.compile(
+    r"^[\W_]{0,3}(?P<name>[A-Za-z](?:[A-Za-z .,/+-]|(?<=[A-Za-z])\d+|\([^()]{1,15}\)){1,40}?)"
+    r"(?!(?<=[A-Za-z])\d)(?=\s*[:\-]?\s*[<>]?\s*\d)"
+)
+
+# Indian lakh grouping ("1,50,000") before Western thousands ("150,000"), then a plain or decimal-comma number
+_GROUPED = r"\d{1,2}(?:,\d{2})+,\d{3}(?:\.\d+)?|\d{1,3}(?:,\d{3})+(?:\.\d+)?"
+_NUMBER = _GROUPED + r"|\d+(?:[.,]\d+)?"
+# Qualifiers printed between the name and the value ("Creatinine, Serum : 1.4"); never digits
+_VALUE_RE = re.compile(r"^[^\d<>\n]{0,40}?(?P<op>[<>]=?)?\s*(?P<value>" + _NUMBER + r")(?![\d/])")
+_RANGE_RE = re.compile(
+    r"[(\[]?\s*(?P<low>" + _NUMBER + r")\s*(?:-|–|—|to)\s*(?P<high>" + _NUMBER + r")\s*[)\]]?"
+    r"|(?P<op><=|>=|<|>|≤|≥|up\s*to|less than|more than|greater than)\s*(?P<bound>" + _NUMBER + r")",
+    re.IGNORECASE,
+)
+_UNIT_RE = re.compile(
+    r"(?P<unit>(?:x\s?)?10\^?\d+\s?/\s?[a-zµμ]+"
+    r"|(?:%|/?[a-zµμ][a-zµμ0-9.]*(?:\s?/\s?(?:\d+(?:\.\d+)?\s?)?[a-zµμ][a-zµμ0-9.]*)*))",
+    re.IGNORECASE,
+)
+_FLAG_RE = re.compile(r"(?<![A-Za-z])(?P<flag>high|low|critical|h|l)(?![A-Za-z])|(?P<mark>[*↑↓])", re.IGNORECASE)
+_NOT_UNITS = {"high", "low", "h", "l", "critical", "normal", "n", "to", "up", "upto", "less", "more", "than", "and", "or"}
+
+_UNIT_CANON = {
+    "g/dl": "g/dL", "mg/dl": "mg/dL", "gm/dl": "g/dL", "gm%": "g/dL", "ng/dl": "ng/dL", "ug/dl": "µg/dL",
+    "µg/dl": "µg/dL", "uiu/ml": "µIU/mL", "µiu/ml": "µIU/mL", "miu/l": "mIU/L", "pg/ml": "pg/mL", "ng/ml": "ng/mL",
+    "u/l": "U/L", "iu/l": "IU/L", "mmol/l": "mmol/L", "meq/l": "mEq/L", "fl": "fL", "pg": "pg",
+    "cells/cumm": "cells/cumm", "/cumm": "/cumm", "lakh/cumm": "lakh/cumm", "mm/hr": "mm/hr",
+}
+
+
+def _to_float(text: str) -> float:
+    if re.fullmatch(_GROUPED, text):
+        return float(text.replace(",", ""))
+    return float(text.replace(",", "."))
+
+
+def _canonical_unit(unit: str) -> str:
+    compact = re.sub(r"\s+", "", unit)
+    return _UNIT_CANON.get(compact.lower(), compact)
+
+
+def _is_unit(unit: str) -> bool:
+    """A known lab unit or one shaped like a unit ("mg/dL", "%", "10^3/µL"), not just the next word"""
+    return unit in _UNIT_CANON.values() or any(c in unit for c in "/%^")
+
+
+def _parse_tail(tail: str) -> dict:
+    """Reference range, unit and printed flag from the text after the value (in any order)"""
+    result = {"unit": "", "ref_low": None, "ref_high": None, "ref_range": "", "reported_flag": ""}
+    spans = []
+    match = _RANGE_RE.search(tail)
+    if match:
+        spans.append(match.span())
+        result["ref_range"] = match.group(0).strip(" ()[]")
+        if match.group("low") is not None:
+            low, high = _to_float(match.group("low")), _to_float(match.group("high"))
+            if low > high:  # misread digits or not a range at all: flag nothing against it
+                result["ref_range"] = ""
+            else:
+                result["ref_low"], result["ref_high"] = low, high
+        else:
+            op = match.group("op").lower()
+            bound = _to_float(match.group("bound"))
+            if op.startswith(("<", "≤", "up", "less")):
+                result["ref_high"] = bound
+            else:
+                result["ref_low"] = bound
+    for unit in _UNIT_RE.finditer(tail):
+        if any(start <= unit.start() < end for start, end in spans) or unit.group("unit").lower() in _NOT_UNITS:
+            continue
+        result["unit"] = _canonical_unit(unit.group("unit"))
+        spans.append(unit.span())
+        break
+    leftover = "".join(" " if any(start <= i < end for start, end in spans) else c for i, c in enumerate(tail))
+    flag = _FLAG_RE.search(leftover)
+    if flag:
+        text = (flag.group("flag") or flag.group("mark")).lower()
+        result["reported_flag"] = {"high": "H", "h": "H", "↑": "H", "low": "L", "l": "L", "↓": "L"}.get(text, "A")
+    return result
+
+
+def _flag(value: float, low: Optional[float], high: Optional[float], reported: str) -> str:
+    """H/L against the printed reference range; falls back to the lab's own flag when there is no range"""
+    if low is not None and value < low:
+        return "L"
+    if high is not None and value > high:
+        return "H"
+    if low is not None or high is not None:
+        return "N"
+    return reported
+
+
+def parse_line(line: str) -> Optional[dict]:
+    """One result row from a report line, or None if the line is not a lab result"""
+    match = _NAME_RE.match(line)
+    if match:
+        test = _ALIASES[match.group("name").lower()]
+        panel = SYNONYMS[test][0]
+    else:
+        match = _GENERIC_NAME_RE.match(line)
+        if not match:
+            return None
+        test, panel = match.group("name").strip(" .,:-"), "Other"
+    rest = line[match.end():]
+    value_match = _VALUE_RE.match(rest)
+    if not value_match:
+        return None
+    tail = _parse_tail(rest[value_match.end():])
+    if panel == "Other" and not (tail["ref_range"] and tail["unit"]):
+        return None  # unknown name without a range and unit: too likely to be prose, a date or an address
+    if panel != "Other" and len(match.group("name")) <= _SHORT_ALIAS_LEN and not (tail["ref_range"] or _is_unit(tail["unit"])):
+        return None
+    value = _to_float(value_match.group("value"))
+    if test in PLAUSIBLE_MAX and value > PLAUSIBLE_MAX[test]:
+        return None
+    return {
+        "test": test,
+        "panel": panel,
+        "name": match.group("name").strip(),
+        "value": value,
+        "unit": tail["unit"],
+        "ref_low": tail["ref_low"],
+        "ref_high": tail["ref_high"],
+        "ref_range": tail["ref_range"],
+        "flag": _flag(value, tail["ref_low"], tail["ref_high"], tail["reported_flag"]),
+    }
+
+
+def parse_lab_results(text: str) -> Tuple[pd.DataFrame, str]:
+    """Parse every result line; returns (results table, the report text with result lines removed)"""
+    rows, other_lines, seen = [], [], set()
+    for line in text.splitlines():
+        row = parse_line(line.strip()) if line.strip() else None
+        if row is None:
+            other_lines.append(line)
+            continue
+        key = (row["test"], row["value"])
+        if key not in seen:  # multi-page reports often repeat a result in a summary block
+            seen.add(key)
+            rows.append(row)
+    table = pd.DataFrame(rows, columns=COLUMNS)
+    logger.info("Parsed %d lab results (%d abnormal) from %d lines", len(table),
+                int(table["flag"].isin(["H", "L", "A"]).sum()), len(text.splitlines()))
+    return table, "\n".join(other_lines)
+
+
+def abnormal(table: pd.DataFrame) -> pd.DataFrame:
+    return table[table["flag"].isin(["H", "L", "A"])]
+
+
+def summarize(table: pd.DataFrame) -> str:
+    """Compact prompt section: normal tests by name only (per panel), abnormal rows in full"""
+    if table.empty:
+        return ""
+    flagged = abnormal(table)
+    lines = [f"STRUCTURED LAB RESULTS (parsed from the report): {len(table)} tests, {len(flagged)} outside the reference range."]
+    for panel, group in table.groupby("panel", sort=False):
+        normal = group[~group.index.isin(flagged.index)]
+        if len(normal):
+            lines.append(f"{panel} within range: " + ", ".join(normal["test"].unique()))
+    if len(flagged):
+        lines.append("ABNORMAL RESULTS:")
+        names = {"H": "HIGH", "L": "LOW", "A": "ABNORMAL"}
+        for row in flagged.itertuples():
+            reference = f" (reference {row.ref_range})" if row.ref_range else ""
+            lines.append(f"- {row.test} [{row.panel}]: {row.value:g} {row.unit}{reference} -> {names[row.flag]}".replace("  ", " "))
+    return "\n".join(lines)
+
+
+def to_records(table: pd.DataFrame) -> List[dict]:
+    """JSON-safe rows for the API response (missing range bounds become null)"""
+    return table.astype(object).where(table.notna(), None).to_dict("records")
@@ -0,0 +1,265 @@
+# Outbound governor for Gemini calls: rate limits, adaptive concurrency, priorities and retries
+# Every generate_content call goes through governor.call(), which
+#   1. takes a token from the per-API-key and per-model token buckets, highest priority first
+#      (each process's buckets refill at its 1/GEMINI_RATE_WORKERS share of the configured RPM),
+#   2. waits for a concurrency slot, highest priority first (AIMD-sized limit),
+#   3. retries 429/5xx/timeouts with full-jitter exponential backoff,
+#   4. feeds observed latency (against the route's own target) and 429s back into the concurrency limit.
+# Rate tokens are taken before the slot, so a call waiting on the quota never holds a slot.
+
+import hashlib
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from src.config import (
+    GEMINI_API_KEY, GEMINI_KEY_RPM, GEMINI_MODEL_RPM, GEMINI_RATE_WORKERS, GEMINI_MIN_CONCURRENCY, GEMINI_MAX_CONCURRENCY,
+    GEMINI_TARGET_LATENCY_MS, GEMINI_ROUTE_TARGET_LATENCY_MS, GEMINI_MAX_RETRIES, GEMINI_BACKOFF_BASE_MS, GEMINI_BACKOFF_MAX_MS, GEMINI_QUEUE_TIMEOUT_S,
+)
+from src.logger import setup_logger
+
+logger = setup_logger("llm_governor")
+
+# Priority classes: lower value is served first
+PRIORITY_EMERGENCY = 0   # triage / intent classification that may detect an emergency
+PRIORITY_INTERACTIVE = 1  # chat answers a user is waiting on
+PRIORITY_STANDARD = 2    # term simplification
+PRIORITY_BATCH = 3       # long report analysis, post-call processing
+
+PRIORITY_NAMES = {PRIORITY_EMERGENCY: "emergency", PRIORITY_INTERACTIVE: "interactive",
+                  PRIORITY_STANDARD: "standard", PRIORITY_BATCH: "batch"}
+
+_RETRYABLE_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+                    "DeadlineExceeded", "GatewayTimeout", "Timeout", "TimeoutError", "ConnectionError"}
+
+
+class GovernorTimeout(Exception):
+    """Raised when a call could not get a slot or rate-limit token in time"""
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    code = getattr(error, "code", None)
+    if callable(code):  # grpc-style errors expose code() rather than an int
+        return None
+    return code if isinstance(code, int) else None
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return _status_code(error) == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def is_retryable(error: Exception) -> bool:
+    code = _status_code(error)
+    if code is not None:
+        return code == 429 or code >= 500
+    return type(error).__name__ in _RETRYABLE_NAMES
+
+
+class TokenBucket:
+    """Classic token bucket; callers wait in a RateGate rather than queueing up debt here"""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, self.rate * 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available_in(self) -> float:
+        """Seconds until a token is available (0 if one is now)"""
+        with self._lock:
+            self._refill()
+            return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+
+
+class RateGate:
+    """Hands out token-bucket tokens to waiting callers, highest priority first.
+
+    A caller only waits behind earlier-served callers that need one of the same buckets, so a call to a model
+    with spare quota is not held up by calls queued on another model's quota.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._waiters: Dict[tuple, List[TokenBucket]] = {}  # (priority, seq) -> buckets it needs
+        self._seq = itertools.count()
+
+    def acquire(self, buckets: List[TokenBucket], priority: int, timeout: float) -> None:
+        entry = (priority, next(self._seq))
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._waiters[entry] = buckets
+            try:
+                while True:
+                    blocked = any(other < entry and any(b in buckets for b in needs)
+                                  for other, needs in self._waiters.items())
+                    wait = None if blocked else max(bucket.available_in() for bucket in buckets)
+                    if wait == 0:
+                        for bucket in buckets:
+                            bucket.take()
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or (wait is not None and wait > remaining):
+                        raise GovernorTimeout(f"No rate-limit token within {timeout:.0f}s "
+                                              f"(priority {PRIORITY_NAMES.get(priority, priority)})")
+                    self._cond.wait(remaining if wait is None else wait)
+            finally:
+                del self._waiters[entry]
+                self._cond.notify_all()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._waiters)
+
+
+class AIMDLimiter:
+    """Adaptive concurrency limit with a priority-ordered wait queue.
+
+    The limit grows by 1/limit per fast success (additive increase) and halves on
+    a 429 or a latency above the target (multiplicative decrease), so the number of
+    in-flight calls tracks what the provider can currently absorb.
+    """
+
+    def __init__(self, min_limit: int, max_limit: int, target_latency_s: float):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency_s = target_latency_s
+        self.limit = float(min(max_limit, max(min_limit, max_limit // 2)))
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._waiters = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._last_decrease = 0.0
+
+    def acquire(self, priority: int, timeout: float) -> None:
+        entry = (priority, next(self._seq))
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while not (self._waiters[0] == entry and self.in_flight < int(self.limit)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise GovernorTimeout(f"No LLM slot within {timeout:.0f}s (priority {PRIORITY_NAMES.get(priority, priority)})")
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def release(self, latency_s: Optional[float], rate_limited: bool, target_latency_s: Optional[float] = None) -> None:
+        """target_latency_s: what counts as slow for this call's route (defaults to the limiter's target)"""
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            target = self.target_latency_s if target_latency_s is None else target_latency_s
+            overloaded = rate_limited or (latency_s is not None and latency_s > target)
+            if overloaded:
+                # At most one decrease per target-latency window, so one burst of 429s doesn't collapse the limit to min
+                if now - self._last_decrease > self.target_latency_s:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+            elif latency_s is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class LLMGovernor:
+    def __init__(self):
+        self.limiter = AIMDLimiter(GEMINI_MIN_CONCURRENCY, GEMINI_MAX_CONCURRENCY, GEMINI_TARGET_LATENCY_MS / 1000)
+        self.rate_gate = RateGate()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {name: {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0, "rate_limited": 0, "queue_wait_ms": 0.0}
+                      for name in PRIORITY_NAMES.values()}
+
+    def _bucket(self, key: str, rpm: float) -> TokenBucket:
+        with self._buckets_lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(rpm)
+            return self._buckets[key]
+
+    def _record(self, priority: int, **deltas) -> None:
+        with self._stats_lock:
+            entry = self.stats[PRIORITY_NAMES.get(priority, "standard")]
+            for key, value in deltas.items():
+                entry[key] += value
+
+    def call(self, fn: Callable[[], Any], model_name: str, priority: int = PRIORITY_STANDARD,
+             api_key: Optional[str] = GEMINI_API_KEY, route: Optional[str] = None) -> Any:
+        """Run fn() (a single generate_content call) under rate, concurrency and retry control.
+
+        route: the task type (as in MODEL_ROUTES); its latency target decides when a call counts as slow.
+        """
+        key_id = hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+        buckets = [self._bucket(f"key:{key_id}", GEMINI_KEY_RPM / GEMINI_RATE_WORKERS),
+                   self._bucket(f"model:{model_name}", GEMINI_MODEL_RPM / GEMINI_RATE_WORKERS)]
+        target_s = GEMINI_ROUTE_TARGET_LATENCY_MS.get(route, GEMINI_TARGET_LATENCY_MS) / 1000
+        self._record(priority, calls=1)
+
+        attempt = 0
+        while True:
+            queued_at = time.monotonic()
+            try:
+                self.rate_gate.acquire(buckets, priority, GEMINI_QUEUE_TIMEOUT_S)
+                self.limiter.acquire(priority, max(0.0, GEMINI_QUEUE_TIMEOUT_S - (time.monotonic() - queued_at)))
+            except GovernorTimeout:
+                self._record(priority, failed=1)
+                raise
+            latency, rate_limited = None, False
+            try:
+                self._record(priority, queue_wait_ms=(time.monotonic() - queued_at) * 1000)
+                start = time.monotonic()
+                result = fn()
+                latency = time.monotonic() - start
+                self._record(priority, succeeded=1)
+                return result
+            except Exception as e:
+                rate_limited = is_rate_limited(e)
+                if rate_limited:
+                    self._record(priority, rate_limited=1)
+                if not is_retryable(e) or attempt >= GEMINI_MAX_RETRIES:
+                    self._record(priority, failed=1)
+                    raise
+            finally:
+                self.limiter.release(latency, rate_limited, target_s)
+
+            # Full-jitter exponential backoff, outside the concurrency slot
+            attempt += 1
+            self._record(priority, retries=1)
+            backoff = random.uniform(0, min(GEMINI_BACKOFF_MAX_MS, GEMINI_BACKOFF_BASE_MS * 2 ** attempt)) / 1000
+            logger.warning("Retrying %s call (attempt %d, %s) in %.0f ms", model_name, attempt,
+                           "rate limited" if rate_limited else "transient error", backoff * 1000)
+            time.sleep(backoff)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current limit, queue depth and per-priority counters, for the /metrics endpoint"""
+        with self._stats_lock:
+            per_priority = {name: {k: round(v, 1) if isinstance(v, float) else v for k, v in entry.items()}
+                            for name, entry in self.stats.items()}
+        return {
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "queued": len(self.limiter._waiters),
+            "waiting_for_rate_tokens": len(self.rate_gate),
+            "rate_share": round(1 / GEMINI_RATE_WORKERS, 3),
+            "priorities": per_priority,
+        }
+
+
+# Process-wide governor shared by every Gemini caller
+governor = LLMGovernor()
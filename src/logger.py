@@ -1,9 +1,21 @@
-# Logging configuration; unchanged from original
-# Sets up structured logging with debug/info levels based on env
+# Logging configuration: non-blocking, structured logging
+# Updated: Queue-based handler with a background listener thread, JSON output,
+# request/session correlation IDs and sampling of high-volume info logs
 
+import atexit
+import contextlib
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
 import sys
+import threading
+from datetime import datetime, timezone
+from typing import Optional
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -12,35 +24,201 @@ load_dotenv()
 # Get DEBUG setting from environment
 DEBUG = os.getenv('DEBUG', 'False').lower() in ('true', '1', 'yes', 'on')
 
+# Output format: 'text' (human readable) or 'json' (one object per line)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+# Max records buffered for the listener thread; extra records are dropped, never block
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+# Fraction of INFO/DEBUG records kept (warnings and errors are always kept)
+LOG_INFO_SAMPLE_RATE = float(os.getenv('LOG_INFO_SAMPLE_RATE', 1.0))
+
+# Correlation IDs, bound per request/WebSocket/session by the API layer
+request_id_var = contextvars.ContextVar('request_id', default=None)
+session_id_var = contextvars.ContextVar('session_id', default=None)
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and goes into JSON output
+_RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id', 'session_id', 'sample'}
+
+_queue = queue.Queue(LOG_QUEUE_SIZE)
+_queue_handlers = []
+_listener = None
+_listener_lock = threading.Lock()
+_dropped = 0
+
+
+@contextlib.contextmanager
+def log_context(request_id: Optional[str] = None, session_id: Optional[str] = None):
+    """Bind correlation IDs to all logs emitted inside the block (sync or async code)"""
+    tokens = []
+    if request_id is not None:
+        tokens.append((request_id_var, request_id_var.set(request_id)))
+    if session_id is not None:
+        tokens.append((session_id_var, session_id_var.set(session_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """Render records as single-line JSON objects"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'session_id': getattr(record, 'session_id', None),
+        }
+        if DEBUG:
+            payload['func'] = record.funcName
+            payload['line'] = record.lineno
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class _ContextFilter(logging.Filter):
+    """Stamp correlation IDs on the record while still on the caller's thread/task"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or '-'
+        record.session_id = session_id_var.get() or '-'
+        return True
+
+
+class _SamplingFilter(logging.Filter):
+    """Keep a fraction of INFO/DEBUG records; pass extra={'sample': False} to always keep one"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        if getattr(record, 'sample', True) is False:
+            return True
+        return random.random() < self.rate
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks the caller and defers formatting to the listener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may be mutated after the call returns) but leave
+        # formatting and I/O to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped += 1
+
+
+def _build_formatter() -> logging.Formatter:
+    if LOG_FORMAT == 'json':
+        return JsonFormatter()
+    # Detailed format for debug mode
+    if DEBUG:
+        return logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] - %(funcName)s:%(lineno)d - %(message)s'
+        )
+    return logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] - %(message)s'
+    )
+
+
+def _build_output_handler(stream=None) -> logging.Handler:
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+    handler.setFormatter(_build_formatter())
+    return handler
+
+
+def _ensure_listener() -> None:
+    """Start the background listener that performs the actual writes"""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = logging.handlers.QueueListener(_queue, _build_output_handler(), respect_handler_level=True)
+            _listener.start()
+
+
+def _stop_listener() -> None:
+    """Flush queued records and stop the listener (runs at interpreter exit)"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def _reinit_after_fork() -> None:
+    """Threads do not survive fork(); give the child its own queue and listener"""
+    global _queue, _listener, _listener_lock
+    _queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = None
+    _listener_lock = threading.Lock()
+    for handler in _queue_handlers:
+        handler.queue = _queue
+    if _queue_handlers:
+        _ensure_listener()
+
+
+atexit.register(_stop_listener)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reinit_after_fork)
+
+
+def set_output_stream(stream) -> None:
+    """Redirect listener output to another stream (used by benchmarks)"""
+    _stop_listener()
+    global _listener
+    with _listener_lock:
+        _listener = logging.handlers.QueueListener(_queue, _build_output_handler(stream), respect_handler_level=True)
+        _listener.start()
+
+
+def get_dropped_count() -> int:
+    """Number of records dropped because the queue was full"""
+    return _dropped
+
+
 def setup_logger(name: str) -> logging.Logger:
-    """Set up logger with formatted output"""
+    """Set up logger that hands records to the background listener"""
     logger = logging.getLogger(name)
-    
+
     # Prevent adding handlers multiple times
     if logger.handlers:
         return logger
-    
+
     # Set level based on DEBUG
     logger.setLevel(logging.DEBUG if DEBUG else logging.INFO)
-    
-    # Create console handler
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(logging.DEBUG if DEBUG else logging.INFO)
-    
-    # Detailed format for debug mode
-    if DEBUG:
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
-        )
-    else:
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-    
-    handler.setFormatter(formatter)
+
+    handler = _NonBlockingQueueHandler(_queue)
+    handler.addFilter(_SamplingFilter(LOG_INFO_SAMPLE_RATE))
+    handler.addFilter(_ContextFilter())
     logger.addHandler(handler)
-    
+    _queue_handlers.append(handler)
+    _ensure_listener()
+
     # Prevent propagation to avoid duplicate logs
     logger.propagate = False
-    
-    return logger
\ No newline at end of file
+
+    return logger
@@ -1,18 +1,37 @@
 # FastAPI application: Main entry point
 # Updated: Added /doctors endpoint for frontend booking
 
-from fastapi import FastAPI, UploadFile, File, Form, WebSocket, WebSocketDisconnect, Depends, HTTPException
+from fastapi import (
+    FastAPI, UploadFile, File, Form, WebSocket, WebSocketDisconnect, Depends, HTTPException, Request, Header, Query,
+    BackgroundTasks,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from src.chatbot_service import get_disease_info, simplify_terms, chatbot
 from src.report_analyzer import analyze_report
-from src.logger import setup_logger
+from src.logger import setup_logger, log_context, session_id_var
 from src.rag import get_relevant_contexts
-from src.firebase_service import verify_auth_token, create_video_session, update_video_session, db
+from src.firebase_service import (
+    verify_auth_token, create_video_session, update_video_session, upload_to_storage_async, db,
+    list_sessions_for_user, list_reports_for_user, list_prescriptions_for_user,
+)
 from src.video_call_service import process_recording
 from src.prescription_service import add_prescription
+from src.profiling import profile_request
+from src.singleflight import singleflight_stats
+from src.llm_governor import governor
+from src.model_router import router
+from src.model_server import server_stats
+from src.ws_mux import serve_multiplexed
+from src.tempfiles import temporary_path, sweep_stale
+from src.config import MODEL_DEPLOYMENT_MODE, HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE
+from firebase_admin import firestore
+import os
+import shutil
 import uuid
-from typing import Dict, List
+from contextlib import ExitStack
+from typing import Dict, List, Literal, Optional
 
 class QuestionRequest(BaseModel):
     question: str
@@ -33,6 +52,8 @@ class AddPrescriptionRequest(BaseModel):
 
 logger = setup_logger("main")
 
+sweep_stale()  # scratch files a killed worker left behind
+
 app = FastAPI(
     title="SHIVAAI - AI Public Health Chatbot",
     description="Upload reports, get disease info, simplified medical terms, symptoms, and precautions",
@@ -47,6 +68,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def profile_middleware(request: Request, call_next):
+    """Opt-in per-request profiling, triggered by the X-Profile header (see src.profiling)."""
+    return await profile_request(request, call_next)
+
+# Registered last so it is the outermost middleware and the ID covers everything below it
+@app.middleware("http")
+async def bind_request_id(request: Request, call_next):
+    """Attach a correlation ID (client-supplied X-Request-ID or generated) to every log line of the request."""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    with log_context(request_id=request_id):
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 @app.get("/")
 def home():
     return {"message": "Welcome to SHIVAAI Chatbot API"}
@@ -55,32 +91,33 @@ def home():
 async def upload_report(file: UploadFile = File(...)):
     try:
         file_content = await file.read()
-        analysis = analyze_report(file_content)
-        return {"filename": file.filename, "status": "analyzed successfully", "analysis": analysis}
+        result = await run_in_threadpool(analyze_report, file_content)
+        return {"filename": file.filename, "status": "analyzed successfully", **result}
     except Exception as e:
-        logger.error(f"Error in upload_report: {str(e)}")
+        logger.error("Error in upload_report: %s", e)
         return {"error": str(e)}
 
 @app.post("/ask-question/")
 async def ask_question(question: QuestionRequest):
     try:
-        response = chatbot.generate_response(question.question)
+        # Blocking LLM/RAG work runs in the threadpool so concurrent requests overlap (and can coalesce)
+        response = await run_in_threadpool(chatbot.generate_response, question.question)
         return {"response": response}
     except Exception as e:
-        logger.error(f"Error in ask_question: {e}")
+        logger.error("Error in ask_question: %s", e)
         return {"error": str(e)}
 
 @app.post("/simplify-term/")
 async def simplify_term(term: str = Form(...)):
     try:
-        simplified = simplify_terms(term)
+        simplified = await run_in_threadpool(simplify_terms, term)
         return {"term": term, "simplified": simplified}
     except Exception as e:
-        logger.error(f"Error in simplify_term: {str(e)}")
+        logger.error("Error in simplify_term: %s", e)
         return {"error": str(e)}
 
 @app.post("/create-video-session/")
-async def create_video_session(request: CreateSessionRequest):
+async def api_create_video_session(request: CreateSessionRequest):
     """Create video session metadata in Firestore."""
     try:
         decoded_token = verify_auth_token(request.id_token)
@@ -94,7 +131,7 @@ async def create_video_session(request: CreateSessionRequest):
         create_video_session(session_id, data)
         return {"session_id": session_id}
     except Exception as e:
-        logger.error(f"Error creating session: {e}")
+        logger.error("Error creating session: %s", e)
         raise HTTPException(status_code=401, detail="Auth failed or error")
 
 @app.post("/add-prescription/")
@@ -110,25 +147,34 @@ async def api_add_prescription(request: AddPrescriptionRequest):
         )
         return {"prescription_id": prescription_id}
     except Exception as e:
-        logger.error(f"Error adding prescription: {e}")
+        logger.error("Error adding prescription: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
+def _process_uploaded_recording(scratch: ExitStack, url: str, session_id: str, file_path: str):
+    """Background task (threadpool): transcribe and report on the upload, then remove its local copy"""
+    with scratch:
+        process_recording(url, session_id, local_path=file_path)
+
 @app.post("/upload-recording/")
-async def upload_recording(file: UploadFile = File(...), session_id: str = Form(...), id_token: str = Form(...)):
+async def upload_recording(background_tasks: BackgroundTasks, file: UploadFile = File(...), session_id: str = Form(...),
+                           id_token: str = Form(...)):
     """Upload 30s recording, store in Cloudinary, trigger AI processing."""
     try:
+        session_id_var.set(session_id)
         decoded_token = verify_auth_token(id_token)
-        file_path = f"/tmp/{file.filename}"  # Temp save
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
         destination = f"recordings/{session_id}/{file.filename}"
-        url = upload_to_storage(file_path, destination)
-        update_video_session(session_id, {'recording_url': url})
-        # Trigger AI processing asynchronously (for prototype, sync)
-        process_recording(url, session_id)
+        with ExitStack() as scratch:
+            file_path = scratch.enter_context(temporary_path(os.path.splitext(os.path.basename(file.filename or ""))[1]))
+            with open(file_path, "wb") as f:
+                await run_in_threadpool(shutil.copyfileobj, file.file, f, 1 << 20)  # Streamed, not read into memory
+            url = await upload_to_storage_async(file_path, destination)
+            update_video_session(session_id, {'recording_url': url, 'status': 'recorded'})
+            # AI processing runs after the response, off the event loop; audio is decoded from the local copy,
+            # which the task now owns and removes when it finishes
+            background_tasks.add_task(_process_uploaded_recording, scratch.pop_all(), url, session_id, file_path)
         return {"status": "uploaded and processing"}
     except Exception as e:
-        logger.error(f"Error uploading recording: {e}")
+        logger.error("Error uploading recording: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/doctors", response_model=List[Dict])
@@ -137,45 +183,81 @@ async def get_doctors():
     try:
         doctors = db.collection('doctors').get()
         doctor_list = [{"uid": doc.id, **doc.to_dict()} for doc in doctors]
-        logger.info(f"Fetched {len(doctor_list)} doctors")
+        logger.info("Fetched %s doctors", len(doctor_list))
         return doctor_list
     except Exception as e:
-        logger.error(f"Error fetching doctors: {e}")
+        logger.error("Error fetching doctors: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+HISTORY_LISTS = {
+    'sessions': list_sessions_for_user,
+    'reports': list_reports_for_user,
+    'prescriptions': list_prescriptions_for_user,
+}
+
+async def _history_page(role: str, uid: str, kind: str, limit: int, cursor: Optional[str], authorization: str) -> Dict:
+    try:
+        decoded_token = verify_auth_token(authorization.removeprefix("Bearer ").strip())
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Auth failed")
+    if decoded_token['uid'] != uid:
+        raise HTTPException(status_code=403, detail="Only your own history can be listed")
+    try:
+        return await run_in_threadpool(HISTORY_LISTS[kind], uid, role, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error listing %s %s: %s", role, kind, e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/patients/{uid}/{kind}")
+async def get_patient_history(uid: str, kind: Literal['sessions', 'reports', 'prescriptions'],
+                              limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+                              cursor: Optional[str] = None, authorization: str = Header(...)):
+    """Patient's sessions, reports or prescriptions, newest first; pass next_cursor back as ?cursor= for the next page."""
+    return await _history_page('patient', uid, kind, limit, cursor, authorization)
+
+@app.get("/doctors/{uid}/{kind}")
+async def get_doctor_history(uid: str, kind: Literal['sessions', 'reports', 'prescriptions'],
+                             limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+                             cursor: Optional[str] = None, authorization: str = Header(...)):
+    """Doctor's sessions, reports or prescriptions, newest first; pass next_cursor back as ?cursor= for the next page."""
+    return await _history_page('doctor', uid, kind, limit, cursor, authorization)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Operational counters (request coalescing, outbound LLM governor, per-route model usage, model server)."""
+    metrics = {"singleflight": singleflight_stats(), "llm_governor": governor.snapshot(), "model_routes": router.stats()}
+    if MODEL_DEPLOYMENT_MODE == "sidecar":
+        metrics["model_server"] = await run_in_threadpool(server_stats)
+    return metrics
+
 @app.websocket("/ws/signaling/{session_id}")
 async def websocket_signaling(websocket: WebSocket, session_id: str):
     """WebSocket for WebRTC signaling (offer/answer/ICE)."""
     await websocket.accept()
-    try:
-        while True:
-            data = await websocket.receive_json()
-            # Broadcast to other participant (for simplicity, assume 2 participants; in prod, use rooms/channels)
-            # Here, just echo for prototype; implement proper signaling logic in frontend/backend.
-            await websocket.send_json({"type": "signal", "data": data})
-    except WebSocketDisconnect:
-        logger.info("Signaling WebSocket disconnected")
+    with log_context(request_id=uuid.uuid4().hex, session_id=session_id):
+        try:
+            while True:
+                data = await websocket.receive_json()
+                # Broadcast to other participant (for simplicity, assume 2 participants; in prod, use rooms/channels)
+                # Here, just echo for prototype; implement proper signaling logic in frontend/backend.
+                await websocket.send_json({"type": "signal", "data": data})
+        except WebSocketDisconnect:
+            logger.info("Signaling WebSocket disconnected")
+
+async def _answer_disease_query(query: str) -> Dict:
+    """One retrieval per query, shared by the LLM prompt and the retrieved_docs sent back"""
+    retrieved_docs = await run_in_threadpool(get_relevant_contexts, query)
+    answer = await run_in_threadpool(get_disease_info, query, retrieved_docs)
+    return {"question": query, "llm_answer": answer, "retrieved_docs": retrieved_docs}
 
 @app.websocket("/ws/disease_info")
 async def websocket_disease_info(websocket: WebSocket):
+    """Concurrent id-tagged queries per connection (protocol in src.ws_mux); plain-text messages still work"""
     await websocket.accept()
-    try:
-        while True:
-            query = await websocket.receive_text()
-            answer = get_disease_info(query)
-            retrieved_docs = get_relevant_contexts(query)
-            response = {
-                "question": query,
-                "llm_answer": answer,
-                "retrieved_docs": retrieved_docs
-            }
-            await websocket.send_json(response)
-    except WebSocketDisconnect:
-        logger.info("WebSocket client disconnected")
-    except Exception as e:
-        await websocket.send_text(f"Error: {str(e)}")
-        await websocket.close()
-        logger.error(f"WebSocket error: {str(e)}")
+    with log_context(request_id=uuid.uuid4().hex):
+        await serve_multiplexed(websocket, _answer_disease_query)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,103 @@
+# Tiered model routing: each task type goes to a configurable Gemini tier, with per-route accounting
+# Routes and tier models come from config (MODEL_ROUTES, GEMINI_MODEL_FAST/STANDARD/PRO, MODEL_COST_*)
+
+import threading
+import time
+import google.generativeai as genai
+from typing import Any, Dict, Optional
+from src.config import GEMINI_API_KEY, GEMINI_MODEL_FAST, GEMINI_MODEL_STANDARD, GEMINI_MODEL_PRO, MODEL_ROUTES, MODEL_COSTS
+from src.llm_governor import governor, PRIORITY_EMERGENCY, PRIORITY_INTERACTIVE, PRIORITY_STANDARD, PRIORITY_BATCH
+from src.logger import setup_logger
+from src.prompt_builder import count_tokens
+
+logger = setup_logger("model_router")
+
+# Configure Gemini with API key
+genai.configure(api_key=GEMINI_API_KEY)
+
+TIER_MODELS = {"fast": GEMINI_MODEL_FAST, "standard": GEMINI_MODEL_STANDARD, "pro": GEMINI_MODEL_PRO}
+
+# Default governor priority of each task
+TASK_PRIORITIES = {
+    "intent": PRIORITY_EMERGENCY,
+    "chat": PRIORITY_INTERACTIVE,
+    "simplify": PRIORITY_STANDARD,
+    "call_report": PRIORITY_BATCH,
+    "report": PRIORITY_BATCH,
+}
+
+
+class ModelRouter:
+    def __init__(self, routes: Dict[str, str], tier_models: Dict[str, str], costs: Dict[str, tuple]):
+        unknown = {tier for tier in routes.values() if tier not in tier_models}
+        if unknown:
+            raise ValueError(f"MODEL_ROUTES references unknown tiers: {sorted(unknown)}")
+        self.routes = routes
+        self.tier_models = tier_models
+        self.costs = costs
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def route(self, task: str) -> tuple:
+        """(tier, model name) for a task; unknown tasks use the standard tier"""
+        tier = self.routes.get(task, "standard")
+        return tier, self.tier_models[tier]
+
+    def _model(self, model_name: str):
+        with self._lock:
+            if model_name not in self._models:
+                self._models[model_name] = genai.GenerativeModel(model_name)
+            return self._models[model_name]
+
+    def record(self, route: str, latency_s: float, tier: Optional[str] = None, input_tokens: int = 0,
+               output_tokens: int = 0, error: bool = False) -> None:
+        """Account one call on a route (also used for local, zero-network routes)"""
+        cost_in, cost_out = self.costs.get(tier, (0.0, 0.0)) if tier else (0.0, 0.0)
+        with self._lock:
+            entry = self._stats.setdefault(route, {
+                "tier": tier or "local", "calls": 0, "errors": 0, "latency_ms_total": 0.0, "latency_ms_max": 0.0,
+                "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0,
+            })
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["latency_ms_total"] += latency_s * 1000
+            entry["latency_ms_max"] = max(entry["latency_ms_max"], latency_s * 1000)
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            entry["cost_usd"] += input_tokens / 1000 * cost_in + output_tokens / 1000 * cost_out
+
+    def generate(self, task: str, prompt: str, priority: Optional[int] = None) -> str:
+        """Send the prompt to the task's tier through the outbound governor and return the text"""
+        tier, model_name = self.route(task)
+        model = self._model(model_name)
+        priority = TASK_PRIORITIES.get(task, PRIORITY_STANDARD) if priority is None else priority
+        start = time.perf_counter()
+        try:
+            response = governor.call(lambda: model.generate_content(prompt), model_name=model_name, priority=priority,
+                                     route=task)
+        except Exception:
+            self.record(task, time.perf_counter() - start, tier, count_tokens(prompt), error=True)
+            raise
+        text = response.text
+        # Prefer the provider's own token counts when the response carries them
+        usage = getattr(response, "usage_metadata", None)
+        input_tokens = getattr(usage, "prompt_token_count", None) or count_tokens(prompt)
+        output_tokens = getattr(usage, "candidates_token_count", None) or count_tokens(text)
+        self.record(task, time.perf_counter() - start, tier, input_tokens, output_tokens)
+        return text
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-route calls, latency, tokens and estimated cost, for the /metrics endpoint"""
+        with self._lock:
+            snapshot = {route: dict(entry) for route, entry in self._stats.items()}
+        for route, entry in snapshot.items():
+            entry["model"] = self.tier_models.get(entry["tier"], "local")
+            entry["latency_ms_avg"] = round(entry["latency_ms_total"] / entry["calls"], 2) if entry["calls"] else 0.0
+            entry["latency_ms_max"] = round(entry["latency_ms_max"], 2)
+            entry["cost_usd"] = round(entry["cost_usd"], 6)
+            del entry["latency_ms_total"]
+        return snapshot
+
+
+router = ModelRouter(MODEL_ROUTES, TIER_MODELS, MODEL_COSTS)
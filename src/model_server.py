@@ -0,0 +1,272 @@
+# Model sidecar: one process holds the sentence embedder and Whisper, API workers call it over a Unix socket
+# Usage: python -m src.model_server            # then run the API workers with MODEL_DEPLOYMENT_MODE=sidecar
+# Concurrent encode requests from all workers are merged into batches of up to MODEL_SERVER_MAX_BATCH texts
+# (waiting at most MODEL_SERVER_BATCH_WAIT_MS for a batch to fill); transcriptions run one at a time.
+# Wire format, both directions: 4-byte big-endian header length, JSON header, then header["nbytes"] raw bytes
+# (float32 embeddings or audio samples).
+
+import asyncio
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from src.config import (
+    MODEL_SERVER_SOCKET, MODEL_SERVER_MAX_BATCH, MODEL_SERVER_BATCH_WAIT_MS, MODEL_SERVER_TIMEOUT_S, WHISPER_MODEL,
+    EMBEDDING_THREADS,
+)
+from src.logger import setup_logger
+
+logger = setup_logger("model_server")
+
+_HEADER = struct.Struct(">I")
+
+
+def _pack(header: Dict, payload: bytes = b"") -> bytes:
+    body = json.dumps({**header, "nbytes": len(payload)}, default=lambda o: o.tolist() if hasattr(o, "tolist") else str(o)).encode()
+    return _HEADER.pack(len(body)) + body + payload
+
+
+# ---------------------------------------------------------------- Server
+
+class _EncodeBatcher:
+    """Merges concurrent encode requests into one model call"""
+
+    def __init__(self, model, max_batch: int, wait_ms: float):
+        self.model = model
+        self.max_batch = max_batch
+        self.wait_s = wait_ms / 1000
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+        self.batches = 0
+        self.texts = 0
+
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, future))
+        return await future
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            count = len(batch[0][0])
+            deadline = loop.time() + self.wait_s
+            while count < self.max_batch:
+                try:
+                    item = self.queue.get_nowait() if self.queue.qsize() else \
+                        await asyncio.wait_for(self.queue.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                count += len(item[0])
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self._encode, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            start = 0
+            for item_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[start:start + len(item_texts)])
+                start += len(item_texts)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, batch_size=self.max_batch, convert_to_numpy=True), dtype=np.float32)
+
+
+class ModelServer:
+    def __init__(self, embedder, whisper_model=None, max_batch: int = MODEL_SERVER_MAX_BATCH,
+                 wait_ms: float = MODEL_SERVER_BATCH_WAIT_MS):
+        self.batcher = _EncodeBatcher(embedder, max_batch, wait_ms)
+        self.whisper_model = whisper_model
+        self.whisper_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
+        self.started = time.monotonic()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    size = _HEADER.unpack(await reader.readexactly(_HEADER.size))[0]
+                except asyncio.IncompleteReadError:
+                    return  # client closed the connection
+                header = json.loads(await reader.readexactly(size))
+                payload = await reader.readexactly(header["nbytes"]) if header.get("nbytes") else b""
+                try:
+                    response, data = await self._dispatch(header, payload)
+                except Exception as e:
+                    logger.error("Model server %s request failed: %s", header.get("op"), e)
+                    response, data = {"ok": False, "error": f"{type(e).__name__}: {e}"}, b""
+                writer.write(_pack(response, data))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, header: Dict, payload: bytes) -> Tuple[Dict, bytes]:
+        op = header.get("op")
+        if op == "encode":
+            vectors = await self.batcher.encode(header["texts"])
+            return {"ok": True, "shape": list(vectors.shape)}, vectors.tobytes()
+        if op == "transcribe":
+            if self.whisper_model is None:
+                raise RuntimeError("Whisper is not loaded in this model server")
+            audio = header["path"] if "path" in header else np.frombuffer(payload, dtype=np.float32)
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.whisper_executor, lambda: self.whisper_model.transcribe(audio, **header.get("options", {})))
+            return {"ok": True, "result": result}, b""
+        if op == "stats":
+            batcher = self.batcher
+            return {"ok": True, "batches": batcher.batches, "texts": batcher.texts, "whisper": self.whisper_model is not None,
+                    "avg_batch": batcher.texts / batcher.batches if batcher.batches else 0.0,
+                    "uptime_s": time.monotonic() - self.started}, b""
+        raise ValueError(f"Unknown op {op!r}")
+
+    async def serve(self, path: str = MODEL_SERVER_SOCKET) -> None:
+        if os.path.exists(path):
+            os.remove(path)  # stale socket from a previous run
+        server = await asyncio.start_unix_server(self.handle, path=path)
+        os.chmod(path, 0o660)
+        batcher_task = asyncio.create_task(self.batcher.run())
+        logger.info("Model server listening on %s", path)
+        async with server:
+            try:
+                await server.serve_forever()
+            finally:
+                batcher_task.cancel()
+
+
+def load_models(with_whisper: bool = True):
+    """The embedder (EMBEDDING_BACKEND) and, optionally, Whisper"""
+    from src.embeddings import load_embedder
+    embedder = load_embedder()
+    whisper_model = None
+    if with_whisper:
+        import whisper
+        whisper_model = whisper.load_model(WHISPER_MODEL)
+        logger.info("Loaded Whisper model: %s", WHISPER_MODEL)
+    return embedder, whisper_model
+
+
+def main():
+    embedder, whisper_model = load_models(with_whisper="--no-whisper" not in sys.argv)
+    asyncio.run(ModelServer(embedder, whisper_model).serve())
+
+
+# ---------------------------------------------------------------- Client (used by API workers)
+
+_local = threading.local()
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    chunks, remaining = [], n
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise ConnectionError("model server closed the connection")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def _connection(path: str) -> socket.socket:
+    sock = getattr(_local, "sock", None)
+    if sock is None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(MODEL_SERVER_TIMEOUT_S)
+        sock.connect(path)
+        _local.sock = sock
+    return sock
+
+
+# Safe to send twice: a retry after the request went out cannot queue a second Whisper run
+_IDEMPOTENT_OPS = ("encode", "stats")
+
+
+def _drop_connection() -> None:
+    sock = getattr(_local, "sock", None)
+    if sock is not None:
+        sock.close()
+        _local.sock = None
+
+
+def _call(header: Dict, payload: bytes = b"", path: str = MODEL_SERVER_SOCKET) -> Tuple[Dict, bytes]:
+    """One request on this thread's connection. A broken connection is reopened once if the request never went
+    out (or the op is idempotent); a timeout is raised as is, since the server may still be running the request."""
+    message = _pack(header, payload)
+    for attempt in range(2):
+        sent = False
+        try:
+            sock = _connection(path)
+            sock.sendall(message)
+            sent = True
+            response = json.loads(_recv_exactly(sock, _HEADER.unpack(_recv_exactly(sock, _HEADER.size))[0]))
+            data = _recv_exactly(sock, response["nbytes"]) if response.get("nbytes") else b""
+            break
+        except socket.timeout:
+            _drop_connection()  # a late response must not be read as the next request's
+            raise
+        except (ConnectionError, FileNotFoundError):
+            _drop_connection()
+            if attempt or (sent and header.get("op") not in _IDEMPOTENT_OPS):
+                raise
+    if not response.get("ok"):
+        raise RuntimeError(f"Model server error: {response.get('error')}")
+    return response, data
+
+
+class EmbedderClient:
+    """Drop-in for the SentenceTransformer .encode() calls RAG and triage make"""
+
+    def __init__(self, path: str = MODEL_SERVER_SOCKET):
+        self.path = path
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True, normalize_embeddings: bool = False,
+               **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        response, data = _call({"op": "encode", "texts": texts}, path=self.path)
+        vectors = np.frombuffer(data, dtype=np.float32).reshape(response["shape"])
+        if normalize_embeddings:
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors[0] if single else vectors
+
+
+class WhisperClient:
+    """Drop-in for whisper_model.transcribe(); audio is a file path or 16 kHz float32 samples"""
+
+    def __init__(self, path: str = MODEL_SERVER_SOCKET):
+        self.path = path
+
+    def transcribe(self, audio, **options) -> Dict:
+        if isinstance(audio, str):
+            header, payload = {"op": "transcribe", "path": os.path.abspath(audio), "options": options}, b""
+        else:
+            header, payload = {"op": "transcribe", "options": options}, np.asarray(audio, dtype=np.float32).tobytes()
+        return _call(header, payload, path=self.path)[0]["result"]
+
+
+def server_stats(path: str = MODEL_SERVER_SOCKET) -> Optional[Dict]:
+    try:
+        return _call({"op": "stats"}, path=path)[0]
+    except Exception:
+        return None
+
+
+def after_fork(workers: int) -> None:
+    """In a forked (preload) worker: give torch its share of the cores instead of all of them"""
+    if "torch" in sys.modules and not EMBEDDING_THREADS:
+        sys.modules["torch"].set_num_threads(max(1, (os.cpu_count() or 1) // max(1, workers)))
+
+
+if __name__ == "__main__":
+    main()
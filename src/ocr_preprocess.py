@@ -0,0 +1,182 @@
+# Image preprocessing for OCR of phone photos and scans of lab reports (NumPy/Pillow only)
+# Pipeline: EXIF orientation -> grayscale -> rescale to OCR resolution -> adaptive (Sauvola)
+# binarization -> deskew -> crop to the text region -> optional tiling, OCR'd in parallel.
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+import numpy as np
+import pytesseract
+from PIL import Image, ImageOps
+from src.config import OCR_TARGET_LONG_SIDE, OCR_TILES, OCR_TILE_WORKERS, OCR_TESSERACT_CONFIG, OCR_LANG
+from src.logger import setup_logger
+
+logger = setup_logger("ocr_preprocess")
+
+# Working size for skew and layout analysis; decisions there don't need full resolution
+_ANALYSIS_LONG_SIDE = 800
+
+
+def rescale(image: Image.Image, target_long_side: int = OCR_TARGET_LONG_SIDE) -> Image.Image:
+    """Scale so the long side is ~target (about 300 DPI for an A4/letter page).
+
+    Camera photos are usually 3-4x larger than Tesseract needs, which only costs time;
+    tiny screenshots are upscaled so character strokes stay several pixels wide.
+    """
+    long_side = max(image.size)
+    if long_side > target_long_side * 1.1 or long_side < target_long_side / 2:
+        scale = target_long_side / long_side
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        resample = Image.LANCZOS if scale < 1 else Image.BICUBIC
+        image = image.resize(size, resample)
+    return image
+
+
+def _box_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Mean over a window x window box around every pixel, via an integral image"""
+    pad = window // 2
+    padded = np.pad(values, pad + 1, mode="edge").astype(np.float64)
+    integral = padded.cumsum(0).cumsum(1)
+    h, w = values.shape
+    total = (integral[window:window + h, window:window + w] - integral[:h, window:window + w]
+             - integral[window:window + h, :w] + integral[:h, :w])
+    return total / (window * window)
+
+
+def sauvola_binarize(gray: np.ndarray, window: int = 0, k: float = 0.2, r: float = 128.0, min_std: float = 20.0) -> np.ndarray:
+    """Adaptive threshold robust to shadows and uneven lighting; returns True where there is ink.
+
+    Windows with less local contrast than min_std (blank paper, a flat table top) hold no text,
+    so sensor noise there is never marked as ink.
+    """
+    if not window:
+        window = max(15, (min(gray.shape) // 40) | 1)
+    gray = gray.astype(np.float64)
+    mean = _box_mean(gray, window)
+    sq_mean = _box_mean(gray * gray, window)
+    std = np.sqrt(np.maximum(sq_mean - mean * mean, 0))
+    threshold = mean * (1 + k * (std / r - 1))
+    return (gray < threshold) & (std > min_std)
+
+
+def remove_rules(ink: np.ndarray, fraction: float = 0.3, pad: int = 3) -> np.ndarray:
+    """Clear long horizontal/vertical lines (page edges, table rules) that would dominate skew and cropping"""
+    ink = ink.copy()
+    for axis in (0, 1):
+        solid = np.where(ink.mean(axis=1 - axis) > fraction)[0]
+        for i in solid:
+            if axis == 0:
+                ink[max(0, i - pad):i + pad + 1, :] = False
+            else:
+                ink[:, max(0, i - pad):i + pad + 1] = False
+    return ink
+
+
+def _small_mask(ink: np.ndarray) -> Image.Image:
+    image = Image.fromarray((ink * 255).astype(np.uint8))
+    scale = _ANALYSIS_LONG_SIDE / max(image.size)
+    if scale < 1:
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.BOX)
+    return image
+
+
+def _row_coverage(width: int, height: int, angle: float) -> np.ndarray:
+    """Per row, how many pixels of a width x height page rotated about its centre (same canvas) are on the page"""
+    theta = np.radians(angle)
+    c, s = np.cos(theta), abs(np.sin(theta))
+    y = np.arange(height) + 0.5 - height / 2
+    # Points (x, y) on the rotated page satisfy |x c + y s| <= w/2 and |y c - x s| <= h/2 (mirror-symmetric in angle)
+    left = np.maximum((-width / 2 - y * s) / c, -width / 2)
+    right = np.minimum((width / 2 - y * s) / c, width / 2)
+    if s > 1e-9:
+        left = np.maximum(left, (y * c - height / 2) / s)
+        right = np.minimum(right, (y * c + height / 2) / s)
+    return np.maximum(right - left, 0)
+
+
+def estimate_skew(ink: np.ndarray, max_angle: float = 10.0) -> float:
+    """Angle (degrees) that best aligns text lines horizontally, by projection-profile variance.
+
+    The profile is ink per row over page area per row, so the empty corners a rotation adds don't score.
+    A blank, solid or noise-only page has no angle clearly better than any other and is left at 0.
+    """
+    small = _small_mask(ink)
+
+    def score(angle: float) -> float:
+        rotated = np.asarray(small.rotate(angle, resample=Image.BILINEAR, fillcolor=0), dtype=np.float32).sum(axis=1)
+        inside = 255 * _row_coverage(small.width, small.height, angle)
+        rows = inside > 0.1 * 255 * small.width  # skip the slivers at the top and bottom of a rotated page
+        return float((rotated[rows] / inside[rows]).var()) if rows.any() else 0.0
+
+    angles = np.arange(-max_angle, max_angle + 0.01, 1.0)
+    scores = np.array([score(angle) for angle in angles])
+    # Text lines spread the scores across angles by 1e-3 or more; on ink-free, solid or speckled pages they
+    # differ only by sampling noise (under 1e-4), so there is nothing to align
+    if scores.max() - scores.min() < 1e-4:
+        return 0.0
+    coarse = angles[scores.argmax()]
+    fine = max(np.arange(max(coarse - 1.0, -max_angle), min(coarse + 1.0, max_angle) + 0.01, 0.1), key=score)
+    return float(round(min(max(fine, -max_angle), max_angle), 2))
+
+
+def text_bounding_box(ink: np.ndarray, margin: int = 20) -> Tuple[int, int, int, int]:
+    """(left, top, right, bottom) of the text region; dark photo borders and specks are ignored"""
+    h, w = ink.shape
+    rows = ink.mean(axis=1)
+    cols = ink.mean(axis=0)
+    # Text rows/columns have some ink but are far from solid (solid = table edge or background)
+    row_idx = np.where((rows > 0.005) & (rows < 0.6))[0]
+    col_idx = np.where((cols > 0.005) & (cols < 0.6))[0]
+    if not len(row_idx) or not len(col_idx):
+        return 0, 0, w, h
+    return (max(0, int(col_idx[0]) - margin), max(0, int(row_idx[0]) - margin),
+            min(w, int(col_idx[-1]) + margin + 1), min(h, int(row_idx[-1]) + margin + 1))
+
+
+def split_into_tiles(ink: np.ndarray, tiles: int) -> List[Tuple[int, int]]:
+    """Split into horizontal bands, cutting only through blank rows so no text line is split"""
+    h = ink.shape[0]
+    if tiles <= 1 or h < tiles * 50:
+        return [(0, h)]
+    row_ink = ink.sum(axis=1)
+    cuts = [0]
+    for i in range(1, tiles):
+        target = i * h // tiles
+        window = slice(max(cuts[-1] + 1, target - h // (tiles * 4)), min(h - 1, target + h // (tiles * 4)))
+        candidates = np.arange(window.start, window.stop)
+        if not len(candidates):
+            continue
+        cuts.append(int(candidates[np.argmin(row_ink[window])]))
+    cuts.append(h)
+    return [(top, bottom) for top, bottom in zip(cuts, cuts[1:]) if bottom - top > 10]
+
+
+def preprocess(image: Image.Image) -> Tuple[Image.Image, np.ndarray]:
+    """Return the cleaned binary page (black text on white) and its ink mask"""
+    image = ImageOps.exif_transpose(image)
+    gray = rescale(image.convert("L"))
+    ink = remove_rules(sauvola_binarize(np.asarray(gray)))
+    angle = estimate_skew(ink)
+    if abs(angle) >= 0.2:
+        # Fill the exposed corners with the surrounding colour so they don't create new edges
+        pixels = np.asarray(gray)
+        fill = int(np.median(np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])))
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+        ink = remove_rules(sauvola_binarize(np.asarray(gray)))
+    left, top, right, bottom = text_bounding_box(ink)
+    ink = ink[top:bottom, left:right]
+    page = Image.fromarray(np.where(ink, 0, 255).astype(np.uint8))
+    logger.debug("OCR preprocess: %sx%s -> %sx%s, deskew %.2f deg", image.width, image.height, page.width, page.height, angle)
+    return page, ink
+
+
+def ocr_image(image: Image.Image, tiles: int = OCR_TILES) -> str:
+    """Preprocess and OCR an image, optionally as tiles recognised in parallel"""
+    page, ink = preprocess(image)
+    bands = split_into_tiles(ink, tiles)
+    if len(bands) == 1:
+        return pytesseract.image_to_string(page, lang=OCR_LANG, config=OCR_TESSERACT_CONFIG)
+    crops = [page.crop((0, top, page.width, bottom)) for top, bottom in bands]
+    # Tesseract runs as a subprocess, so threads give real parallelism here
+    with ThreadPoolExecutor(max_workers=min(OCR_TILE_WORKERS, len(crops))) as pool:
+        texts = list(pool.map(lambda crop: pytesseract.image_to_string(crop, lang=OCR_LANG, config=OCR_TESSERACT_CONFIG), crops))
+    return "\n".join(text.strip("\n") for text in texts)
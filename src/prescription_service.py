@@ -3,6 +3,7 @@
 
 from src.firebase_service import db, create_prescription
 from src.logger import setup_logger
+from firebase_admin import firestore
 import uuid
 
 logger = setup_logger("prescription")
@@ -0,0 +1,123 @@
+# Opt-in per-request profiling for production debugging
+# A request is profiled when PROFILING_ENABLED is set and it carries an X-Profile header:
+#   X-Profile: cprofile -> deterministic cProfile of the event-loop thread, saved as .prof (pstats)
+#   X-Profile: sample   -> statistical sampler over all threads (threadpool work included),
+#                          saved as collapsed stacks (flamegraph.pl / speedscope compatible)
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+from src.config import PROFILING_ENABLED, PROFILING_TOKEN, PROFILE_DIR, PROFILE_SAMPLE_INTERVAL_MS
+from src.logger import setup_logger
+
+logger = setup_logger("profiling")
+
+# Only one request is profiled at a time; concurrent profile requests are served unprofiled
+_profile_lock = threading.Lock()
+
+
+class StackSampler:
+    """Periodically records the stacks of all threads (pyinstrument-style sampling)"""
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def top(self, limit: int = 15) -> str:
+        """Self-time summary: leaf frames by sample count"""
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return "\n".join(f"{100 * count / total:5.1f}%  {frame}" for frame, count in leaves.most_common(limit))
+
+
+def _requested_mode(headers) -> Optional[str]:
+    """Return the profiling mode requested by the headers, or None if not allowed/requested"""
+    if not PROFILING_ENABLED:
+        return None
+    mode = headers.get("x-profile")
+    if not mode:
+        return None
+    if PROFILING_TOKEN and headers.get("x-profile-token") != PROFILING_TOKEN:
+        return None
+    return "cprofile" if mode.lower() == "cprofile" else "sample"
+
+
+async def profile_request(request, call_next):
+    """Run the request under a profiler when asked to; otherwise pass straight through"""
+    mode = _requested_mode(request.headers)
+    if mode is None:
+        return await call_next(request)
+    if not _profile_lock.acquire(blocking=False):
+        response = await call_next(request)
+        response.headers["X-Profile-Skipped"] = "busy"
+        return response
+
+    profile_id = uuid.uuid4().hex
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    start = time.perf_counter()
+    try:
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = await call_next(request)
+            finally:
+                profiler.disable()
+            path = os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+            profiler.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(15)
+            report = summary.getvalue()
+        else:
+            sampler = StackSampler(PROFILE_SAMPLE_INTERVAL_MS / 1000)
+            sampler.start()
+            try:
+                response = await call_next(request)
+            finally:
+                sampler.stop()
+            path = os.path.join(PROFILE_DIR, f"{profile_id}.collapsed")
+            with open(path, "w") as f:
+                f.write(sampler.collapsed())
+            report = sampler.top()
+    finally:
+        _profile_lock.release()
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    logger.info("Profiled %s %s (%s, %.1f ms) -> %s\n%s", request.method, request.url.path, mode, elapsed_ms, path, report,
+                extra={'sample': False})
+    response.headers["X-Profile-Id"] = profile_id
+    return response
@@ -0,0 +1,244 @@
+# Token-budgeted prompt assembly: local token counting, passage selection and dedup
+# Keeps LLM prompt size bounded regardless of how large reports, transcripts or RAG contexts get
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from src.config import PROMPT_PASSAGE_TOKENS, PROMPT_DEDUPE_THRESHOLD
+from src.logger import setup_logger
+
+logger = setup_logger("prompt_builder")
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_TERM_RE = re.compile(r"[a-z0-9]+")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_PAGE_MARKER_RE = re.compile(r"^--- page \d+ ---$")  # added per page by report_analyzer.extract_text_from_file
+_PAGE_SPLIT_RE = re.compile(r"^(?=--- Page \d+ ---$)", re.MULTILINE)
+_DIGIT_RE = re.compile(r"\d")
+_BOILERPLATE_SENTENCE_CHARS = 60
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or that the this to was what when "
+    "where which who why will with my me you your do does can should".split()
+)
+
+
+def count_tokens(text: str) -> int:
+    """Approximate LLM token count locally (no network, no tokenizer download).
+
+    Words are counted as one token per ~6 characters, punctuation as one token each,
+    which tracks SentencePiece/BPE counts for English medical text within ~10-15%.
+    """
+    if not text:
+        return 0
+    return sum(1 + (len(tok) - 1) // 6 for tok in _TOKEN_RE.findall(text))
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut text at a token boundary so that count_tokens(result) <= budget"""
+    if budget <= 0:
+        return ""
+    used = 0
+    for match in _TOKEN_RE.finditer(text):
+        tok = match.group()
+        used += 1 + (len(tok) - 1) // 6
+        if used > budget:
+            return text[:match.start()].rstrip() + " …"
+    return text
+
+
+def _terms(text: str) -> List[str]:
+    return [t for t in _TERM_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def split_passages(text: str, max_tokens: int = PROMPT_PASSAGE_TOKENS) -> List[str]:
+    """Split a document into passages of at most ~max_tokens, on paragraph then line boundaries"""
+    passages = []
+    for block in re.split(r"\n\s*\n|\n(?=--- Page \d+ ---)", text):
+        block = block.strip()
+        if not block:
+            continue
+        if count_tokens(block) <= max_tokens:
+            passages.append(block)
+            continue
+        current, current_tokens = [], 0
+        for line in block.splitlines():
+            line_tokens = count_tokens(line)
+            if current and current_tokens + line_tokens > max_tokens:
+                passages.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(line if line_tokens <= max_tokens else truncate_to_tokens(line, max_tokens))
+            current_tokens += min(line_tokens, max_tokens)
+        if current:
+            passages.append("\n".join(current))
+    return passages
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    terms = _TERM_RE.findall(text.lower())
+    if len(terms) < size:
+        return {" ".join(terms)} if terms else set()
+    return {" ".join(terms[i:i + size]) for i in range(len(terms) - size + 1)}
+
+
+def dedupe_passages(passages: List[str], threshold: float = PROMPT_DEDUPE_THRESHOLD) -> List[str]:
+    """Drop passages whose word 3-shingles overlap an earlier passage by >= threshold (Jaccard)"""
+    kept, kept_shingles = [], []
+    for passage in passages:
+        shingles = _shingles(passage)
+        if not shingles:
+            continue
+        duplicate = False
+        for other in kept_shingles:
+            union = len(shingles | other)
+            if union and len(shingles & other) / union >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(passage)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def _bm25_scores(query: str, passages: List[str], k1: float = 1.2, b: float = 0.75) -> List[float]:
+    query_terms = set(_terms(query))
+    docs = [Counter(_terms(p)) for p in passages]
+    if not query_terms or not docs:
+        return [0.0] * len(passages)
+    avg_len = sum(sum(d.values()) for d in docs) / len(docs) or 1.0
+    df = Counter(term for d in docs for term in query_terms if term in d)
+    scores = []
+    for d in docs:
+        length = sum(d.values())
+        score = 0.0
+        for term in query_terms:
+            tf = d.get(term, 0)
+            if tf:
+                idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        scores.append(score)
+    return scores
+
+
+def _density_scores(passages: List[str]) -> List[float]:
+    """Without a query, prefer passages dense in measured values (lab results, vitals)"""
+    return [len(_NUMBER_RE.findall(p)) / max(1, count_tokens(p)) for p in passages]
+
+
+def select_passages(passages: List[str], budget: int, query: Optional[str] = None, keep_order: bool = True) -> List[str]:
+    """Greedily keep the highest-scoring passages that fit in the token budget"""
+    if not passages:
+        return []
+    scores = _bm25_scores(query, passages) if query else _density_scores(passages)
+    ranked = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+    chosen, used = [], 0
+    for i in ranked:
+        tokens = count_tokens(passages[i])
+        if used + tokens > budget:
+            continue
+        chosen.append(i)
+        used += tokens
+    if keep_order:
+        chosen.sort()
+    return [passages[i] for i in chosen]
+
+
+def _line_key(line: str) -> str:
+    return " ".join(line.split()).lower()
+
+
+def _page_boilerplate(text: str, min_chars: int, edge_lines: int) -> set:
+    """Lines on two or more pages, either near a page edge (headers, footers) or long, digit-free sentences
+    (disclaimers, method notes). Lab result rows never count: the same value on two dates is content."""
+    counts, originals = Counter(), {}
+    for page in _PAGE_SPLIT_RE.split(text):
+        body = []
+        for line in page.splitlines():
+            key = _line_key(line)
+            if key and not _PAGE_MARKER_RE.match(key):
+                body.append(key)
+                originals.setdefault(key, line)
+        sentences = {key for key in body if len(key) >= _BOILERPLATE_SENTENCE_CHARS and not _DIGIT_RE.search(key)}
+        counts.update(set(body[:edge_lines] + body[-edge_lines:]) | sentences)
+    candidates = [key for key, pages in counts.items() if pages >= 2 and len(key) >= min_chars]
+    if not candidates:
+        return set()
+    from src.lab_parser import parse_line  # pandas, only for multi-page reports
+    return {key for key in candidates if parse_line(originals[key]) is None}
+
+
+def drop_repeated_lines(text: str, min_chars: int = 20, edge_lines: int = 2) -> str:
+    """Remove page boilerplate: a substantial line repeating the line before it, or one _page_boilerplate finds on
+    several pages of a PDF report (the first copy stays). Other repeats, such as the same result on two dates
+    or a dosage restated in a transcript, are content and are kept."""
+    boilerplate = _page_boilerplate(text, min_chars, edge_lines)
+    seen, lines, previous = set(), [], None
+    for line in text.splitlines():
+        key = _line_key(line)
+        if len(key) >= min_chars and (key == previous or (key in boilerplate and key in seen)):
+            continue
+        seen.add(key)
+        if key:
+            previous = key
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def compress_documents(texts: List[str], budget: int, query: Optional[str] = None) -> str:
+    """Fit one or more documents into a token budget.
+
+    Passages repeated across or within documents (page headers, the same report
+    retrieved twice) are removed; if the rest still does not fit, the passages that
+    best match the query (or carry the most values, without a query) are kept.
+    """
+    passages = dedupe_passages([p for text in texts if text for p in split_passages(drop_repeated_lines(text))])
+    if sum(count_tokens(p) for p in passages) <= budget:
+        return "\n\n".join(passages)
+    # Retrieved contexts are ranked by relevance; a single document keeps its reading order
+    return "\n\n".join(select_passages(passages, budget, query, keep_order=query is None))
+
+
+def compress_transcript(transcript: str, budget: int) -> str:
+    """Keep the opening and closing of a call transcript, where complaints and plans usually are"""
+    if count_tokens(transcript) <= budget:
+        return transcript
+    head = truncate_to_tokens(transcript, int(budget * 0.6))
+    tail_tokens = budget - count_tokens(head) - 8
+    words = transcript.split()
+    tail, used = [], 0
+    for word in reversed(words):
+        used += count_tokens(word)
+        if used > tail_tokens:
+            break
+        tail.append(word)
+    omitted = count_tokens(transcript) - count_tokens(head) - used
+    return f"{head}\n[... {max(omitted, 0)} tokens omitted ...]\n{' '.join(reversed(tail))}"
+
+
+def format_prescription(prescription: Dict) -> str:
+    """Compact, field-limited rendering of a prescription document"""
+    fields = ('medication', 'dosage', 'instructions')
+    return "\n".join(f"{field.capitalize()}: {prescription.get(field, '')}" for field in fields)
+
+
+class PromptBuilder:
+    """Assembles a prompt from named sections (already fitted to their budgets) and logs per-section sizes"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.sections: List[Tuple[str, str]] = []
+        self.sizes: Dict[str, int] = {}
+
+    def add(self, section: str, text: str) -> "PromptBuilder":
+        if not text:
+            return self
+        self.sections.append((section, text))
+        self.sizes[section] = self.sizes.get(section, 0) + count_tokens(text)
+        return self
+
+    def build(self) -> str:
+        prompt = "".join(text for _, text in self.sections)
+        total = count_tokens(prompt)
+        logger.info("Built %s prompt: %d tokens %s", self.name, total, self.sizes,
+                    extra={'prompt': self.name, 'prompt_tokens': total})
+        return prompt
@@ -1,22 +1,47 @@
 # Retrieval-Augmented Generation (RAG) module for Pinecone
-# Updated: Added function to store AI-generated reports
+# Updated: Concurrent identical retrievals share one embedding + query (single-flight)
+# Updated: Serves the index named by the alias document when configured (swapped by src.reindex)
+# Updated: Embedder loaded through src.embeddings (EMBEDDING_BACKEND selects fp32, int8 or ONNX)
+# Updated: MODEL_DEPLOYMENT_MODE=sidecar embeds through the shared model server instead
 
 from pinecone import Pinecone, ServerlessSpec
-from sentence_transformers import SentenceTransformer
 import json
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from src.config import PINECONE_API_KEY, PINECONE_INDEX_NAME, PINECONE_DIMENSION
+from src.config import (
+    PINECONE_API_KEY, PINECONE_INDEX_NAME, PINECONE_DIMENSION, PINECONE_INDEX_ALIAS_DOC, PINECONE_ALIAS_REFRESH_S,
+    MODEL_DEPLOYMENT_MODE, EMBEDDING_MODEL,
+)
+from src.embeddings import load_embedder
 from src.logger import setup_logger
+from src.singleflight import get_group, normalize_query
 from typing import Dict
 
 # Load environment variables
 load_dotenv()
 
 logger = setup_logger("rag")
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
+if MODEL_DEPLOYMENT_MODE == "sidecar":
+    from src.model_server import EmbedderClient
+    embedder = EmbedderClient()
+else:
+    embedder = load_embedder()
 
-def init_pinecone():
+def read_index_alias() -> Dict:
+    """The alias document ({active_index, building_index, ...}), or {} when not configured or unreadable"""
+    if not PINECONE_INDEX_ALIAS_DOC:
+        return {}
+    try:
+        from src.firebase_service import db
+        snapshot = db.document(PINECONE_INDEX_ALIAS_DOC).get()
+        return (snapshot.to_dict() or {}) if snapshot.exists else {}
+    except Exception as e:
+        logger.error("Failed to read index alias %s: %s", PINECONE_INDEX_ALIAS_DOC, e)
+        return {}
+
+def init_pinecone(index_name: str = PINECONE_INDEX_NAME):
     """Initialize Pinecone client and index"""
     pc = Pinecone(api_key=PINECONE_API_KEY)
     
@@ -24,9 +49,9 @@ def init_pinecone():
     existing_indexes = pc.list_indexes()
     index_names = [index.name for index in existing_indexes]
     
-    if PINECONE_INDEX_NAME not in index_names:
+    if index_name not in index_names:
         pc.create_index(
-            name=PINECONE_INDEX_NAME,
+            name=index_name,
             dimension=PINECONE_DIMENSION,
             metric='cosine',
             spec=ServerlessSpec(
@@ -34,48 +59,108 @@ def init_pinecone():
                 region='us-east-1'
             )
         )
-        logger.info(f"Created new index: {PINECONE_INDEX_NAME}")
+        logger.info("Created new index: %s", index_name)
     
     # Connect to the index
-    index = pc.Index(PINECONE_INDEX_NAME)
-    logger.info(f"Connected to index: {PINECONE_INDEX_NAME}")
+    index = pc.Index(index_name)
+    logger.info("Connected to index: %s", index_name)
     return index
 
+def alias_matches_embedder(alias: Dict) -> bool:
+    """The aliased index was embedded like this process embeds queries (aliases without a model predate the check)"""
+    model, dimension = alias.get('model'), alias.get('dimension')
+    return (model is None or model == EMBEDDING_MODEL) and (dimension is None or dimension == PINECONE_DIMENSION)
+
+def _refuse_alias(alias: Dict, serving: str) -> None:
+    logger.error("Not serving index %s: built with %s (dimension %s), but queries are embedded with %s; serving %s",
+                 alias.get('active_index'), alias.get('model'), alias.get('dimension'), EMBEDDING_MODEL, serving,
+                 extra={'sample': False})
+
 # Initialize index on module import
+_alias = read_index_alias()
+index_name = _alias.get('active_index') or PINECONE_INDEX_NAME
+if not alias_matches_embedder(_alias):
+    index_name = PINECONE_INDEX_NAME
+    _refuse_alias(_alias, index_name)
 try:
-    index = init_pinecone()
+    index = init_pinecone(index_name)
 except Exception as e:
-    logger.error(f"Failed to initialize Pinecone: {e}")
+    logger.error("Failed to initialize Pinecone: %s", e)
     index = None
 
+# A shadow index being rebuilt by src.reindex also receives live writes, so nothing is lost at the swap
+_shadow = None
+_alias_lock = threading.Lock()
+_alias_checked = 0.0
+
+def _refresh_alias() -> None:
+    global index, index_name, _shadow, _alias_checked
+    with _alias_lock:
+        if time.monotonic() - _alias_checked < PINECONE_ALIAS_REFRESH_S:
+            return
+        _alias_checked = time.monotonic()
+        alias = read_index_alias()
+        try:
+            name = alias.get('active_index') or PINECONE_INDEX_NAME
+            if name != index_name and not alias_matches_embedder(alias):
+                _refuse_alias(alias, index_name)
+            elif name != index_name:
+                index = Pinecone(api_key=PINECONE_API_KEY).Index(name)
+                logger.info("Index alias swapped: %s -> %s", index_name, name, extra={'sample': False})
+                index_name = name
+            building = alias.get('building_index')
+            if building != (_shadow[0] if _shadow else None):
+                _shadow = (building, Pinecone(api_key=PINECONE_API_KEY).Index(building)) if building else None
+                logger.info("Shadow index for dual writes: %s", building, extra={'sample': False})
+        except Exception as e:
+            logger.error("Failed to apply index alias %s: %s", alias, e)
+
+def get_index():
+    """Serving index; the alias is re-read every PINECONE_ALIAS_REFRESH_S so a swap needs no restart"""
+    if PINECONE_INDEX_ALIAS_DOC and time.monotonic() - _alias_checked >= PINECONE_ALIAS_REFRESH_S:
+        _refresh_alias()
+    return index
+
 def embed_text(text: str) -> list:
-    """Generate embedding for text using SentenceTransformer"""
+    """Generate embedding for text using the configured SentenceTransformer backend"""
     return embedder.encode(text).tolist()
 
 def upsert_to_pinecone(vectors: list, ids: list, metadata: list):
     """Upsert vectors and metadata to Pinecone"""
+    index = get_index()
     if index is None:
         logger.error("Pinecone index not initialized")
         return
         
     upserts = [(id, vec, meta) for id, vec, meta in zip(ids, vectors, metadata)]
     index.upsert(vectors=upserts)
-    logger.info(f"Upserted {len(ids)} vectors to Pinecone.")
+    shadow = _shadow
+    if shadow:
+        try:
+            shadow[1].upsert(vectors=upserts)
+        except Exception as e:
+            logger.error("Dual write to shadow index %s failed: %s", shadow[0], e)
+    logger.info("Upserted %s vectors to Pinecone.", len(ids))
+
+_retrieval_flight = get_group("retrieval")
 
 def get_relevant_contexts(query: str, k=3) -> list:
     """Retrieve relevant contexts from Pinecone using query embedding"""
-    if index is None:
+    if get_index() is None:
         logger.error("Pinecone index not initialized")
         return []
-        
+    # Callers get their own list; the shared result must not be mutated
+    return list(_retrieval_flight.do((normalize_query(query), k), _query_contexts, query, k))
+
+def _query_contexts(query: str, k: int) -> list:
     emb = embed_text(query)
-    res = index.query(vector=emb, top_k=k, include_metadata=True)
+    res = get_index().query(vector=emb, top_k=k, include_metadata=True)
     contexts = [match['metadata']['full_text'] for match in res['matches'] if match['score'] > 0.5]
     return contexts
 
 def store_interaction(query: str, response: str, type: str = 'query'):
     """Store user query and response in Pinecone"""
-    if index is None:
+    if get_index() is None:
         logger.error("Pinecone index not initialized")
         return
         
@@ -86,7 +171,7 @@ def store_interaction(query: str, response: str, type: str = 'query'):
 
 def store_report_analysis(report_text: str, analysis: str):
     """Store report and its analysis in Pinecone"""
-    if index is None:
+    if get_index() is None:
         logger.error("Pinecone index not initialized")
         return
         
@@ -97,7 +182,7 @@ def store_report_analysis(report_text: str, analysis: str):
 
 def store_ai_report(report_id: str, full_text: str, metadata: Dict):
     """Store AI-generated report in Pinecone for RAG retrieval"""
-    if index is None:
+    if get_index() is None:
         logger.error("Pinecone index not initialized")
         return
         
@@ -0,0 +1,361 @@
+# Resumable bulk re-indexing of the vector store, for embedding-model or chunking changes
+# Usage:
+#   python -m src.reindex --target medical-v2                  # build (or resume building) a shadow index
+#   python -m src.reindex --target medical-v2 --swap           # ...then point the serving alias at it
+#   python -m src.reindex --rollback                           # point the alias back at the previous index
+# Sources are streamed in pages, embedded in large batches on a process pool and upserted in bulk.
+# Progress is checkpointed after every page, so rerunning the same command resumes a crashed run.
+# RAG serves whichever index the alias document (PINECONE_INDEX_ALIAS_DOC) names, and while a build runs
+# it also writes new vectors into the shadow index, so nothing written mid-build is lost at the swap.
+# The alias records the model, dimension and chunking the index was built with; a serving process only adopts
+# an index embedded with its own EMBEDDING_MODEL. To change the model:
+#   1. python -m src.reindex --model <new> --target medical-v2     # build only, no --swap
+#   2. roll out EMBEDDING_MODEL=<new> (and PINECONE_INDEX_NAME=medical-v2, the index they start on until the swap)
+#   3. EMBEDDING_MODEL=<new> python -m src.reindex --target medical-v2 --swap
+# Processes still on the old model keep their index and log an error until they are replaced.
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from pinecone import Pinecone, ServerlessSpec
+from src.config import (
+    PINECONE_API_KEY, PINECONE_INDEX_NAME, PINECONE_DIMENSION, EMBEDDING_MODEL, EMBEDDING_BACKEND, PINECONE_INDEX_ALIAS_DOC,
+    REINDEX_PAGE_SIZE, REINDEX_EMBED_BATCH, REINDEX_UPSERT_BATCH, REINDEX_WORKERS, REINDEX_CHECKPOINT,
+)
+from src.embeddings import load_embedder
+from src.logger import setup_logger
+from src.prompt_builder import split_passages
+
+logger = setup_logger("reindex")
+
+# Prescriptions were never indexed by the live write path, so that source is opt-in
+DEFAULT_SOURCES = ("vectors", "reports")
+ALL_SOURCES = ("vectors", "reports", "prescriptions")
+
+Item = Tuple[str, str, Dict]  # (vector id, text to embed, metadata)
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int, backend: str = EMBEDDING_BACKEND) -> None:
+    """Process-pool initializer: one model per worker, limited to its share of the cores"""
+    global _worker_model
+    _worker_model = load_embedder(model_name, backend, threads)
+
+
+def _embed_batch(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_model.encode(texts, batch_size=64, convert_to_numpy=True), dtype=np.float32)
+
+
+def _chunk(vector_id: str, text: str, metadata: Dict, chunk_tokens: int) -> List[Item]:
+    """Whole document (chunk_tokens=0, as the live write path does) or ~chunk_tokens passages"""
+    if not chunk_tokens:
+        return [(vector_id, text, {**metadata, 'full_text': text})]
+    return [(f"{vector_id}#{i}", passage, {**metadata, 'full_text': passage, 'parent_id': vector_id, 'chunk': i})
+            for i, passage in enumerate(split_passages(text, chunk_tokens))]
+
+
+def report_items(doc_id: str, data: Dict) -> List[Item]:
+    """AI call reports, embedded and keyed exactly like store_ai_report does"""
+    text = ((data.get('content') or {}).get('observations') or '').strip()
+    return [(doc_id, text, {'source': 'ai_call_report', 'type': 'ai_report'})] if text else []
+
+
+def prescription_items(doc_id: str, data: Dict) -> List[Item]:
+    text = "\n".join(f"{label}: {data[key]}" for key, label in
+                     (('medication', 'Medication'), ('dosage', 'Dosage'), ('instructions', 'Instructions')) if data.get(key))
+    return [(f"rx_{doc_id}", text, {'source': 'prescription', 'type': 'prescription', 'prescription_id': doc_id})] if text else []
+
+
+def vector_text(vector_id: str, metadata: Dict) -> Optional[str]:
+    """Text a stored vector was embedded from, recovered from its metadata (see the rag.store_* functions)"""
+    if metadata.get('full_text'):
+        return metadata['full_text']
+    for prefix, key in (('rep_', 'report_text'), ('ana_', 'analysis'), ('q_', 'query'), ('r_', 'response')):
+        if vector_id.startswith(prefix) and metadata.get(key):
+            return metadata[key]
+    return None
+
+
+def firestore_pages(db, collection: str, cursor: Optional[str], page_size: int) -> Iterator[Tuple[List, str]]:
+    """(documents, last document id) pages in document-id order, starting after cursor"""
+    from firebase_admin import firestore
+    while True:
+        query = db.collection(collection).order_by(firestore.FieldPath.document_id()).limit(page_size)
+        if cursor:
+            query = query.start_after({firestore.FieldPath.document_id(): cursor})
+        docs = list(query.stream())
+        if not docs:
+            return
+        cursor = docs[-1].id
+        yield [(doc.id, doc.to_dict() or {}) for doc in docs], cursor
+        if len(docs) < page_size:
+            return
+
+
+def vector_pages(source_index, token: Optional[str], page_size: int) -> Iterator[Tuple[List, Optional[str]]]:
+    """(vectors with metadata, pagination token) pages of an existing index; token None means last page"""
+    while True:
+        response = source_index.list_paginated(limit=min(page_size, 100), pagination_token=token)
+        ids = [v.id for v in response.vectors]
+        if not ids:
+            return
+        token = response.pagination.next if response.pagination else None
+        fetched = source_index.fetch(ids=ids)
+        vectors = fetched['vectors'] if isinstance(fetched, dict) else fetched.vectors
+        items = []
+        for vid in ids:
+            if vid in vectors:
+                entry = vectors[vid]
+                items.append((vid, dict((entry['metadata'] if isinstance(entry, dict) else entry.metadata) or {})))
+        yield items, token
+        if token is None:
+            return
+
+
+class Checkpoint:
+    """Progress of one build, written atomically after every page"""
+
+    def __init__(self, path: str, target: str, model: str, chunk_tokens: int, sources: List[str]):
+        self.path = path
+        self.state = {'target': target, 'model': model, 'chunk_tokens': chunk_tokens,
+                      'sources': {name: {'cursor': None, 'done': False, 'docs': 0} for name in sources},
+                      'docs': 0, 'vectors': 0, 'skipped': 0, 'elapsed_s': 0.0}
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if (saved['target'], saved['model'], saved['chunk_tokens']) != (target, model, chunk_tokens):
+                raise SystemExit(f"Checkpoint {path} belongs to a different build ({saved['target']}, {saved['model']}, "
+                                 f"chunk_tokens={saved['chunk_tokens']}); pass --fresh to discard it")
+            for name in sources:
+                saved['sources'].setdefault(name, {'cursor': None, 'done': False, 'docs': 0})
+            self.state = saved
+            logger.info("Resuming %s from checkpoint: %d docs, %d vectors done", target, saved['docs'], saved['vectors'])
+
+    def save(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def _ensure_index(pc, name: str, dimension: int):
+    if name not in [index.name for index in pc.list_indexes()]:
+        pc.create_index(name=name, dimension=dimension, metric='cosine', spec=ServerlessSpec(cloud='aws', region='us-east-1'))
+        logger.info("Created shadow index: %s", name)
+    return pc.Index(name)
+
+
+def _upsert(index, batch: List[Tuple[str, List[float], Dict]], attempts: int = 3) -> None:
+    for attempt in range(attempts):
+        try:
+            index.upsert(vectors=batch)
+            return
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            logger.warning("Upsert of %d vectors failed (%s); retrying", len(batch), e)
+            time.sleep(2 ** attempt)
+
+
+def _stats_count(stats) -> int:
+    return stats['total_vector_count'] if isinstance(stats, dict) else stats.total_vector_count
+
+
+def current_alias(db) -> Dict:
+    snapshot = db.document(PINECONE_INDEX_ALIAS_DOC).get()
+    return (snapshot.to_dict() or {}) if snapshot.exists else {}
+
+
+def mark_building(db, target: Optional[str]) -> None:
+    """Record the shadow index on the alias so serving processes dual-write new vectors into it"""
+    if PINECONE_INDEX_ALIAS_DOC:
+        db.document(PINECONE_INDEX_ALIAS_DOC).set({'building_index': target}, merge=True)
+
+
+def swap_alias(db, pc, target: str, min_vectors: int = 0, model: Optional[str] = EMBEDDING_MODEL,
+               dimension: Optional[int] = PINECONE_DIMENSION, chunk_tokens: Optional[int] = 0) -> None:
+    """Point the serving alias at target in one document write; readers whose EMBEDDING_MODEL matches the
+    recorded model pick it up on their next refresh"""
+    from firebase_admin import firestore
+    count = _stats_count(pc.Index(target).describe_index_stats())
+    if count < min_vectors:
+        raise SystemExit(f"Refusing to swap: {target} holds {count} vectors, expected at least {min_vectors}")
+    current = current_alias(db)
+    previous = current.get('active_index') or PINECONE_INDEX_NAME
+    db.document(PINECONE_INDEX_ALIAS_DOC).set({
+        'active_index': target, 'model': model, 'dimension': dimension, 'chunk_tokens': chunk_tokens,
+        'previous_index': previous, 'previous_model': current.get('model'),
+        'previous_dimension': current.get('dimension'), 'previous_chunk_tokens': current.get('chunk_tokens'),
+        'building_index': None, 'vector_count': count, 'swapped_at': firestore.SERVER_TIMESTAMP,
+    })
+    logger.info("Alias %s now points at %s (%s, %d vectors); previous: %s", PINECONE_INDEX_ALIAS_DOC, target, model,
+                count, previous)
+
+
+def build(db, pc, target: str, sources: List[str], checkpoint: Checkpoint, source_index_name: str, model: str,
+          workers: int, page_size: int, embed_batch: int, upsert_batch: int, chunk_tokens: int, dimension: int,
+          backend: str = EMBEDDING_BACKEND) -> Dict:
+    """Stream every source into target; returns the checkpoint state (totals and timings)"""
+    index = _ensure_index(pc, target, dimension)
+    state = checkpoint.state
+    threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+    if workers:
+        embed_pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model, threads, backend))
+        embed = lambda batches: list(embed_pool.map(_embed_batch, batches))
+    else:
+        _init_worker(model, os.cpu_count() or 1, backend)
+        embed_pool = None
+        embed = lambda batches: [_embed_batch(b) for b in batches]
+    upsert_pool = ThreadPoolExecutor(max_workers=4)
+    fetch_pool = ThreadPoolExecutor(max_workers=1)  # reads the next page while the current one embeds
+    started, docs_at_start, elapsed_before = time.monotonic(), state['docs'], state['elapsed_s']
+    pending = None
+
+    def finish(page) -> None:
+        futures, name, cursor, n_docs, n_vectors, n_skipped, last = page
+        for future in futures:
+            future.result()
+        entry = state['sources'][name]
+        entry['cursor'], entry['docs'], entry['done'] = cursor, entry['docs'] + n_docs, last
+        state['docs'] += n_docs
+        state['vectors'] += n_vectors
+        state['skipped'] += n_skipped
+        state['elapsed_s'] = elapsed_before + time.monotonic() - started
+        checkpoint.save()
+        rate = (state['docs'] - docs_at_start) / max(time.monotonic() - started, 1e-9)
+        logger.info("%s: %d docs, %d vectors upserted (%.1f docs/s)", name, state['docs'], state['vectors'], rate,
+                    extra={'sample': False})
+
+    try:
+        for name in sources:
+            entry = state['sources'][name]
+            if entry['done']:
+                continue
+            if name == 'vectors':
+                source_index = pc.Index(source_index_name)
+                pages = vector_pages(source_index, entry['cursor'], page_size)
+            else:
+                pages = firestore_pages(db, name, entry['cursor'], page_size)
+            to_items = {'reports': report_items, 'prescriptions': prescription_items}.get(name)
+            next_page = fetch_pool.submit(next, pages, None)
+            while True:
+                page = next_page.result()
+                if page is None:
+                    if pending:
+                        finish(pending)
+                        pending = None
+                    entry['done'] = True
+                    checkpoint.save()
+                    break
+                next_page = fetch_pool.submit(next, pages, None)
+                docs, cursor = page
+                items, skipped = [], 0
+                for doc_id, data in docs:
+                    if name == 'vectors':
+                        text = vector_text(doc_id, data)
+                        raw = [(doc_id, text, {k: v for k, v in data.items() if k != 'full_text'})] if text else []
+                    else:
+                        raw = to_items(doc_id, data)
+                    skipped += not raw
+                    for vector_id, text, metadata in raw:
+                        items.extend(_chunk(vector_id, text, metadata, chunk_tokens))
+                texts = [text for _, text, _ in items]
+                vectors = np.concatenate(embed([texts[i:i + embed_batch] for i in range(0, len(texts), embed_batch)])) \
+                    if texts else np.zeros((0, dimension), np.float32)
+                records = [(vid, vec.tolist(), meta) for (vid, _, meta), vec in zip(items, vectors)]
+                futures = [upsert_pool.submit(_upsert, index, records[i:i + upsert_batch])
+                           for i in range(0, len(records), upsert_batch)]
+                # Checkpoint the previous page once its upserts land, while this page's are in flight
+                if pending:
+                    finish(pending)
+                is_last = name == 'vectors' and cursor is None
+                pending = (futures, name, cursor, len(docs), len(records), skipped, is_last)
+        if pending:
+            finish(pending)
+    finally:
+        fetch_pool.shutdown(wait=False)
+        upsert_pool.shutdown(wait=True)
+        if embed_pool:
+            embed_pool.shutdown()
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the vector index from Firestore and existing vector metadata")
+    parser.add_argument("--target", help="Shadow index to build (default: <PINECONE_INDEX_NAME>-<model>)")
+    parser.add_argument("--sources", default=",".join(DEFAULT_SOURCES), help=f"Comma-separated subset of {ALL_SOURCES}")
+    parser.add_argument("--source-index", help="Index whose vectors are re-embedded (default: the one the alias serves)")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, help="Embedding backend (see src.embeddings)")
+    parser.add_argument("--dimension", type=int, default=PINECONE_DIMENSION)
+    parser.add_argument("--chunk-tokens", type=int, default=0, help="Split documents into ~N-token passages (0 = whole)")
+    parser.add_argument("--workers", type=int, default=REINDEX_WORKERS, help="Embedding processes (0 = in-process)")
+    parser.add_argument("--page-size", type=int, default=REINDEX_PAGE_SIZE)
+    parser.add_argument("--embed-batch", type=int, default=REINDEX_EMBED_BATCH)
+    parser.add_argument("--upsert-batch", type=int, default=REINDEX_UPSERT_BATCH)
+    parser.add_argument("--checkpoint", default=REINDEX_CHECKPOINT)
+    parser.add_argument("--fresh", action="store_true", help="Discard an existing checkpoint and start over")
+    parser.add_argument("--swap", action="store_true", help="Point the alias at the target once the build completes")
+    parser.add_argument("--rollback", action="store_true", help="Point the alias back at its previous index and exit")
+    parser.add_argument("--allow-model-mismatch", action="store_true",
+                        help="Swap to an index built with a model other than EMBEDDING_MODEL (serving processes "
+                             "still refuse it until they run that model)")
+    args = parser.parse_args()
+
+    sources = [s.strip() for s in args.sources.split(",") if s.strip()]
+    unknown = set(sources) - set(ALL_SOURCES)
+    if unknown:
+        parser.error(f"unknown sources: {sorted(unknown)}")
+    if (args.swap or args.rollback) and not PINECONE_INDEX_ALIAS_DOC:
+        parser.error("--swap/--rollback need PINECONE_INDEX_ALIAS_DOC to be configured")
+    if args.swap and args.model != EMBEDDING_MODEL and not args.allow_model_mismatch:
+        parser.error(f"--swap to an index built with {args.model} while EMBEDDING_MODEL is {EMBEDDING_MODEL}: serving "
+                     f"processes would refuse it. Build without --swap, roll out EMBEDDING_MODEL={args.model}, then "
+                     f"swap from that environment (or pass --allow-model-mismatch)")
+
+    from src.firebase_service import db
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    serving = (current_alias(db).get('active_index') if PINECONE_INDEX_ALIAS_DOC else None) or PINECONE_INDEX_NAME
+
+    if args.rollback:
+        alias = current_alias(db)
+        previous, model = alias.get('previous_index'), alias.get('previous_model')
+        if not previous:
+            raise SystemExit("No previous index recorded on the alias")
+        if model and model != EMBEDDING_MODEL and not args.allow_model_mismatch:
+            raise SystemExit(f"{previous} was built with {model} while EMBEDDING_MODEL is {EMBEDDING_MODEL}: roll back "
+                             f"EMBEDDING_MODEL first (or pass --allow-model-mismatch)")
+        swap_alias(db, pc, previous, model=model, dimension=alias.get('previous_dimension'),
+                   chunk_tokens=alias.get('previous_chunk_tokens'))
+        return
+
+    target = args.target or f"{PINECONE_INDEX_NAME}-{args.model.split('/')[-1].lower()}"
+    if target == serving:
+        parser.error(f"{target} is the index currently being served; build into a new shadow index")
+    if args.fresh and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = Checkpoint(args.checkpoint, target, args.model, args.chunk_tokens, sources)
+    if args.model == EMBEDDING_MODEL and not args.chunk_tokens:
+        # Live writes are embedded with the serving model, so they only belong in a same-model shadow
+        mark_building(db, target)
+
+    state = build(db, pc, target, sources, checkpoint, args.source_index or serving, args.model, args.workers,
+                  args.page_size, args.embed_batch, args.upsert_batch, args.chunk_tokens, args.dimension,
+                  args.backend)
+    rate = state['docs'] / state['elapsed_s'] if state['elapsed_s'] else 0.0
+    print(f"Built {target}: {state['docs']} docs -> {state['vectors']} vectors ({state['skipped']} without text) "
+          f"in {state['elapsed_s']:.1f}s, {rate:.1f} docs/s")
+    if args.swap:
+        # Vector counts in index stats lag behind upserts, so only an empty build is refused
+        swap_alias(db, pc, target, min_vectors=1 if state['vectors'] else 0, model=args.model,
+                   dimension=args.dimension, chunk_tokens=args.chunk_tokens)
+        os.remove(args.checkpoint)  # the build is live; a rerun should start a new one
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,73 @@
 # Handles medical report analysis from PDFs/images and AI post-processing
-# Updated: Integrated with AI report generation from call transcripts
+# Updated: Report text, transcript and prescription are fitted to token budgets before prompting
+# Updated: Lab values are parsed locally (src.lab_parser); the LLM gets the summary plus abnormal rows
 
 import pdfplumber
 import pytesseract
 from PIL import Image
 import io
-import json
 from datetime import datetime
 from src.logger import setup_logger
 from src.chatbot_service import chatbot
 from src.rag import embed_text, upsert_to_pinecone, store_ai_report
+from src.config import PROMPT_REPORT_TOKENS, PROMPT_TRANSCRIPT_TOKENS, OCR_PREPROCESS_ENABLED, OCR_TESSERACT_CONFIG
+from src.ocr_preprocess import ocr_image
+from src.prompt_builder import PromptBuilder, compress_documents, compress_transcript, format_prescription
+from src.lab_parser import parse_lab_results, summarize, abnormal, to_records
 from typing import Optional, Dict, Any
+import pandas as pd
 
 logger = setup_logger("report_analyzer")
 
-def analyze_report(file_content):
-    """Analyze uploaded report (PDF/image)"""
+def analyze_report(file_content) -> Dict[str, Any]:
+    """Analyze uploaded report (PDF/image); returns the AI analysis and the parsed lab results table"""
     try:
         # Extract text from file
         text = extract_text_from_file(file_content)
-        logger.info(f"Extracted text length: {len(text)} characters")
+        logger.info("Extracted text length: %s characters", len(text))
         
         if not text.strip():
-            return "Unable to extract readable text from the report. Please ensure the file is a clear PDF or image."
+            return {"analysis": "Unable to extract readable text from the report. Please ensure the file is a clear PDF or image.",
+                    "lab_results": [], "abnormal_count": 0}
+        
+        # Pull out test/value/range rows locally so the prompt carries only the summary and abnormal rows
+        lab_results, remaining_text = parse_lab_results(text)
         
         # Generate comprehensive analysis
-        analysis = perform_comprehensive_analysis(text)
+        analysis = perform_comprehensive_analysis(remaining_text, lab_results=lab_results)
         
         # Store in Pinecone
         store_report_in_pinecone(text, analysis)
         
-        return analysis
+        return {"analysis": analysis, "lab_results": to_records(lab_results), "abnormal_count": len(abnormal(lab_results))}
         
     except Exception as e:
-        logger.error(f"Error analyzing report: {e}")
-        return f"Error analyzing report: {e}. Please consult a healthcare professional."
+        logger.error("Error analyzing report: %s", e)
+        return {"analysis": f"Error analyzing report: {e}. Please consult a healthcare professional.",
+                "lab_results": [], "abnormal_count": 0}
+
+def perform_comprehensive_analysis(text, transcript: Optional[str] = None, prescription: Optional[Dict] = None,
+                                   lab_results: Optional[pd.DataFrame] = None):
+    """Perform detailed analysis of medical report or call transcript.
 
-def perform_comprehensive_analysis(text, transcript: Optional[str] = None, prescription: Optional[Dict] = None):
-    """Perform detailed analysis of medical report or call transcript"""
+    With lab_results (from parse_lab_results), text is the rest of the report with the result lines removed.
+    """
     
-    comprehensive_prompt = f"""
+    builder = PromptBuilder("comprehensive_analysis")
+    builder.add("preamble", """
     You are a senior medical doctor and pathologist with 20+ years of experience. Analyze this medical report with extreme attention to detail. Provide a comprehensive analysis that covers everything a patient would want to know.
 
     MEDICAL REPORT TEXT:
-    {text}
+    """)
+    report_header = ""
+    if lab_results is not None and not lab_results.empty:
+        builder.add("lab_results", summarize(lab_results) + "\n")
+        builder.add("lab_note", "\n(Values within range are listed by name only: give the per-test breakdown for the "
+                                "abnormal results and summarise the normal ones briefly.)\n")
+        report_header = "\nOTHER REPORT TEXT:\n"
+    # Repeated page headers/footers are dropped; oversized reports keep their most value-dense passages
+    builder.add("report", report_header + compress_documents([text], PROMPT_REPORT_TOKENS))
+    builder.add("instructions", """
 
     Please provide a DETAILED analysis in the following structured format:
 
@@ -137,19 +161,20 @@ def perform_comprehensive_analysis(text, transcript: Optional[str] = None, presc
     - Seek immediate medical attention if you have concerning symptoms
 
     REMEMBER: Be thorough, compassionate, and provide hope where appropriate while being honest about concerns. Think like a caring doctor explaining to their own family member.
-    """
+    """)
     
     if transcript:
-        comprehensive_prompt += f"\n\nIncorporate this call transcript: {transcript}"
+        builder.add("transcript", f"\n\nIncorporate this call transcript: {compress_transcript(transcript, PROMPT_TRANSCRIPT_TOKENS)}")
     if prescription:
-        comprehensive_prompt += f"\n\nInclude this prescription: {json.dumps(prescription)}"
+        builder.add("prescription", f"\n\nInclude this prescription:\n{format_prescription(prescription)}")
+    comprehensive_prompt = builder.build()
     
     try:
-        response = chatbot.model.generate_content(comprehensive_prompt)
+        analysis = chatbot.generate(comprehensive_prompt, task='report')
         logger.info("Successfully generated comprehensive report analysis")
-        return response.text
+        return analysis
     except Exception as e:
-        logger.error(f"Error generating comprehensive analysis: {e}")
+        logger.error("Error generating comprehensive analysis: %s", e)
         return f"Error analyzing report: {e}"
 
 def store_report_in_pinecone(report_text, analysis):
@@ -187,10 +212,10 @@ def store_report_in_pinecone(report_text, analysis):
         metadata_list = [report_metadata, analysis_metadata]
         
         upsert_to_pinecone(vectors, ids, metadata_list)
-        logger.info(f"Successfully stored report and analysis in Pinecone with IDs: {report_id}, {analysis_id}")
+        logger.info("Successfully stored report and analysis in Pinecone with IDs: %s, %s", report_id, analysis_id)
         
     except Exception as e:
-        logger.error(f"Error storing report in Pinecone: {e}")
+        logger.error("Error storing report in Pinecone: %s", e)
 
 def extract_text_from_file(file_content):
     """Extract text from PDF or image file"""
@@ -208,25 +233,27 @@ def extract_text_from_file(file_content):
                             text += page_text + "\n"
                             
             if text.strip():
-                logger.info(f"Successfully extracted text from PDF: {len(text)} characters")
+                logger.info("Successfully extracted text from PDF: %s characters", len(text))
                 return text.strip()
                 
         except Exception as pdf_error:
-            logger.warning(f"PDF extraction failed: {pdf_error}")
+            logger.warning("PDF extraction failed: %s", pdf_error)
         
         # Try OCR if PDF fails
         try:
             image = Image.open(io.BytesIO(file_content))
-            image = image.convert('RGB')
-            text = pytesseract.image_to_string(image, config='--psm 6')
-            logger.info(f"Successfully extracted text using OCR: {len(text)} characters")
+            if OCR_PREPROCESS_ENABLED:
+                text = ocr_image(image)
+            else:
+                text = pytesseract.image_to_string(image.convert('RGB'), config=OCR_TESSERACT_CONFIG)
+            logger.info("Successfully extracted text using OCR: %s characters", len(text))
             return text.strip()
             
         except Exception as ocr_error:
-            logger.error(f"OCR extraction failed: {ocr_error}")
+            logger.error("OCR extraction failed: %s", ocr_error)
         
         return ""
         
     except Exception as e:
-        logger.error(f"Error extracting text: {e}")
+        logger.error("Error extracting text: %s", e)
         return ""
\ No newline at end of file
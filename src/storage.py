@@ -0,0 +1,335 @@
+# Object storage behind one interface: Cloudinary in production, the local filesystem offline
+# Every backend uploads through the same pipeline:
+#   1. the file's sha256 is looked up in the dedup index; identical content returns the stored URL unsent,
+#   2. files up to STORAGE_CHUNK_THRESHOLD_MB go up in one request, larger ones in STORAGE_PART_SIZE_MB parts
+#      sent concurrently (the final part last, since it completes the upload),
+#   3. a manifest under STORAGE_STATE_DIR records finished parts, so retrying the same file resumes,
+#   4. every request has a timeout and is retried with exponential backoff.
+# Concurrent uploads of the same content share one transfer (single-flight); put_async() runs off the event loop.
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from src.config import (
+    STORAGE_BACKEND, STORAGE_LOCAL_ROOT, STORAGE_STATE_DIR, STORAGE_CHUNK_THRESHOLD_MB, STORAGE_PART_SIZE_MB,
+    STORAGE_PART_WORKERS, STORAGE_TIMEOUT_S, STORAGE_MAX_RETRIES, STORAGE_DEDUP_ENABLED,
+)
+from src.logger import setup_logger
+from src.singleflight import get_group
+
+logger = setup_logger("storage")
+
+_MB = 1024 * 1024
+
+
+class StorageError(Exception):
+    """Raised when an upload still fails after its retries"""
+
+
+def file_sha256(path: str, block_size: int = _MB) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json(path: str, data: Dict) -> None:
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class LocalDedupIndex:
+    """sha256 -> stored object, kept in a JSON file (one process; use FirestoreDedupIndex across workers)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._entries = json.load(f)
+
+    def get(self, digest: str) -> Optional[Dict]:
+        return self._entries.get(digest)
+
+    def put(self, digest: str, record: Dict) -> None:
+        with self._lock:
+            self._entries[digest] = record
+            _write_json(self.path, self._entries)
+
+
+class FirestoreDedupIndex:
+    """sha256 -> stored object, one document per digest, shared by every worker"""
+
+    def __init__(self, db, collection: str = 'storage_objects'):
+        self.collection = db.collection(collection)
+
+    def get(self, digest: str) -> Optional[Dict]:
+        snapshot = self.collection.document(digest).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def put(self, digest: str, record: Dict) -> None:
+        self.collection.document(digest).set(record)
+
+
+class UploadManifest:
+    """Parts already uploaded for one (content, destination), saved after each part"""
+
+    def __init__(self, path: str, size: int, part_size: int):
+        self.path = path
+        self._lock = threading.Lock()
+        self.resumed = False
+        self.state = {'upload_id': None, 'size': size, 'part_size': part_size, 'done': []}
+        if os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if (saved['size'], saved['part_size']) == (size, part_size):
+                self.state, self.resumed = saved, True
+
+    def start(self, upload_id: str) -> None:
+        self.state['upload_id'] = upload_id
+        self.save()
+
+    def mark_done(self, part: int) -> None:
+        with self._lock:
+            self.state['done'].append(part)
+            self.save()
+
+    def save(self) -> None:
+        _write_json(self.path, self.state)
+
+    def discard(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class StorageBackend:
+    """Upload pipeline shared by all backends; subclasses implement the four transfer hooks"""
+
+    name = "base"
+
+    def __init__(self, dedup_index=None, state_dir: str = STORAGE_STATE_DIR,
+                 chunk_threshold: int = int(STORAGE_CHUNK_THRESHOLD_MB * _MB), part_size: int = int(STORAGE_PART_SIZE_MB * _MB),
+                 workers: int = STORAGE_PART_WORKERS, timeout: float = STORAGE_TIMEOUT_S, retries: int = STORAGE_MAX_RETRIES):
+        self.dedup_index = dedup_index
+        self.state_dir = state_dir
+        self.chunk_threshold = chunk_threshold
+        self.part_size = part_size
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        os.makedirs(state_dir, exist_ok=True)
+
+    # -- transfer hooks
+    def _put_whole(self, file_path: str, destination: str) -> Dict:
+        """Single-request upload; returns {'url', 'key'}"""
+        raise NotImplementedError
+
+    def _begin(self, file_path: str, destination: str, size: int) -> str:
+        """Start a multi-part upload; returns its upload id"""
+        raise NotImplementedError
+
+    def _put_part(self, upload_id: str, file_path: str, destination: str, offset: int, data: bytes, size: int) -> Optional[Dict]:
+        """Upload one byte range; the call for the final part returns {'url', 'key'}"""
+        raise NotImplementedError
+
+    def _complete(self, upload_id: str, file_path: str, destination: str, final: Optional[Dict]) -> Dict:
+        return final
+
+    # -- pipeline
+    def put(self, file_path: str, destination: str) -> Dict:
+        """Upload file_path to destination; returns {'url', 'key', 'sha256', 'bytes', 'deduplicated'}"""
+        digest = file_sha256(file_path)
+        # Identical content shares one upload only when the dedup index lets every caller point at one object;
+        # without it each destination gets its own copy
+        key = (self.name, digest) if self.dedup_index is not None else (self.name, digest, destination)
+        ran = []
+
+        def upload() -> Dict:
+            ran.append(True)
+            return self._put_unique(file_path, destination, digest)
+
+        result = get_group("upload").do(key, upload)
+        return result if ran else {**result, 'deduplicated': True}  # another caller's upload was shared
+
+    async def put_async(self, file_path: str, destination: str) -> Dict:
+        return await asyncio.to_thread(self.put, file_path, destination)
+
+    def _put_unique(self, file_path: str, destination: str, digest: str) -> Dict:
+        if self.dedup_index is not None:
+            existing = self.dedup_index.get(digest)
+            if existing:
+                logger.info("Skipped upload of %s: identical content already stored at %s", destination, existing['url'])
+                return {**existing, 'deduplicated': True}
+
+        size = os.path.getsize(file_path)
+        start = time.perf_counter()
+        if size <= self.chunk_threshold:
+            stored = self._retry(f"upload of {destination}", self._put_whole, file_path, destination)
+        else:
+            stored = self._put_multipart(file_path, destination, digest, size)
+        elapsed = time.perf_counter() - start
+        logger.info("Uploaded %s (%.1f MB) in %.2fs: %s", destination, size / _MB, elapsed, stored['url'])
+
+        record = {'url': stored['url'], 'key': stored['key'], 'sha256': digest, 'bytes': size}
+        if self.dedup_index is not None:
+            try:
+                self.dedup_index.put(digest, record)
+            except Exception as e:
+                logger.error("Failed to record %s in the dedup index: %s", digest, e)
+        return {**record, 'deduplicated': False}
+
+    def _put_multipart(self, file_path: str, destination: str, digest: str, size: int) -> Dict:
+        manifest_key = hashlib.sha256(f"{self.name}:{digest}:{destination}".encode()).hexdigest()[:32]
+        manifest = UploadManifest(os.path.join(self.state_dir, f"{manifest_key}.json"), size, self.part_size)
+        try:
+            return self._send_parts(manifest, file_path, destination, size)
+        except StorageError:
+            if not manifest.resumed:
+                raise
+            # The server may have expired the earlier partial upload; start this one over once
+            logger.warning("Resumed upload of %s failed; restarting it from the first part", destination)
+            manifest.discard()
+            manifest = UploadManifest(manifest.path, size, self.part_size)
+            return self._send_parts(manifest, file_path, destination, size)
+
+    def _send_parts(self, manifest: UploadManifest, file_path: str, destination: str, size: int) -> Dict:
+        if manifest.resumed:
+            logger.info("Resuming upload of %s: %d parts already sent", destination, len(manifest.state['done']))
+        else:
+            manifest.start(self._retry(f"start of {destination}", self._begin, file_path, destination, size))
+        upload_id = manifest.state['upload_id']
+        offsets = list(range(0, size, self.part_size))
+        done = set(manifest.state['done'])
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            def send(part: int) -> Optional[Dict]:
+                offset = offsets[part]
+                data = os.pread(fd, min(self.part_size, size - offset), offset)
+                result = self._retry(f"part {part + 1}/{len(offsets)} of {destination}", self._put_part,
+                                     upload_id, file_path, destination, offset, data, size)
+                manifest.mark_done(part)
+                return result
+
+            pending = [part for part in range(len(offsets) - 1) if part not in done]
+            if pending:
+                with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+                    list(pool.map(send, pending))
+            final = send(len(offsets) - 1)
+        finally:
+            os.close(fd)
+        stored = self._retry(f"completion of {destination}", self._complete, upload_id, file_path, destination, final)
+        manifest.discard()
+        return stored
+
+    def _retry(self, what: str, fn, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return fn(*args)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise StorageError(f"{what} failed after {attempt + 1} attempts: {e}") from e
+                delay = min(0.5 * 2 ** attempt, 8.0)
+                logger.warning("%s failed (%s); retry %d/%d in %.1fs", what, e, attempt + 1, self.retries, delay)
+                time.sleep(delay)
+
+
+class CloudinaryStorage(StorageBackend):
+    """Cloudinary upload API; large files use its chunked protocol (X-Unique-Upload-Id + Content-Range)"""
+
+    name = "cloudinary"
+
+    def _put_whole(self, file_path: str, destination: str) -> Dict:
+        import cloudinary.uploader
+        response = cloudinary.uploader.upload(file_path, folder=destination, resource_type="auto", timeout=self.timeout)
+        return {'url': response['secure_url'], 'key': response['public_id']}
+
+    def _begin(self, file_path: str, destination: str, size: int) -> str:
+        return uuid.uuid4().hex  # Cloudinary needs no start call; the id groups the parts
+
+    def _put_part(self, upload_id: str, file_path: str, destination: str, offset: int, data: bytes, size: int) -> Optional[Dict]:
+        import cloudinary.uploader
+        headers = {"Content-Range": f"bytes {offset}-{offset + len(data) - 1}/{size}", "X-Unique-Upload-Id": upload_id}
+        response = cloudinary.uploader.upload_large_part((os.path.basename(file_path), data), http_headers=headers,
+                                                         folder=destination, resource_type="auto", timeout=self.timeout)
+        if offset + len(data) == size:
+            return {'url': response['secure_url'], 'key': response['public_id']}
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """Files under STORAGE_LOCAL_ROOT, addressed by file:// URLs; for development and offline tests"""
+
+    name = "local"
+
+    def __init__(self, root: str = STORAGE_LOCAL_ROOT, **kwargs):
+        super().__init__(**kwargs)
+        self.root = os.path.abspath(root)
+
+    def _target(self, file_path: str, destination: str) -> str:
+        path = os.path.join(self.root, destination.strip('/'), os.path.basename(file_path))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def _stored(self, path: str) -> Dict:
+        return {'url': f"file://{path}", 'key': os.path.relpath(path, self.root)}
+
+    def _put_whole(self, file_path: str, destination: str) -> Dict:
+        target = self._target(file_path, destination)
+        tmp = f"{target}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(file_path, tmp)
+        os.replace(tmp, target)
+        return self._stored(target)
+
+    def _begin(self, file_path: str, destination: str, size: int) -> str:
+        upload_id = uuid.uuid4().hex
+        with open(f"{self._target(file_path, destination)}.{upload_id}.part", 'wb') as f:
+            f.truncate(size)
+        return upload_id
+
+    def _put_part(self, upload_id: str, file_path: str, destination: str, offset: int, data: bytes, size: int) -> Optional[Dict]:
+        fd = os.open(f"{self._target(file_path, destination)}.{upload_id}.part", os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, offset)
+        finally:
+            os.close(fd)
+        return None
+
+    def _complete(self, upload_id: str, file_path: str, destination: str, final: Optional[Dict]) -> Dict:
+        target = self._target(file_path, destination)
+        os.replace(f"{target}.{upload_id}.part", target)
+        return self._stored(target)
+
+
+def read_object(url: str, timeout: float = STORAGE_TIMEOUT_S) -> bytes:
+    """Bytes of a stored object, from a file:// (local backend) or http(s) URL"""
+    if url.startswith("file://"):
+        with open(url[len("file://"):], 'rb') as f:
+            return f.read()
+    import requests
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+
+def create_storage(backend: str = STORAGE_BACKEND, dedup_index=None, **kwargs) -> StorageBackend:
+    """Backend named by STORAGE_BACKEND; without a dedup_index, a local JSON index is used if dedup is enabled"""
+    if dedup_index is None and STORAGE_DEDUP_ENABLED:
+        state_dir = kwargs.get('state_dir', STORAGE_STATE_DIR)
+        os.makedirs(state_dir, exist_ok=True)
+        dedup_index = LocalDedupIndex(os.path.join(state_dir, f"dedup-{backend}.json"))
+    if backend == "cloudinary":
+        return CloudinaryStorage(dedup_index=dedup_index, **kwargs)
+    if backend == "local":
+        return LocalStorage(dedup_index=dedup_index, **kwargs)
+    raise ValueError(f"Unknown storage backend {backend!r}; expected cloudinary or local")
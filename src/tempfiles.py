@@ -0,0 +1,45 @@
+# Scratch files (uploads being relayed to storage, report JSON) under TEMP_DIR
+# Each one is removed when the block that made it exits, error or not; sweep_stale() clears what a killed
+# worker left behind.
+
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from src.config import TEMP_DIR, TEMP_MAX_AGE_S
+from src.logger import setup_logger
+
+logger = setup_logger("tempfiles")
+
+
+@contextmanager
+def temporary_path(suffix: str = "") -> Iterator[str]:
+    """A fresh, uniquely named file path that is deleted on exit"""
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=TEMP_DIR)
+    os.close(fd)
+    try:
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def sweep_stale(max_age_s: float = TEMP_MAX_AGE_S) -> int:
+    """Delete scratch files older than max_age_s; returns how many were removed"""
+    if not os.path.isdir(TEMP_DIR):
+        return 0
+    cutoff, removed = time.time() - max_age_s, 0
+    for entry in os.scandir(TEMP_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    if removed:
+        logger.info("Removed %s stale scratch files from %s", removed, TEMP_DIR)
+    return removed
@@ -0,0 +1,190 @@
+# Local, zero-network emergency pre-filter run before any LLM call
+# Two stages: compiled keyword/regex rules (microseconds), then a nearest-example classifier on the
+# MiniLM embeddings the RAG module already loads (a few ms on CPU). A rule only fires on acute, present-tense
+# wording next to the symptom ("my son is having a seizure", "can't breathe", "I have chest pain"); questions
+# about emergencies, past episodes, side effects and worries fall through to the LLM's own urgency classification.
+
+import re
+import threading
+from typing import Optional
+import numpy as np
+from src.config import TRIAGE_EMBEDDING_ENABLED, TRIAGE_EMBEDDING_THRESHOLD, TRIAGE_EMBEDDING_MARGIN
+from src.logger import setup_logger
+from src.rag import embedder  # the MiniLM instance RAG already holds
+
+logger = setup_logger("triage")
+
+# Symptom patterns that indicate an emergency when someone is experiencing them now
+_EMERGENCY_PATTERNS = {
+    "cardiac": r"\b(chest (pain|pressure|tightness)|crushing (pain|pressure)|heart attack|pain (spreading|radiating) (to|down) (my |the )?(left )?arm)\b",
+    "breathing": r"\b(can'?t|cannot|unable to|struggling to|hard to) breathe\b|\b(not breathing|stopped breathing|choking|turning blue|blue lips|gasping for air)\b",
+    "stroke": r"\b(face (is )?droop\w*|slurred speech|(one|left|right) side (of (my|his|her|the) (body|face) )?(is )?(numb|weak|paralyz\w+)|sudden(ly)? (can'?t|cannot) (speak|talk|see|move))\b",
+    "consciousness": r"\b(unconscious|unresponsive|passed out|fainted and|won'?t wake up|not waking up|collapsed)\b",
+    "seizure": r"\b(seizure|seizing|convuls\w+)\b",
+    "bleeding": r"\b(bleeding (heavily|a lot|badly|profusely)|won'?t stop bleeding|(can'?t|cannot) stop (the )?bleeding|vomiting blood|coughing (up )?blood)\b",
+    "self_harm": r"\b(kill (my|him|her)self|end (my|his|her) life|suicid\w+|want to die|took (too many|an overdose)|overdos\w+)\b",
+    "anaphylaxis": r"\b(anaphyla\w+|throat (is )?(closing|swelling)|tongue (is )?swelling|swollen throat)\b",
+    "poisoning": r"\b(swallowed (bleach|poison|pesticide|detergent|battery)|drank (bleach|poison|pesticide|kerosene)|poisoned)\b",
+}
+_EMERGENCY_RE = {name: re.compile(pattern, re.IGNORECASE) for name, pattern in _EMERGENCY_PATTERNS.items()}
+
+# The event just happened: also lifts the history veto ("had a seizure a minute ago")
+_RECENT = (r"\b(suddenly|all of a sudden|just now|right now|(a|one|two|a few|few|\d+) (minutes?|seconds?|moments?) ago|"
+           r"a moment ago)\b")
+_RECENT_RE = re.compile(_RECENT, re.IGNORECASE)
+# A named person (not "someone") in an ongoing state: "my son is seizing", "her throat is swelling"
+_PERSON = r"(i|we|he|she|they|(my|his|her|our|their) [\w']+( [\w']+)?)"
+# Someone is in the emergency right now: explicit timing, a named person's ongoing state, or something that cannot stop
+_ACUTE_RE = re.compile(
+    _RECENT + r"|\b(at the moment|currently|as we speak|this (minute|moment))\b"
+    r"|\b" + _PERSON + r"('m|'re|'s| am| is| are) (now |still |suddenly |really )?"
+    r"(having|drooping|slurr\w*|bleeding|choking|seizing|convulsing|shaking|collapsing|fainting|turning|gasping|"
+    r"vomiting|swelling|closing|unconscious|unresponsive|numb|weak|paralyz\w+|blue|limp)\b"
+    r"|\b(can'?t|cannot|unable to|struggling to|won'?t|isn'?t|is not|aren'?t|are not) (breathe|breathing|wake|waking|"
+    r"stop|stopping|respond\w*|speak|talk|move|see)\b",
+    re.IGNORECASE,
+)
+# "I have ..." / "he's got ..." immediately before the symptom: the speaker reports it as current
+_HAS_NOW_RE = re.compile(
+    r"\b(i|we|he|she|they|i've|ive|we've|he's|she's|they've|i'm|im|i am|he is|she is|my \w+|my \w+ is) "
+    r"(have|has|got|have got|has got|having|am having|am getting|been having)"
+    r"( (a|an|some|severe|sudden|bad|terrible|crushing|sharp|strong|really|very))* $",
+    re.IGNORECASE,
+)
+# The speaker reports it about themselves, now: enough to answer even a question ("I have chest pain, what ...?")
+_FIRST_PERSON_RE = re.compile(
+    r"\b(i|we) (have|have got|am having|are having|am getting|can'?t|cannot)\b"
+    r"|\b(i'm|im|we're|i've|ive|we've) (now |still |just )?(having|been having|got|getting)\b",
+    re.IGNORECASE,
+)
+# Past episodes (past tense alone is not enough: it needs a time marker), history, side effects and worries
+_HISTORY_RE = re.compile(
+    r"\b(used to|yesterday|last (night|week|month|year|time)|(days?|weeks?|months?|years?) ago|earlier (today|this \w+)|"
+    r"in the past|history of|diagnosed|previous\w*|fine now|better now|(is|it's|it is|has) (gone|over|passed)|"
+    r"went away|anymore|any more|no longer|side[- ]effects?|scared of|afraid of|worried about|fear of|what if|in case)\b",
+    re.IGNORECASE,
+)
+# Educational phrasing or a hypothetical person: asking *about* a condition rather than reporting one
+_INFORMATIONAL_RE = re.compile(
+    r"^\s*(what|which|how|why|when|is|are|can|could|does|do|should|would|if|is it true|explain|tell me about|define|"
+    r"list|help me understand)\b"
+    r"|\b(symptoms of|signs of|causes of|risk factors|prevent\w*|difference between|treatment for|"
+    r"someone|somebody|a person)\b",
+    re.IGNORECASE,
+)
+# Sentence and clause ends: the acute cue has to sit next to the symptom, not anywhere in the message
+_BOUNDARY_RE = re.compile(r"[.!?;\n]")
+_WINDOW = 60
+
+# Rules whose wording is itself a fresh event ("my son swallowed bleach", "my dad collapsed")
+_EVENT_RULES = ("consciousness", "self_harm", "poisoning")
+
+# Labelled examples for the embedding stage; non-emergencies include questions *about* emergencies
+_EMERGENCY_EXAMPLES = [
+    "I have crushing chest pain and my left arm is numb",
+    "my father collapsed and is not breathing",
+    "I can't breathe and my lips are turning blue",
+    "my wife's face is drooping and her speech is slurred",
+    "my child swallowed bleach",
+    "I took a whole bottle of pills",
+    "I don't want to live anymore and I have a plan",
+    "my throat is swelling shut after a bee sting",
+    "he is having a seizure and won't stop shaking",
+    "there is blood everywhere and it won't stop",
+    "my baby is limp and won't wake up",
+    "severe sudden headache worst of my life and I'm vomiting",
+]
+_NON_EMERGENCY_EXAMPLES = [
+    "what are the warning signs of a heart attack",
+    "how is a stroke diagnosed",
+    "what causes seizures in children",
+    "I have had a mild cough for three days",
+    "what does a high cholesterol value mean",
+    "my TSH level is 3.1, is that normal",
+    "how can I lower my blood pressure naturally",
+    "what are the side effects of paracetamol",
+    "I feel a bit tired after work",
+    "can you explain my blood test report",
+    "how much water should I drink daily",
+    "what is the treatment for dengue fever",
+]
+
+_lock = threading.Lock()
+_prototypes = None  # (emergency matrix, non-emergency matrix), normalized
+
+
+def _embed(texts) -> np.ndarray:
+    vectors = np.asarray(embedder.encode(list(texts)), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _load_prototypes():
+    global _prototypes
+    with _lock:
+        if _prototypes is None:
+            _prototypes = (_embed(_EMERGENCY_EXAMPLES), _embed(_NON_EMERGENCY_EXAMPLES))
+        return _prototypes
+
+
+def _window(text: str, match) -> tuple:
+    """(start, end) of the sentence around a symptom match, clipped to _WINDOW characters either side"""
+    start = max(match.start() - _WINDOW, 0)
+    for boundary in _BOUNDARY_RE.finditer(text, start, match.start()):
+        start = boundary.end()
+    boundary = _BOUNDARY_RE.search(text, match.end(), match.end() + _WINDOW)
+    return start, boundary.start() if boundary else min(match.end() + _WINDOW, len(text))
+
+
+def _rule_fires(name: str, text: str, match, history: bool, informational: bool) -> bool:
+    """The symptom is reported as happening now, not recalled, feared or asked about"""
+    start, end = _window(text, match)
+    window = text[start:end]
+    has_now = _HAS_NOW_RE.search(text[start:match.start()])
+    recent = _RECENT_RE.search(window)
+    if history and not (has_now or recent):
+        return False
+    if informational and not _FIRST_PERSON_RE.search(window):
+        return False
+    return bool(has_now or recent or _ACUTE_RE.search(window) or name in _EVENT_RULES)
+
+
+def match_keywords(text: str) -> Optional[str]:
+    """Name of the emergency rule the text matches, or None (including whenever the text is ambiguous)"""
+    history = bool(_HISTORY_RE.search(text))
+    informational = bool(_INFORMATIONAL_RE.search(text))
+    for name, pattern in _EMERGENCY_RE.items():
+        for match in pattern.finditer(text):
+            if _rule_fires(name, text, match, history, informational):
+                return name
+    return None
+
+
+def _ambiguous(text: str) -> bool:
+    """Past, history, side-effect or educational phrasing with nothing current about it: left to the LLM"""
+    return bool((_HISTORY_RE.search(text) and not _RECENT_RE.search(text))
+                or (_INFORMATIONAL_RE.search(text) and not _FIRST_PERSON_RE.search(text)))
+
+
+def embedding_score(text: str) -> tuple:
+    """(best emergency similarity, best non-emergency similarity) against the labelled examples"""
+    emergency, non_emergency = _load_prototypes()
+    query = _embed([text])[0]
+    return float((emergency @ query).max()), float((non_emergency @ query).max())
+
+
+def detect_emergency(text: str) -> Optional[str]:
+    """Return why the text looks like an emergency (e.g. 'keyword:cardiac'), or None"""
+    rule = match_keywords(text)
+    if rule:
+        return f"keyword:{rule}"
+    if not TRIAGE_EMBEDDING_ENABLED or _ambiguous(text):
+        return None
+    try:
+        best_emergency, best_other = embedding_score(text)
+    except Exception as e:
+        logger.error("Embedding triage failed: %s", e)
+        return None
+    if best_emergency >= TRIAGE_EMBEDDING_THRESHOLD and best_emergency - best_other >= TRIAGE_EMBEDDING_MARGIN:
+        return f"embedding:{best_emergency:.2f}"
+    return None
@@ -1,38 +1,57 @@
 # Handles video call post-processing: audio extraction, STT, AI report generation
 # Updated: Use Cloudinary URLs for video download (public access)
+# Updated: Recording fetched through src.storage, so local-backend file:// URLs work too
+# Updated: Whisper loaded per MODEL_DEPLOYMENT_MODE (lazily, in the preload master, or via the model server)
+# Updated: Audio decoded once, in memory, to Whisper's 16 kHz float32 input (src.audio); scratch files cleaned up
 
-import whisper
-from pydub import AudioSegment
-import requests
-import io
 import uuid
 import json
+import threading
+from typing import Optional
+from src.config import MODEL_DEPLOYMENT_MODE, WHISPER_MODEL
 from src.logger import setup_logger
+from firebase_admin import firestore
 from src.chatbot_service import chatbot
 from src.rag import store_ai_report
 from src.firebase_service import db, create_report, upload_to_storage, get_linked_prescription
 from src.report_analyzer import perform_comprehensive_analysis
+from src.audio import decode_audio
+from src.tempfiles import temporary_path
 
 logger = setup_logger("video_call")
 
-# Load Whisper tiny model for free-tier STT (CPU-friendly)
-model = whisper.load_model("tiny")
+_whisper_model = None
+_whisper_lock = threading.Lock()
 
-def process_recording(video_url: str, session_id: str):
-    """Post-process recording: Extract audio, transcribe, generate AI report, store."""
+def get_whisper_model():
+    """Whisper for STT: the model server's client in sidecar mode, else loaded here on first use"""
+    global _whisper_model
+    with _whisper_lock:
+        if _whisper_model is None:
+            if MODEL_DEPLOYMENT_MODE == "sidecar":
+                from src.model_server import WhisperClient
+                _whisper_model = WhisperClient()
+            else:
+                import whisper
+                _whisper_model = whisper.load_model(WHISPER_MODEL)
+                logger.info("Loaded Whisper model: %s", WHISPER_MODEL)
+    return _whisper_model
+
+if MODEL_DEPLOYMENT_MODE == "preload":
+    get_whisper_model()  # in the master, before workers fork, so they share the weights
+
+def process_recording(video_url: str, session_id: str, local_path: Optional[str] = None):
+    """Post-process recording: Extract audio, transcribe, generate AI report, store.
+
+    local_path: the uploaded file, if still on disk; otherwise the recording is streamed from video_url.
+    """
     try:
-        # Download video from Cloudinary URL
-        response = requests.get(video_url)
-        video_content = io.BytesIO(response.content)
-        
-        # Extract audio (assume MP4; export to WAV for Whisper)
-        audio = AudioSegment.from_file(video_content, format="mp4")
-        audio_path = f"/tmp/audio_{session_id}.wav"
-        audio.export(audio_path, format="wav")
+        # Decode the audio track straight to Whisper's input (16 kHz mono float32), no WAV in between
+        audio = decode_audio(local_path or video_url)
         
         # Transcribe audio (limited to 30s for free-tier)
-        transcript = model.transcribe(audio_path)["text"]
-        logger.info(f"Transcribed: {transcript[:100]}...")  # Truncate log
+        transcript = get_whisper_model().transcribe(audio)["text"]
+        logger.info("Transcribed: %.100s...", transcript)  # Truncated lazily by the formatter
         
         # Fetch linked prescription
         session_ref = db.collection('video_sessions').document(session_id)
@@ -68,14 +87,14 @@ def process_recording(video_url: str, session_id: str):
         store_ai_report(report_id, analysis, {'source': 'ai_call_report'})
         
         # Optional: Save as JSON to Cloudinary
-        json_path = f"/tmp/report_{report_id}.json"
-        with open(json_path, 'w') as f:
-            json.dump(data, f)
         destination = f"reports/{report_id}.json"
-        url = upload_to_storage(json_path, destination)
+        with temporary_path(".json") as json_path:
+            with open(json_path, 'w') as f:
+                json.dump(data, f, default=str)  # refs/timestamps are not JSON-native
+            url = upload_to_storage(json_path, destination)
         db.collection('reports').document(report_id).update({'file_url': url})
         
-        logger.info(f"AI report generated and stored: {report_id}")
+        logger.info("AI report generated and stored: %s", report_id)
         
     except Exception as e:
-        logger.error(f"Error processing recording: {e}")
\ No newline at end of file
+        logger.error("Error processing recording: %s", e)
\ No newline at end of file
@@ -0,0 +1,137 @@
+# Multiplexed request/response over one WebSocket (used by /ws/disease_info)
+# Client messages are JSON objects carrying a client-chosen id:
+#   {"id": "q1", "type": "query", "query": "..."}   ("type" defaults to "query")
+#   {"id": "q1", "type": "cancel"}                  acknowledged with {"id": "q1", "type": "cancelled"}
+# Replies echo the id: {"id", "type": "answer", ...result} or {"id", "type": "error", "error"}, in completion order.
+# Up to WS_MAX_INFLIGHT queries are answered at once; WS_MAX_PENDING caps in-flight plus waiting ones, beyond
+# that a query is refused as busy. Replies go through a WS_SEND_QUEUE_SIZE-bounded queue drained by one sender,
+# so a client that stops reading stalls its own queries instead of growing server memory.
+# A cancelled query stops at its next await; a stage already running in a worker thread finishes, unreported.
+# Anything that is not a JSON object is a legacy plain-text query: answered with the bare result, in arrival order.
+# Legacy queries count against the same WS_MAX_PENDING cap; a refused one gets a busy error string, in order.
+
+import asyncio
+import json
+from typing import Awaitable, Callable, Dict, Optional
+from fastapi import WebSocket, WebSocketDisconnect
+from src.config import WS_MAX_INFLIGHT, WS_MAX_PENDING, WS_SEND_QUEUE_SIZE
+from src.logger import setup_logger, log_context, request_id_var
+
+logger = setup_logger("ws_mux")
+
+_BUSY = "busy: too many queries in flight on this connection"
+
+
+class _Connection:
+    def __init__(self, websocket: WebSocket, answer: Callable[[str], Awaitable[Dict]], max_inflight: int,
+                 max_pending: int, send_queue_size: int):
+        self.websocket = websocket
+        self.answer = answer
+        self.slots = asyncio.Semaphore(max_inflight)
+        self.max_pending = max_pending
+        self.outbox: asyncio.Queue = asyncio.Queue(send_queue_size)
+        self.tasks: Dict[object, asyncio.Task] = {}  # client id (or a private key for legacy queries) -> task
+        self.legacy_tail: Optional[asyncio.Task] = None
+        self.legacy_tail_key: Optional[object] = None
+        self.legacy_busy: Dict[object, int] = {}  # legacy task key -> busy replies owed right after its own reply
+        self.connection_id = request_id_var.get()
+
+    async def run(self) -> None:
+        sender = asyncio.create_task(self._send_loop())
+        try:
+            while True:
+                await self._dispatch(await self.websocket.receive_text())
+        except WebSocketDisconnect:
+            logger.info("WebSocket client disconnected (%s queries abandoned)", len(self.tasks))
+        finally:
+            for task in list(self.tasks.values()):
+                task.cancel()
+            sender.cancel()
+
+    async def _dispatch(self, text: str) -> None:
+        try:
+            message = json.loads(text)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            if len(self.tasks) >= self.max_pending:
+                logger.warning("Legacy WebSocket query refused: %s queries pending", len(self.tasks))
+                if self.legacy_tail is not None and not self.legacy_tail.done():
+                    # Sent after the reply to the previous legacy query, so replies stay in arrival order
+                    self.legacy_busy[self.legacy_tail_key] = self.legacy_busy.get(self.legacy_tail_key, 0) + 1
+                else:
+                    await self.outbox.put(f"Error: {_BUSY}")
+                return
+            self.legacy_tail_key = object()
+            self.legacy_tail = self._start(self.legacy_tail_key, None, text, previous=self.legacy_tail)
+            return
+
+        query_id, kind = message.get('id'), message.get('type', 'query')
+        if not isinstance(query_id, (str, int)) or isinstance(query_id, bool):
+            await self._error(query_id, "message needs a string or integer id")
+        elif kind == 'cancel':
+            task = self.tasks.get(query_id)
+            if task is None:
+                await self._error(query_id, "no query in flight with this id")
+            else:
+                task.cancel()
+                await self.outbox.put({'id': query_id, 'type': 'cancelled'})
+        elif kind != 'query':
+            await self._error(query_id, f"unknown message type {kind!r}")
+        elif not isinstance(message.get('query'), str) or not message['query'].strip():
+            await self._error(query_id, "query must be a non-empty string")
+        elif query_id in self.tasks:
+            await self._error(query_id, "a query with this id is already in flight")
+        elif len(self.tasks) >= self.max_pending:
+            logger.warning("WebSocket query %s refused: %s queries pending", query_id, len(self.tasks))
+            await self._error(query_id, _BUSY)
+        else:
+            self._start(query_id, query_id, message['query'])
+
+    def _start(self, key: object, query_id, query: str, previous: Optional[asyncio.Task] = None) -> asyncio.Task:
+        task = asyncio.create_task(self._run_query(key, query_id, query, previous))
+        self.tasks[key] = task
+        return task
+
+    async def _run_query(self, key: object, query_id, query: str, previous: Optional[asyncio.Task]) -> None:
+        legacy = query_id is None
+        try:
+            with log_context(request_id=self.connection_id if legacy else f"{self.connection_id}:{query_id}"):
+                try:
+                    async with self.slots:
+                        result = await self.answer(query)
+                    reply = result if legacy else {'id': query_id, 'type': 'answer', **result}
+                except Exception as e:
+                    logger.error("WebSocket query failed: %s", e)
+                    reply = f"Error: {str(e)}" if legacy else {'id': query_id, 'type': 'error', 'error': str(e)}
+            if previous is not None:
+                await asyncio.wait({previous})  # legacy replies keep arrival order; a cancelled predecessor is fine
+            await self.outbox.put(reply)
+            while self.legacy_busy.get(key):  # re-read each time: more may be owed while this waits on the outbox
+                self.legacy_busy[key] -= 1
+                await self.outbox.put(f"Error: {_BUSY}")
+        finally:
+            self.legacy_busy.pop(key, None)
+            self.tasks.pop(key, None)
+
+    async def _error(self, query_id, error: str) -> None:
+        await self.outbox.put({'id': query_id, 'type': 'error', 'error': error})
+
+    async def _send_loop(self) -> None:
+        while True:
+            reply = await self.outbox.get()
+            try:
+                if isinstance(reply, str):
+                    await self.websocket.send_text(reply)
+                else:
+                    await self.websocket.send_json(reply)
+            except Exception as e:
+                logger.error("WebSocket send failed: %s", e)
+                return
+
+
+async def serve_multiplexed(websocket: WebSocket, answer: Callable[[str], Awaitable[Dict]],
+                            max_inflight: int = WS_MAX_INFLIGHT, max_pending: int = WS_MAX_PENDING,
+                            send_queue_size: int = WS_SEND_QUEUE_SIZE) -> None:
+    """Serve an accepted WebSocket until the client disconnects; answer(query) returns the reply fields"""
+    await _Connection(websocket, answer, max_inflight, max_pending, send_queue_size).run()
@@ -1,6 +1,6 @@
 import sys
 import os
-sys.path.append(r'D:\Projects\om\backend')
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
     from pinecone import Pinecone, ServerlessSpec
@@ -0,0 +1,33 @@
+# Shared test setup: the deterministic fakes from benchmarks/fakes.py stand in for the external services,
+# so importing src modules needs no credentials or network. Run with: python -m pytest tests
+# Some tests also exercise the real library behind a fake (e.g. the MiniLM embedder) and are skipped without it.
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+from benchmarks import fakes
+
+# Recorded before install() shadows them in sys.modules
+REAL_SENTENCE_TRANSFORMERS = importlib.util.find_spec("sentence_transformers") is not None
+
+fakes.install({'LOG_INFO_SAMPLE_RATE': '0'})
+
+from src.logger import set_output_stream  # noqa: E402  (after install: src reads the fakes' env at import)
+
+set_output_stream(open(os.devnull, 'w'))
+
+
+@pytest.fixture
+def real_sentence_transformers():
+    """The installed sentence_transformers module (the fake stays registered for everything else)"""
+    if not REAL_SENTENCE_TRANSFORMERS:
+        pytest.skip("needs sentence-transformers and the model weights")
+    fake = sys.modules.pop('sentence_transformers')
+    try:
+        import sentence_transformers
+    finally:
+        sys.modules['sentence_transformers'] = fake
+    return sentence_transformers
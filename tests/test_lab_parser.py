@@ -0,0 +1,61 @@
+# Lab-value parser (src.lab_parser): number formats, reference ranges, and lines that only look like results
+
+import pytest
+
+from src.lab_parser import parse_lab_results, parse_line
+
+
+@pytest.mark.parametrize("line,value,low,high", [
+    ("Platelet Count 1,50,000 /cumm 1,50,000 - 4,50,000", 150000.0, 150000.0, 450000.0),  # lakh grouping
+    ("Platelet Count 2,10,500.5 /cumm 1,50,000 - 4,50,000", 210500.5, 150000.0, 450000.0),
+    ("WBC Count 1,24,000 cells/cumm 4,000 - 11,000", 124000.0, 4000.0, 11000.0),
+    ("Platelet Count 150,000 /cumm 150,000 - 450,000", 150000.0, 150000.0, 450000.0),  # thousands grouping
+    ("Hemoglobin 13,5 g/dl 13,0 - 17,0", 13.5, 13.0, 17.0),  # decimal comma
+    ("Hemoglobin 13.5 g/dl 13.0 - 17.0", 13.5, 13.0, 17.0),
+])
+def test_number_formats(line, value, low, high):
+    row = parse_line(line)
+    assert (row["value"], row["ref_low"], row["ref_high"]) == (value, low, high)
+    assert row["flag"] == ("H" if value > high else "N")
+
+
+def test_lakh_platelet_count_is_normal_with_its_unit():
+    row = parse_line("Platelet Count 1,50,000 /cumm 1,50,000 - 4,50,000")
+    assert (row["test"], row["unit"], row["flag"]) == ("Platelet Count", "/cumm", "N")
+
+
+def test_inverted_range_is_not_flagged_against():
+    row = parse_line("Hemoglobin 14.2 g/dL 17.0 - 13.0")
+    assert (row["ref_low"], row["ref_high"], row["ref_range"]) == (None, None, "")
+    assert row["flag"] == ""
+    # The lab's own flag still counts when the range is unusable
+    assert parse_line("Hemoglobin 9.1 g/dL 17.0 - 13.0 L")["flag"] == "L"
+
+
+@pytest.mark.parametrize("line", [
+    "HB Road, Bangalore 560001",
+    "Alt. Phone: 9876543210",
+    "AST 2 Block, Sector 4",
+    "TG Nagar 41",
+    "K+ 12",
+    "Hemoglobin 560001 g/dL",  # implausible even with a unit
+])
+def test_non_results_are_rejected(line):
+    assert parse_line(line) is None
+
+
+@pytest.mark.parametrize("line,test,value", [
+    ("Hb 10.2 g/dL", "Hemoglobin", 10.2),
+    ("ALT 42 13 - 40", "ALT", 42.0),
+    ("Haemoglobin : 12.1", "Hemoglobin", 12.1),  # long aliases need neither unit nor range
+])
+def test_aliases_with_unit_or_range(line, test, value):
+    row = parse_line(line)
+    assert (row["test"], row["value"]) == (test, value)
+
+
+def test_address_lines_stay_in_the_text_for_the_llm():
+    text = "City Lab, HB Road, Bangalore 560001\nAlt. Phone: 9876543210\nHemoglobin 10.2 g/dL 13.0 - 17.0"
+    table, remaining = parse_lab_results(text)
+    assert list(table["test"]) == ["Hemoglobin"]
+    assert "HB Road" in remaining and "Alt. Phone" in remaining
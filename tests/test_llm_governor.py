@@ -0,0 +1,82 @@
+# Outbound LLM governor (src.llm_governor): rate-token ordering, slots while waiting, per-route latency targets,
+# and each worker's share of the rate limits
+
+import threading
+import time
+
+from src import llm_governor
+from src.llm_governor import (AIMDLimiter, LLMGovernor, RateGate, TokenBucket, PRIORITY_EMERGENCY,
+                              PRIORITY_STANDARD)
+
+
+def _drained_bucket(per_second: float) -> TokenBucket:
+    bucket = TokenBucket(per_second * 60, burst=1)
+    bucket.take()
+    return bucket
+
+
+def test_rate_tokens_go_to_the_highest_priority_waiter():
+    gate, bucket, order = RateGate(), _drained_bucket(20), []
+
+    def caller(name, priority):
+        gate.acquire([bucket], priority, timeout=5)
+        order.append(name)
+
+    threads = [threading.Thread(target=caller, args=(f"standard-{i}", PRIORITY_STANDARD)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.02)  # the standard calls are queued first
+    threads.append(threading.Thread(target=caller, args=("emergency", PRIORITY_EMERGENCY)))
+    threads[-1].start()
+    for thread in threads:
+        thread.join()
+    assert order[0] == "emergency"
+
+
+def test_waiters_on_other_buckets_are_not_blocked():
+    gate, slow, fast = RateGate(), _drained_bucket(0.5), TokenBucket(600)
+    blocked = threading.Thread(target=lambda: gate.acquire([slow], PRIORITY_EMERGENCY, timeout=5), daemon=True)
+    blocked.start()
+    time.sleep(0.02)
+    start = time.monotonic()
+    gate.acquire([fast], PRIORITY_STANDARD, timeout=5)
+    assert time.monotonic() - start < 0.5
+
+
+def test_no_slot_is_held_while_waiting_for_a_rate_token(monkeypatch):
+    governor = LLMGovernor()
+    bucket = _drained_bucket(10)
+    monkeypatch.setattr(governor, "_bucket", lambda key, rpm: bucket)
+    in_flight_while_waiting = []
+
+    def sample():
+        time.sleep(0.03)  # the call is waiting on the drained bucket here
+        in_flight_while_waiting.append(governor.limiter.in_flight)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    assert governor.call(lambda: "ok", model_name="m") == "ok"
+    sampler.join()
+    assert in_flight_while_waiting == [0]
+
+
+def test_latency_target_is_per_route(monkeypatch):
+    monkeypatch.setattr(llm_governor, "GEMINI_ROUTE_TARGET_LATENCY_MS", {"report": 60000, "chat": 10})
+    governor = LLMGovernor()
+    governor.limiter = AIMDLimiter(2, 32, target_latency_s=0.01)
+    limit = governor.limiter.limit
+
+    governor.call(lambda: time.sleep(0.05), model_name="m", route="report")  # slow for chat, fine for a report
+    assert governor.limiter.limit > limit
+    governor.call(lambda: time.sleep(0.05), model_name="m", route="chat")
+    assert governor.limiter.limit < limit
+
+
+def test_rate_limits_are_split_between_workers(monkeypatch):
+    monkeypatch.setattr(llm_governor, "GEMINI_RATE_WORKERS", 4)
+    monkeypatch.setattr(llm_governor, "GEMINI_KEY_RPM", 120)
+    monkeypatch.setattr(llm_governor, "GEMINI_MODEL_RPM", 600)
+    governor = LLMGovernor()
+    governor.call(lambda: "ok", model_name="m")
+    rates = sorted(bucket.rate * 60 for bucket in governor._buckets.values())
+    assert rates == [30, 150]
@@ -0,0 +1,79 @@
+# Model sidecar client (src.model_server): which failures are retried, so a slow transcription is never queued twice
+
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+from src import model_server
+
+
+class StubServer:
+    """Counts request frames; replies unless told to stay silent, optionally closing the connection after one request"""
+
+    def __init__(self, path: str, reply: bool = True, close_after_reply: bool = False):
+        self.requests, self.reply, self.close_after_reply = [], reply, close_after_reply
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(path)
+        self.listener.listen()
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        with conn:
+            try:
+                while True:
+                    size = model_server._HEADER.unpack(model_server._recv_exactly(conn, model_server._HEADER.size))[0]
+                    header = model_server.json.loads(model_server._recv_exactly(conn, size))
+                    model_server._recv_exactly(conn, header["nbytes"]) if header["nbytes"] else b""
+                    self.requests.append(header["op"])
+                    if self.reply:
+                        vectors = np.zeros((len(header.get("texts", [])), 4), np.float32)
+                        conn.sendall(model_server._pack({"ok": True, "shape": vectors.shape}, vectors.tobytes()))
+                    if self.close_after_reply:
+                        return
+            except (ConnectionError, OSError):
+                return
+
+    def close(self):
+        self.listener.close()
+
+
+@pytest.fixture
+def socket_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_server, "_local", threading.local())
+    return str(tmp_path / "models.sock")
+
+
+def test_timed_out_transcription_is_not_resent(socket_path, monkeypatch):
+    monkeypatch.setattr(model_server, "MODEL_SERVER_TIMEOUT_S", 0.2)
+    server = StubServer(socket_path, reply=False)
+    with pytest.raises(socket.timeout):
+        model_server.WhisperClient(socket_path).transcribe(np.zeros(16000, np.float32))
+    server.close()
+    assert server.requests == ["transcribe"]
+
+
+def test_stale_connection_is_reopened_for_encode(socket_path):
+    server = StubServer(socket_path, close_after_reply=True)
+    client = model_server.EmbedderClient(socket_path)
+    assert client.encode(["a", "b"]).shape == (2, 4)
+    assert client.encode(["c"]).shape == (1, 4)  # sent on the closed connection, then resent on a new one
+    server.close()
+    assert server.requests == ["encode", "encode"]
+
+
+def test_transcription_dropped_after_it_was_sent_is_not_resent(socket_path):
+    server = StubServer(socket_path, reply=False, close_after_reply=True)  # reads the request, then hangs up
+    with pytest.raises(ConnectionError):
+        model_server.WhisperClient(socket_path).transcribe(np.zeros(16000, np.float32))
+    server.close()
+    assert server.requests == ["transcribe"]
@@ -0,0 +1,43 @@
+# OCR preprocessing (src.ocr_preprocess): skew estimation on blank, flat and skewed pages
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.ocr_preprocess import estimate_skew
+
+
+def _text_lines(angle: float, size=(600, 800)) -> np.ndarray:
+    """Ink mask of evenly spaced dashed "text lines", rotated by angle degrees"""
+    page = np.zeros(size[::-1], dtype=np.uint8)
+    for top in range(100, size[1] - 100, 30):
+        for left in range(60, size[0] - 60, 40):
+            page[top:top + 8, left:left + 30] = 255
+    rotated = Image.fromarray(page).rotate(angle, resample=Image.NEAREST, fillcolor=0)
+    return np.asarray(rotated) > 127
+
+
+@pytest.mark.parametrize("ink", [
+    np.zeros((800, 600), dtype=bool),  # blank page
+    np.ones((800, 600), dtype=bool),  # solid (flat) page
+    np.random.default_rng(0).random((800, 600)) < 0.05,  # speckle noise, no text lines
+    np.random.default_rng(1).random((1600, 1200)) < 0.3,  # denser noise, downscaled for analysis
+])
+def test_featureless_page_is_not_rotated(ink):
+    assert estimate_skew(ink) == 0.0
+
+
+def test_sparse_page_stays_within_max_angle():
+    ink = np.zeros((800, 600), dtype=bool)
+    ink[400, 300] = ink[120, 50] = True  # a couple of specks
+    assert abs(estimate_skew(ink, max_angle=10.0)) <= 10.0
+
+
+@pytest.mark.parametrize("angle", [-6.0, -2.5, 0.0, 3.0, 9.7])
+def test_skew_is_recovered(angle):
+    # Rotating by the estimate straightens the lines, so it is the negative of the applied angle
+    assert estimate_skew(_text_lines(angle)) == pytest.approx(-angle, abs=0.3)
+
+
+def test_estimate_is_clamped_to_max_angle():
+    assert abs(estimate_skew(_text_lines(12.0), max_angle=10.0)) <= 10.0
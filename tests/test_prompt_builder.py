@@ -0,0 +1,29 @@
+# Prompt assembly (src.prompt_builder): page boilerplate is dropped, repeated content is not
+
+from src.prompt_builder import drop_repeated_lines
+
+HEADER = "City Diagnostics Laboratory, 12 Park Street, Pune"
+FOOTER = "This is an electronically generated report and does not require a signature."
+DISCLAIMER = "Results relate only to the sample tested. Please correlate clinically with history."
+ROWS = ["Hemoglobin 13.5 g/dL 13.0 - 17.0", "Serum Creatinine 1.0 mg/dL 0.6 - 1.2"]
+
+
+def page(number: int, date: str) -> str:
+    return "\n".join([f"--- Page {number} ---", HEADER, f"Collected on: {date}", *ROWS, DISCLAIMER, FOOTER])
+
+
+def test_result_rows_repeated_on_different_dates_are_kept():
+    text = "\n".join([f"Collected on: {date}\n" + "\n".join(ROWS) for date in ("01/03/2026", "01/06/2026")])
+    assert drop_repeated_lines(text) == text
+
+
+def test_page_boilerplate_is_dropped_but_rows_are_kept():
+    kept = drop_repeated_lines("\n".join(page(n, date) for n, date in ((1, "01/03/2026"), (2, "01/06/2026"))))
+    assert [kept.count(line) for line in (HEADER, DISCLAIMER, FOOTER)] == [1, 1, 1]
+    assert [kept.count(row) for row in ROWS] == [2, 2]
+    assert "01/06/2026" in kept
+
+
+def test_consecutive_duplicates_are_dropped():
+    line = "Take one tablet of paracetamol after food"
+    assert drop_repeated_lines(f"{line}\n{line}\nthen rest\n{line}") == f"{line}\nthen rest\n{line}"
@@ -0,0 +1,76 @@
+# Bulk re-index (src.reindex) against the fakes: the shadow index gets exactly the expected vector ids,
+# with and without the process pool, and after a crash and resume; an index built with another embedding model
+# is never served
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks import fakes
+from benchmarks.bench_reindex import SimulatedCrash, run_build, seed
+from src import reindex
+
+SOURCES = ["vectors", "reports", "prescriptions"]
+ARGS = SimpleNamespace(page_size=25, embed_batch=16, upsert_batch=20)
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    from pinecone import Pinecone
+    db, pc = fakes.firestore_client(), Pinecone(api_key="fake")
+    source_name = "reindex-test-source"
+    expected = seed(db, pc, source_name, reports=120, prescriptions=30, vectors=60)
+    expected |= {f"rx_rx-{i:06d}" for i in range(30)}
+    return db, pc, source_name, expected
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_build_produces_exactly_the_expected_ids(seeded, tmp_path, workers):
+    db, pc, source_name, expected = seeded
+    target = f"reindex-test-w{workers}"
+    state, _ = run_build(reindex, db, pc, target, SOURCES, str(tmp_path / "checkpoint.json"), source_name, workers, ARGS)
+    assert set(pc.Index(target).vectors) == expected
+
+
+def test_resumed_build_produces_exactly_the_expected_ids(seeded, tmp_path):
+    db, pc, source_name, expected = seeded
+    target, path = "reindex-test-resume", str(tmp_path / "checkpoint.json")
+    with pytest.raises(SimulatedCrash):
+        run_build(reindex, db, pc, target, SOURCES, path, source_name, 0, ARGS, crash_after_pages=3)
+    assert os.path.exists(path)
+    done_before = reindex.Checkpoint(path, target, 'fake-model', 0, SOURCES).state['docs']
+    assert 0 < done_before < len(expected)
+
+    run_build(reindex, db, pc, target, SOURCES, path, source_name, 0, ARGS)
+    assert set(pc.Index(target).vectors) == expected
+
+
+def test_swap_to_a_different_model_is_refused(monkeypatch):
+    # Serving processes embed queries with EMBEDDING_MODEL, so the CLI stops before building anything
+    monkeypatch.setattr(reindex, "PINECONE_INDEX_ALIAS_DOC", "config/vector_index")
+    monkeypatch.setattr("sys.argv", ["reindex", "--target", "reindex-test-other", "--model", "other-model", "--swap"])
+    with pytest.raises(SystemExit) as excinfo:
+        reindex.main()
+    assert excinfo.value.code == 2
+
+
+def test_serving_keeps_its_index_when_the_alias_names_another_model(seeded, monkeypatch):
+    from src import rag
+    db, pc, _, _ = seeded
+    monkeypatch.setattr(reindex, "PINECONE_INDEX_ALIAS_DOC", "config/vector_index")
+    monkeypatch.setattr(rag, "PINECONE_ALIAS_REFRESH_S", 0)
+    monkeypatch.setattr(rag, "read_index_alias", lambda: reindex.current_alias(db))
+    for name in ("index", "index_name", "_shadow", "_alias_checked"):
+        monkeypatch.setattr(rag, name, getattr(rag, name))
+    serving = rag.index_name
+
+    reindex.swap_alias(db, pc, "reindex-test-w0", model="other-model", dimension=768)
+    rag._refresh_alias()
+    assert rag.index_name == serving
+
+    reindex.swap_alias(db, pc, "reindex-test-w0", model=rag.EMBEDDING_MODEL)
+    rag._refresh_alias()
+    assert rag.index_name == "reindex-test-w0"
+    alias = reindex.current_alias(db)
+    assert (alias['model'], alias['previous_model'], alias['previous_dimension']) == (rag.EMBEDDING_MODEL, "other-model", 768)
@@ -0,0 +1,17 @@
+# Report-analysis prompt assembly (src.report_analyzer)
+
+from src import report_analyzer
+from src.lab_parser import parse_lab_results
+
+
+def test_lab_note_precedes_the_other_report_text(monkeypatch):
+    prompts = []
+    monkeypatch.setattr(report_analyzer.chatbot, "generate", lambda prompt, **kwargs: prompts.append(prompt) or "ok")
+    table, remaining = parse_lab_results("Hemoglobin 10.2 g/dL 13.0 - 17.0\nClinical notes: fatigue for two weeks")
+    report_analyzer.perform_comprehensive_analysis(remaining, lab_results=table)
+
+    prompt = prompts[0]
+    summary, note = prompt.index("STRUCTURED LAB RESULTS"), prompt.index("(Values within range")
+    header, report = prompt.index("OTHER REPORT TEXT:"), prompt.index("Clinical notes: fatigue")
+    assert summary < note < header < report
+    assert prompt[header:report].strip() == "OTHER REPORT TEXT:"
@@ -0,0 +1,65 @@
+# Storage pipeline (src.storage): concurrent uploads of identical content, with and without the dedup index
+
+import os
+import threading
+
+import pytest
+
+from src.storage import LocalDedupIndex, LocalStorage
+
+
+class SlowLocalStorage(LocalStorage):
+    """Holds every upload open until both callers are in flight, so they overlap deterministically"""
+
+    def __init__(self, callers: int, **kwargs):
+        super().__init__(**kwargs)
+        self.barrier = threading.Barrier(callers, timeout=5)
+        self.uploads = 0
+
+    def put(self, file_path, destination):
+        self.barrier.wait()  # both callers reach the single-flight group together
+        return super().put(file_path, destination)
+
+    def _put_whole(self, file_path, destination):
+        self.uploads += 1
+        threading.Event().wait(0.2)  # long enough for the second caller to join an in-flight upload
+        return super()._put_whole(file_path, destination)
+
+
+def _concurrent_puts(storage, file_path, destinations):
+    results = {}
+    threads = [threading.Thread(target=lambda d=d: results.__setitem__(d, storage.put(file_path, d)))
+               for d in destinations]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / "a.mp4"
+    path.write_bytes(b"same bytes" * 1000)
+    return str(path)
+
+
+def test_without_dedup_each_destination_is_written(tmp_path, recording):
+    storage = SlowLocalStorage(2, root=str(tmp_path / "store"), state_dir=str(tmp_path / "state"))
+    results = _concurrent_puts(storage, recording, ["recordings/s1", "recordings/s2"])
+
+    for destination in ("recordings/s1", "recordings/s2"):
+        assert results[destination]['url'].endswith(f"{destination}/a.mp4")
+        assert results[destination]['deduplicated'] is False
+        assert os.path.exists(tmp_path / "store" / destination / "a.mp4")
+    assert storage.uploads == 2
+
+
+def test_with_dedup_concurrent_callers_share_one_upload(tmp_path, recording):
+    index = LocalDedupIndex(str(tmp_path / "dedup.json"))
+    storage = SlowLocalStorage(2, root=str(tmp_path / "store"), state_dir=str(tmp_path / "state"), dedup_index=index)
+    results = _concurrent_puts(storage, recording, ["recordings/s1", "recordings/s2"])
+
+    assert storage.uploads == 1
+    assert results["recordings/s1"]['url'] == results["recordings/s2"]['url']
+    assert sorted(r['deduplicated'] for r in results.values()) == [False, True]
@@ -0,0 +1,110 @@
+# Emergency pre-filter (src.triage): labelled messages for the keyword stage, and the embedding threshold
+# checked against the real MiniLM model when it is installed
+
+import pytest
+
+from src import triage
+from src.config import EMBEDDING_MODEL
+
+# (message, rule expected from the keyword stage)
+EMERGENCIES = [
+    ("I have crushing chest pain and I'm sweating", "cardiac"),
+    ("I have chest pain, what are the signs of a heart attack?", "cardiac"),
+    ("I've been having chest pain spreading to my left arm", "cardiac"),
+    ("I am having a heart attack", "cardiac"),
+    ("my dad collapsed and isn't breathing, help", "consciousness"),
+    ("She is unconscious and won't wake up", "consciousness"),
+    ("I can't breathe properly and my lips look blue", "breathing"),
+    ("Help! My baby is choking", "breathing"),
+    ("my mother's face is drooping and her speech is slurred", "stroke"),
+    ("he is having a seizure right now", "seizure"),
+    ("my son is seizing and not responding", "seizure"),
+    ("my arm is bleeding heavily and won't stop", "bleeding"),
+    ("I want to kill myself", "self_harm"),
+    ("my son swallowed bleach", "poisoning"),
+    ("her throat is swelling after eating peanuts", "anaphylaxis"),
+    # Past tense with a fresh cue is still happening now
+    ("I was cooking and suddenly collapsed", "consciousness"),
+    ("he had a seizure a minute ago and isn't waking up", "seizure"),
+    ("I had chest pain last year but now I have crushing chest pain", "cardiac"),
+]
+
+# Questions, past episodes, side effects and worries: left to the LLM, embeddings included
+AMBIGUOUS = [
+    # Informational
+    "Please explain seizure medication side effects",
+    "Help me understand anaphylaxis",
+    "what are the symptoms of a heart attack?",
+    "what causes seizures in dogs?",
+    "how do I prevent a stroke?",
+    # Past episodes and history
+    "My mom had a seizure last year, is it safe for her to drive?",
+    "I had chest pain last week after running, now it is gone",
+    "My grandma passed out from the heat yesterday but is fine now",
+    "my brother was diagnosed with epilepsy after a seizure",
+    # Side effects and worries
+    "Is chest pain a side effect of my new medication?",
+    "I am scared of choking on pills",
+    "I'm worried about having a heart attack like my father",
+    # Questions with a cue elsewhere in the message, or about someone hypothetical
+    "I'm not having chest pain anymore, should I still see a cardiologist?",
+    "Can anxiety cause chest pain? I'm not sure what to do",
+    "Should I take aspirin for chest pain? I am not a smoker",
+    "Is slurred speech after drinking alcohol normal or not?",
+    "How do I help someone who is having a seizure?",
+    "If someone is unconscious, should I give them water?",
+    "Does coughing up blood always mean TB? It's not clear to me",
+    "Can stress cause chest tightness? I currently work night shifts",
+]
+# Symptoms mentioned without any acute cue (the embedding stage still sees these)
+NO_ACUTE_CUE = [
+    "my seizure medication needs a refill",
+    "My seizure medication is not working as well as before",
+    "I have had a mild cough for two days",
+]
+
+
+@pytest.mark.parametrize("text,rule", EMERGENCIES)
+def test_acute_emergencies_match(text, rule):
+    assert triage.match_keywords(text) == rule
+
+
+@pytest.mark.parametrize("text", AMBIGUOUS + NO_ACUTE_CUE)
+def test_non_acute_messages_fall_through(text):
+    assert triage.match_keywords(text) is None
+
+
+@pytest.mark.parametrize("text", AMBIGUOUS)
+def test_ambiguous_messages_skip_the_embedding_stage(text, monkeypatch):
+    # Even an embedding stage that flags everything must not answer these
+    monkeypatch.setattr(triage, "TRIAGE_EMBEDDING_ENABLED", True)
+    monkeypatch.setattr(triage, "TRIAGE_EMBEDDING_THRESHOLD", -1.0)
+    monkeypatch.setattr(triage, "TRIAGE_EMBEDDING_MARGIN", -2.0)
+    assert triage.detect_emergency(text) is None
+
+
+# Held out from the embedding stage's examples; the keyword stage misses these, the embeddings should not
+EMBEDDING_EMERGENCIES = [
+    "my husband fell down and his lips are going grey, he won't answer me",
+    "there is so much blood coming from the cut on his head",
+    "my daughter ate rat poison a few minutes ago",
+    "the worst headache of my life just hit me and I'm throwing up",
+]
+EMBEDDING_NON_EMERGENCIES = [
+    "how long does a sprained ankle take to heal",
+    "my cholesterol is 220, should I worry",
+    "I get a mild headache when I skip breakfast",
+    "is it okay to take ibuprofen with food",
+]
+
+
+def test_embedding_threshold_on_held_out_messages(real_sentence_transformers, monkeypatch):
+    monkeypatch.setattr(triage, "embedder", real_sentence_transformers.SentenceTransformer(EMBEDDING_MODEL))
+    monkeypatch.setattr(triage, "_prototypes", None)
+
+    def flagged(text):
+        best, other = triage.embedding_score(text)
+        return best >= triage.TRIAGE_EMBEDDING_THRESHOLD and best - other >= triage.TRIAGE_EMBEDDING_MARGIN
+
+    assert [text for text in EMBEDDING_EMERGENCIES if not flagged(text)] == []
+    assert [text for text in EMBEDDING_NON_EMERGENCIES if flagged(text)] == []
@@ -0,0 +1,57 @@
+# WebSocket multiplexing (src.ws_mux): the pending-query cap for JSON and legacy plain-text clients
+
+import asyncio
+import json
+
+from fastapi import WebSocketDisconnect
+
+from src.ws_mux import serve_multiplexed
+
+
+class FakeWebSocket:
+    def __init__(self, messages):
+        self.incoming = list(messages)
+        self.sent = []
+
+    async def receive_text(self):
+        await asyncio.sleep(0)
+        if not self.incoming:
+            await asyncio.sleep(0.2)  # let the answers drain before the client goes away
+            raise WebSocketDisconnect()
+        return self.incoming.pop(0)
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+def _serve(messages, max_pending=4):
+    websocket, peak = FakeWebSocket(messages), []
+    in_flight = 0
+
+    async def answer(query):
+        nonlocal in_flight
+        in_flight += 1
+        peak.append(in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return {"answer": query}
+
+    asyncio.run(serve_multiplexed(websocket, answer, max_inflight=2, max_pending=max_pending, send_queue_size=64))
+    return websocket.sent, max(peak)
+
+
+def test_legacy_queries_are_capped_and_refused_in_order():
+    sent, _ = _serve([f"q{i}" for i in range(10)])
+    busy = "Error: busy: too many queries in flight on this connection"
+    assert sent == [{"answer": f"q{i}"} for i in range(4)] + [busy] * 6
+
+
+def test_json_queries_are_capped():
+    sent, peak = _serve([json.dumps({"id": i, "query": f"q{i}"}) for i in range(10)])
+    answers = [reply for reply in sent if reply["type"] == "answer"]
+    refused = [reply for reply in sent if reply["type"] == "error"]
+    assert len(answers) == 4 and len(refused) == 6
+    assert peak <= 2